@@ -1,6 +1,10 @@
 from fastapi import Body, FastAPI
+from books.responsecache import CachedGZipMiddleware, ResponseCache
 
 app = FastAPI()
+# Run from the repository root (uvicorn books.books:app) so books.responsecache is importable.
+response_cache = ResponseCache()
+app.add_middleware(CachedGZipMiddleware, paths=("/books",), cache=response_cache)
 
 
 BOOKS = [
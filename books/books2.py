@@ -1,9 +1,16 @@
+import json
 from typing import Optional
-from fastapi import FastAPI, Path, Query, HTTPException
-from pydantic import BaseModel, Field
+import numpy as np
+from fastapi import Depends, FastAPI, Path, Query, HTTPException, Request
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 from starlette import status
+from starlette.concurrency import run_in_threadpool
+from books.responsecache import CachedGZipMiddleware, ResponseCache
 
 app = FastAPI()
+# Run from the repository root (uvicorn books.books2:app) so books.responsecache is importable.
+response_cache = ResponseCache()
+app.add_middleware(CachedGZipMiddleware, paths=("/books",), cache=response_cache)
 
 
 class Book:
@@ -54,6 +61,84 @@ BOOKS = [
 ]
 
 
+class BookColumns:
+    """NumPy column view of BOOKS (rating, published_date, author code) for /books/stats.
+
+    Row i describes BOOKS[i]; the write endpoints keep both in step.
+    """
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.rating = np.zeros(capacity, dtype=np.int8)
+        self.published_date = np.zeros(capacity, dtype=np.int16)
+        self.author = np.zeros(capacity, dtype=np.int32)
+        self.author_names = []
+        self.author_codes = {}
+
+    def _code(self, author):
+        code = self.author_codes.get(author)
+        if code is None:
+            code = self.author_codes[author] = len(self.author_names)
+            self.author_names.append(author)
+        return code
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        if needed <= len(self.rating):
+            return
+        capacity = max(needed, 2 * len(self.rating))
+        for name in ('rating', 'published_date', 'author'):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def extend(self, books):
+        books = list(books)
+        self._reserve(len(books))
+        end = self.size + len(books)
+        self.rating[self.size:end] = [book.rating for book in books]
+        self.published_date[self.size:end] = [book.published_date for book in books]
+        self.author[self.size:end] = [self._code(book.author) for book in books]
+        self.size = end
+
+    def set(self, index, book):
+        self.rating[index] = book.rating
+        self.published_date[index] = book.published_date
+        self.author[index] = self._code(book.author)
+
+    def remove(self, index):
+        for column in (self.rating, self.published_date, self.author):
+            column[index:self.size - 1] = column[index + 1:self.size]
+        self.size -= 1
+
+    def mask(self, min_rating=None, max_rating=None, min_year=None, max_year=None, author=None):
+        """Boolean row mask for the range filters; None means every row."""
+        conditions = []
+        rating, published_date = self.rating[:self.size], self.published_date[:self.size]
+        if min_rating is not None:
+            conditions.append(rating >= min_rating)
+        if max_rating is not None:
+            conditions.append(rating <= max_rating)
+        if min_year is not None:
+            conditions.append(published_date >= min_year)
+        if max_year is not None:
+            conditions.append(published_date <= max_year)
+        if author is not None:
+            conditions.append(self.author[:self.size] == self.author_codes.get(author, -1))
+        if not conditions:
+            return None
+        return np.logical_and.reduce(conditions)
+
+    def column(self, name, mask):
+        values = getattr(self, name)[:self.size]
+        return values if mask is None else values[mask]
+
+
+COLUMNS = BookColumns()
+COLUMNS.extend(BOOKS)
+
+
 @app.get("/books", status_code=status.HTTP_200_OK)
 async def read_all_books():
     return BOOKS
@@ -89,6 +174,7 @@ async def read_books_by_publish_date(published_date: int = Query(gt=1999, lt=203
 async def create_book(book_request: BookRequest):
     new_book = Book(**book_request.model_dump())
     BOOKS.append(find_book_id(new_book))
+    COLUMNS.extend([new_book])
 
 
 def find_book_id(book: Book):
@@ -96,12 +182,116 @@ def find_book_id(book: Book):
     return book
 
 
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_REJECTIONS = 100
+MAX_LINE_BYTES = 64 * 1024
+
+BookBatch = TypeAdapter(list[BookRequest])
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line_number, reason):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_REJECTIONS:
+            self.errors.append({'line': line_number, 'error': reason})
+
+
+def parse_batch(lines):
+    """Validate ``[(line_number, raw_line), ...]`` together.
+
+    Returns the valid BookRequests and ``[(line_number, reason), ...]`` for
+    the rest. Touches no shared state, so it can run in the threadpool.
+    """
+    numbers, items, rejections = [], [], []
+    for line_number, line in lines:
+        try:
+            items.append(json.loads(line))
+            numbers.append(line_number)
+        except ValueError as error:
+            rejections.append((line_number, f'invalid JSON: {error}'))
+    try:
+        books = BookBatch.validate_python(items)
+    except ValidationError as error:
+        # Reject the items with errors and validate the rest again.
+        reasons = {}
+        for detail in error.errors():
+            index = detail['loc'][0]
+            field = '.'.join(str(part) for part in detail['loc'][1:])
+            reasons.setdefault(index, []).append(f"{field}: {detail['msg']}" if field else detail['msg'])
+        for index in sorted(reasons):
+            rejections.append((numbers[index], '; '.join(reasons[index])))
+        books = BookBatch.validate_python([item for index, item in enumerate(items) if index not in reasons])
+    rejections.sort()
+    return books, rejections
+
+
+async def import_batch(lines, result: ImportResult):
+    """Parse ``lines`` in the threadpool, then append the valid books on the event loop."""
+    books, rejections = await run_in_threadpool(parse_batch, lines)
+    for line_number, reason in rejections:
+        result.reject(line_number, reason)
+    # One id range for the whole batch.
+    next_id = 1 if len(BOOKS) == 0 else BOOKS[-1].id + 1
+    new_books = [Book(**book.model_dump(exclude={'id'}), id=next_id + offset)
+                 for offset, book in enumerate(books)]
+    BOOKS.extend(new_books)
+    COLUMNS.extend(new_books)
+    result.imported += len(books)
+
+
+@app.post("/books/import", status_code=status.HTTP_200_OK)
+async def import_books(request: Request):
+    """Bulk create books from an NDJSON body (one BookRequest per line).
+
+    The body is read as a stream and handled in batches of
+    IMPORT_BATCH_SIZE lines, so memory use does not grow with the upload.
+    Lines longer than MAX_LINE_BYTES are skipped without being buffered.
+    Invalid lines are skipped and reported (the first
+    MAX_REPORTED_REJECTIONS of them) with their line number.
+    """
+    result = ImportResult()
+    batch = []
+    pending = b''
+    line_number = 0
+    oversized = False  # dropping the rest of a line longer than MAX_LINE_BYTES
+    too_long = f'line longer than {MAX_LINE_BYTES} bytes'
+    async for chunk in request.stream():
+        pending += chunk
+        *complete, pending = pending.split(b'\n')
+        for line in complete:
+            line_number += 1
+            if oversized or len(line) > MAX_LINE_BYTES:
+                oversized = False
+                result.reject(line_number, too_long)
+            elif line.strip():
+                batch.append((line_number, line))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await import_batch(batch, result)
+                batch = []
+        if len(pending) > MAX_LINE_BYTES:
+            oversized = True
+            pending = b''
+    if oversized:
+        result.reject(line_number + 1, too_long)
+    elif pending.strip():
+        batch.append((line_number + 1, pending))
+    if batch:
+        await import_batch(batch, result)
+    return {'imported': result.imported, 'rejected': result.rejected, 'errors': result.errors}
+
+
 @app.put("/books/update_book", status_code=status.HTTP_204_NO_CONTENT)
 async def update_book(book: BookRequest):
     book_changed = False
     for i in range(len(BOOKS)):
         if BOOKS[i].id == book.id:
             BOOKS[i] = book
+            COLUMNS.set(i, book)
             book_changed = True
     if not book_changed:
         raise HTTPException(status_code=404, detail='Item not found')
@@ -113,7 +303,68 @@ async def delete_book(book_id: int = Path(gt=0)):
     for i in range(len(BOOKS)):
         if BOOKS[i].id == book_id:
             BOOKS.pop(i)
+            COLUMNS.remove(i)
             book_changed = True
             break
     if not book_changed:
         raise HTTPException(status_code=404, detail='Item not found')
+
+
+class StatsFilters:
+    """Query filters shared by the /books/stats endpoints.
+
+    The mask is built by the async handler, not here: a sync dependency runs
+    in the threadpool and could read COLUMNS while a write endpoint changes
+    it. On the event loop the mask and the aggregation see the same rows.
+    """
+
+    def __init__(self,
+                 min_rating: Optional[int] = Query(default=None, gt=0, lt=6),
+                 max_rating: Optional[int] = Query(default=None, gt=0, lt=6),
+                 min_year: Optional[int] = Query(default=None, gt=1999, lt=2031),
+                 max_year: Optional[int] = Query(default=None, gt=1999, lt=2031),
+                 author: Optional[str] = Query(default=None)):
+        self.min_rating = min_rating
+        self.max_rating = max_rating
+        self.min_year = min_year
+        self.max_year = max_year
+        self.author = author
+
+    def mask(self):
+        return COLUMNS.mask(self.min_rating, self.max_rating, self.min_year, self.max_year, self.author)
+
+
+@app.get("/books/stats/ratings", status_code=status.HTTP_200_OK)
+async def rating_histogram(filters: StatsFilters = Depends()):
+    ratings = COLUMNS.column('rating', filters.mask())
+    counts = np.bincount(ratings, minlength=6)
+    return {'total': int(ratings.size),
+            'mean': float(ratings.mean()) if ratings.size else None,
+            'counts': {rating: int(counts[rating]) for rating in range(1, 6)}}
+
+
+@app.get("/books/stats/published", status_code=status.HTTP_200_OK)
+async def books_per_year(filters: StatsFilters = Depends()):
+    years = COLUMNS.column('published_date', filters.mask())
+    counts = np.bincount(years - 2000, minlength=31) if years.size else np.zeros(31, dtype=np.int64)
+    return {'total': int(years.size),
+            'counts': {2000 + offset: int(count) for offset, count in enumerate(counts) if count}}
+
+
+@app.get("/books/stats/authors", status_code=status.HTTP_200_OK)
+async def author_averages(filters: StatsFilters = Depends(),
+                          sort: str = Query(default='count', pattern='^(count|average_rating)$'),
+                          limit: int = Query(default=20, gt=0, le=1000)):
+    mask = filters.mask()
+    codes = COLUMNS.column('author', mask)
+    ratings = COLUMNS.column('rating', mask)
+    authors = len(COLUMNS.author_names)
+    counts = np.bincount(codes, minlength=authors)
+    sums = np.bincount(codes, weights=ratings, minlength=authors)
+    present = np.flatnonzero(counts)
+    averages = sums[present] / counts[present]
+    key = counts[present] if sort == 'count' else averages
+    order = np.argsort(-key, kind='stable')[:limit]
+    return [{'author': COLUMNS.author_names[present[i]],
+             'count': int(counts[present[i]]),
+             'average_rating': round(float(averages[i]), 3)} for i in order]
@@ -0,0 +1,139 @@
+"""Gzip with a cache of compressed GET responses for the books apps.
+
+GETs under ``paths`` are answered from a small in-process cache for
+``ttl`` seconds: the endpoint runs once per path and query string, the
+body is gzipped once per entry, and each entry carries an ``ETag`` so a
+client sending it back in ``If-None-Match`` gets ``304 Not Modified``.
+Any successful POST/PUT/PATCH/DELETE drops the whole cache, since every
+write changes BOOKS. Everything else goes through Starlette's
+GZipMiddleware; HEAD requests and streaming responses pass through.
+"""
+import gzip
+import hashlib
+import time
+from collections import OrderedDict
+
+from starlette.middleware.gzip import GZipMiddleware
+
+MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class CachedResponse:
+    def __init__(self, status, headers, body, expires):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.expires = expires
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.gzipped = None
+
+
+class ResponseCache:
+    """Bounded LRU of ``(path, query string) -> CachedResponse``."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry.expires <= time.monotonic():
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry: CachedResponse) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def _header(headers, name: bytes):
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+class CachedGZipMiddleware:
+    def __init__(self, app, paths=("/books",), ttl: float = 30.0, minimum_size: int = 500,
+                 cache: ResponseCache = None):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+        self.paths = tuple(paths)
+        self.ttl = ttl
+        self.minimum_size = minimum_size
+        self.cache = cache if cache is not None else ResponseCache()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        if scope["method"] in MUTATING_METHODS:
+            await self.gzip(scope, receive, self._clearing(send))
+            return
+        if scope["method"] != "GET" or not scope["path"].startswith(self.paths):
+            await self.gzip(scope, receive, send)
+            return
+
+        key = (scope["path"], scope.get("query_string", b""))
+        entry = self.cache.get(key)
+        if entry is not None:
+            await self._send_entry(scope, entry, send)
+            return
+
+        start = None
+        chunks = []
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal start, streaming
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or streaming:
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                streaming = True
+                await send(start)
+                for chunk in chunks:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                return
+            body = b"".join(chunks)
+            headers = [(name, value) for name, value in start.get("headers", [])
+                       if name.lower() != b"content-length"]
+            entry = CachedResponse(start["status"], headers, body, time.monotonic() + self.ttl)
+            if start["status"] == 200:
+                self.cache.put(key, entry)
+            await self._send_entry(scope, entry, send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _clearing(self, send):
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and 200 <= message["status"] < 300:
+                self.cache.clear()
+            await send(message)
+        return send_wrapper
+
+    async def _send_entry(self, scope, entry, send):
+        headers = list(entry.headers) + [(b"etag", entry.etag.encode()), (b"vary", b"Accept-Encoding")]
+        if _header(scope["headers"], b"if-none-match") == entry.etag:
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        body = entry.body
+        if len(body) >= self.minimum_size and "gzip" in (_header(scope["headers"], b"accept-encoding") or ""):
+            if entry.gzipped is None:
+                entry.gzipped = gzip.compress(body, compresslevel=6, mtime=0)
+            body = entry.gzipped
+            headers.append((b"content-encoding", b"gzip"))
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
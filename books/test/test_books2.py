@@ -0,0 +1,133 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette import status
+
+from books import books2
+
+client = TestClient(books2.app)
+
+
+@pytest.fixture(autouse=True)
+def books(monkeypatch):
+    """A fresh BOOKS list and column view per test."""
+    catalogue = [
+        books2.Book(1, 'Computer Science Pro', 'codingwithroby', 'A very nice book!', 5, 2030),
+        books2.Book(2, 'Be Fast with FastAPI', 'codingwithroby', 'A great book!', 4, 2030),
+        books2.Book(3, 'HP1', 'Author 1', 'Book Description', 2, 2028),
+        books2.Book(4, 'HP2', 'Author 2', 'Book Description', 3, 2027),
+    ]
+    columns = books2.BookColumns(capacity=2)
+    columns.extend(catalogue)
+    monkeypatch.setattr(books2, 'BOOKS', catalogue)
+    monkeypatch.setattr(books2, 'COLUMNS', columns)
+    books2.response_cache.clear()
+    return catalogue
+
+
+def _book(title='Imported book', **fields):
+    return {'title': title, 'author': 'Importer', 'description': 'Bulk', 'rating': 4,
+            'published_date': 2025, **fields}
+
+
+def _ndjson(*lines):
+    return '\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines).encode()
+
+
+def test_import_appends_books_with_new_ids(books):
+    response = client.post('/books/import', content=_ndjson(_book('First'), _book('Second'), ''))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {'imported': 2, 'rejected': 0, 'errors': []}
+    assert [(book.id, book.title) for book in books[-2:]] == [(5, 'First'), (6, 'Second')]
+    assert books2.COLUMNS.size == 6
+
+
+def test_import_reports_invalid_lines_by_number(books):
+    body = _ndjson(_book('Good'), '{not json', _book(rating=9), '', _book('Also good'))
+    result = client.post('/books/import', content=body).json()
+    assert (result['imported'], result['rejected']) == (2, 2)
+    assert [error['line'] for error in result['errors']] == [2, 3]
+    assert result['errors'][0]['error'].startswith('invalid JSON')
+    assert result['errors'][1]['error'].startswith('rating:')
+    assert [book.title for book in books[-2:]] == ['Good', 'Also good']
+
+
+def test_import_reads_a_last_line_without_newline(books):
+    result = client.post('/books/import', content=_ndjson(_book('First'), _book('Last'))).json()
+    assert result['imported'] == 2
+    assert books[-1].title == 'Last'
+
+
+def test_import_skips_oversized_lines(books, monkeypatch):
+    monkeypatch.setattr(books2, 'MAX_LINE_BYTES', 200)
+
+    def chunks():
+        yield _ndjson(_book('Before'), '')
+        for _ in range(5):
+            yield b'x' * 100  # one line spread over several chunks
+        yield b'\n' + _ndjson(_book('After'), '')
+        yield b'y' * 300  # unterminated last line
+
+    result = client.post('/books/import', content=chunks()).json()
+    assert (result['imported'], result['rejected']) == (2, 2)
+    assert [error['line'] for error in result['errors']] == [2, 4]
+    assert [book.title for book in books[-2:]] == ['Before', 'After']
+
+
+def test_rating_histogram_with_filters():
+    assert client.get('/books/stats/ratings').json() == {
+        'total': 4, 'mean': 3.5, 'counts': {'1': 0, '2': 1, '3': 1, '4': 1, '5': 1}}
+    result = client.get('/books/stats/ratings', params={'min_year': 2029, 'author': 'codingwithroby'}).json()
+    assert (result['total'], result['mean']) == (2, 4.5)
+
+
+def test_books_per_year_with_filters():
+    assert client.get('/books/stats/published').json() == {'total': 4, 'counts': {'2027': 1, '2028': 1, '2030': 2}}
+    assert client.get('/books/stats/published', params={'max_rating': 3}).json() == {
+        'total': 2, 'counts': {'2027': 1, '2028': 1}}
+
+
+def test_author_averages_sorted():
+    by_count = client.get('/books/stats/authors').json()
+    assert by_count[0] == {'author': 'codingwithroby', 'count': 2, 'average_rating': 4.5}
+    by_average = client.get('/books/stats/authors', params={'sort': 'average_rating', 'limit': 2}).json()
+    assert [row['author'] for row in by_average] == ['codingwithroby', 'Author 2']
+
+
+def test_stats_follow_writes():
+    client.delete('/books/1')
+    assert client.get('/books/stats/ratings').json()['total'] == 3
+    assert client.get('/books/stats/authors', params={'author': 'codingwithroby'}).json() == [
+        {'author': 'codingwithroby', 'count': 1, 'average_rating': 4.0}]
+
+
+def test_stats_with_no_matching_books():
+    filters = {'author': 'Nobody'}
+    assert client.get('/books/stats/ratings', params=filters).json() == {
+        'total': 0, 'mean': None, 'counts': {str(rating): 0 for rating in range(1, 6)}}
+    assert client.get('/books/stats/published', params=filters).json() == {'total': 0, 'counts': {}}
+    assert client.get('/books/stats/authors', params=filters).json() == []
+    assert client.get('/books/stats/ratings', params={'min_rating': 6}).status_code == 422
+
+
+def test_book_lists_are_cached_until_a_write(books):
+    headers = {'Accept-Encoding': 'gzip'}
+    first = client.get('/books', headers=headers)
+    books.append(books2.Book(99, 'Behind the cache', 'Nobody', 'Not via the API', 1, 2001))
+    cached = client.get('/books', headers=headers)
+    assert cached.json() == first.json()
+    assert cached.headers['etag'] == first.headers['etag']
+    assert client.get('/books', headers={'If-None-Match': first.headers['etag']}).status_code == 304
+
+    client.delete('/books/1')
+    fresh = client.get('/books').json()
+    assert [book['id'] for book in fresh] == [2, 3, 4, 99]
+
+
+def test_large_cached_responses_are_gzipped(books):
+    books.extend(books2.Book(i, f'Book {i}', 'Author', 'Padding', 3, 2020) for i in range(5, 40))
+    response = client.get('/books', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert len(response.json()) == 39
+    assert 'content-encoding' not in client.head('/books').headers
@@ -1,14 +1,20 @@
+import os
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 from alembic import context
-import models
+from todo import models
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
-fileConfig(config.config_file_name)
+# Keep loggers configured by an embedding process (e.g. todo.server) alive.
+fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+# Migrate the same database the app talks to when DATABASE_URL is exported.
+if os.getenv("DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"].replace("%", "%%"))
 target_metadata = models.Base.metadata
 
 # Interpret the config file for Python logging.
@@ -67,8 +73,11 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        # One transaction per revision, so a finished revision stays applied
+        # when a later (e.g. long backfill) one is interrupted.
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
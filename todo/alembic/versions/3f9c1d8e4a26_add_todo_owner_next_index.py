@@ -0,0 +1,29 @@
+"""add todo owner next index
+
+Revision ID: 3f9c1d8e4a26
+Revises: e8a3f2b61c07
+Create Date: 2026-10-19 16:41:08.305522
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from todo import migrate
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c1d8e4a26'
+down_revision: Union[str, None] = 'e8a3f2b61c07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        migrate.create_index(op.get_bind(), 'ix_todos_owner_next', 'todos',
+                             ['owner_id', 'complete', 'priority', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_todos_owner_next', table_name='todos')
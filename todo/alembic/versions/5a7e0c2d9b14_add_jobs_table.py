@@ -0,0 +1,44 @@
+"""add jobs table
+
+Revision ID: 5a7e0c2d9b14
+Revises: 3f9c1d8e4a26
+Create Date: 2026-10-19 19:27:15.640387
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a7e0c2d9b14'
+down_revision: Union[str, None] = '3f9c1d8e4a26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('params', sa.Text()),
+        sa.Column('progress', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Integer()),
+        sa.Column('result', sa.Text()),
+        sa.Column('error', sa.String()),
+        sa.Column('cancel_requested', sa.Boolean(), nullable=False),
+        sa.Column('created_by', sa.Integer()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('started_at', sa.DateTime()),
+        sa.Column('finished_at', sa.DateTime()),
+        if_not_exists=True,
+    )
+    op.create_index('ix_jobs_id', 'jobs', ['id'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_jobs_id', table_name='jobs')
+    op.drop_table('jobs')
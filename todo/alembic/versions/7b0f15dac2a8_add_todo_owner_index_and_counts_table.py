@@ -0,0 +1,35 @@
+"""add todo owner index and counts table
+
+Revision ID: 7b0f15dac2a8
+Revises: aeff25f89db0
+Create Date: 2026-10-18 22:48:22.583268
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b0f15dac2a8'
+down_revision: Union[str, None] = 'aeff25f89db0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_todos_owner_id', 'todos', ['owner_id'], if_not_exists=True)
+    op.create_table(
+        'todo_counts',
+        sa.Column('owner_id', sa.Integer(), primary_key=True),
+        sa.Column('complete', sa.Boolean(), primary_key=True),
+        sa.Column('priority', sa.Integer(), primary_key=True),
+        sa.Column('count', sa.Integer(), nullable=False),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('todo_counts')
+    op.drop_index('ix_todos_owner_id', table_name='todos')
@@ -0,0 +1,28 @@
+"""add todo completed_at index
+
+Revision ID: 9d2b6f4e1a37
+Revises: 5a7e0c2d9b14
+Create Date: 2026-10-20 10:12:44.918203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from todo import migrate
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d2b6f4e1a37'
+down_revision: Union[str, None] = '5a7e0c2d9b14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        migrate.create_index(op.get_bind(), 'ix_todos_completed_at', 'todos', ['completed_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_todos_completed_at', table_name='todos')
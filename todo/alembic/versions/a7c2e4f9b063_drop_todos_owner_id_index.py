@@ -0,0 +1,29 @@
+"""drop todos owner_id index
+
+Revision ID: a7c2e4f9b063
+Revises: f3b9d6a2c581
+Create Date: 2026-10-23 11:02:45.183907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from todo import migrate
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c2e4f9b063'
+down_revision: Union[str, None] = 'f3b9d6a2c581'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ix_todos_owner_next starts with owner_id, so it serves every lookup by owner.
+    op.drop_index('ix_todos_owner_id', table_name='todos', if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        migrate.create_index(op.get_bind(), 'ix_todos_owner_id', 'todos', ['owner_id'])
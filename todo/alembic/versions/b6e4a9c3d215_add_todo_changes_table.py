@@ -0,0 +1,37 @@
+"""add todo changes table
+
+Revision ID: b6e4a9c3d215
+Revises: 9d2b6f4e1a37
+Create Date: 2026-10-21 09:03:51.264117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e4a9c3d215'
+down_revision: Union[str, None] = '9d2b6f4e1a37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'todo_changes',
+        sa.Column('seq', sa.Integer(), primary_key=True),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('op', sa.String(), nullable=False),
+        sa.Column('todo_id', sa.Integer(), nullable=False),
+        sa.Column('todo', sa.Text()),
+        sqlite_autoincrement=True,
+        if_not_exists=True,
+    )
+    op.create_index('ix_todo_changes_owner_seq', 'todo_changes', ['owner_id', 'seq'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_todo_changes_owner_seq', table_name='todo_changes')
+    op.drop_table('todo_changes')
@@ -0,0 +1,57 @@
+"""todos autoincrement ids
+
+Revision ID: d0a7c5e2f813
+Revises: b6e4a9c3d215
+Create Date: 2026-10-21 14:37:09.553820
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from todo.models import TODOS_FTS_DDL
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd0a7c5e2f813'
+down_revision: Union[str, None] = 'b6e4a9c3d215'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _rebuild_todos(autoincrement: bool) -> None:
+    # SQLite cannot add AUTOINCREMENT in place; the copy drops the FTS
+    # triggers with the old table, so put them back and reindex.
+    with op.batch_alter_table('todos', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': autoincrement}):
+        pass
+    for statement in TODOS_FTS_DDL:
+        op.execute(statement)
+    op.execute("INSERT INTO todos_fts(todos_fts) VALUES ('rebuild')")
+
+
+def upgrade() -> None:
+    # PostgreSQL sequences never hand an id out twice.
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    highest = bind.scalar(sa.text("SELECT COALESCE(MAX(id), 0) FROM todos"))
+    if sa.inspect(bind).has_table('todos_archive'):
+        highest = max(highest, bind.scalar(sa.text("SELECT COALESCE(MAX(id), 0) FROM todos_archive")))
+        # Todos that already took the id of an archived one get a fresh id.
+        reused = bind.scalars(sa.text("SELECT id FROM todos WHERE id IN (SELECT id FROM todos_archive) "
+                                      "ORDER BY id")).all()
+        for todo_id in reused:
+            highest += 1
+            bind.execute(sa.text("UPDATE todos SET id = :new WHERE id = :old"), {"new": highest, "old": todo_id})
+
+    _rebuild_todos(autoincrement=True)
+    op.execute("DELETE FROM sqlite_sequence WHERE name = 'todos'")
+    bind.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('todos', :seq)"), {"seq": highest})
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    _rebuild_todos(autoincrement=False)
@@ -0,0 +1,54 @@
+"""add completed_at and todos archive
+
+Revision ID: e8a3f2b61c07
+Revises: c41d7e9a0b52
+Create Date: 2026-10-19 14:03:52.720914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from todo import migrate
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a3f2b61c07'
+down_revision: Union[str, None] = 'c41d7e9a0b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('todos')}
+    if 'completed_at' not in columns:
+        op.add_column('todos', sa.Column('completed_at', sa.DateTime(), nullable=True))
+    op.create_table(
+        'todos_archive',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column('title', sa.String()),
+        sa.Column('description', sa.String()),
+        sa.Column('priority', sa.Integer()),
+        sa.Column('complete', sa.Boolean()),
+        sa.Column('owner_id', sa.Integer()),
+        sa.Column('completed_at', sa.DateTime()),
+        sa.Column('archived_at', sa.DateTime()),
+        if_not_exists=True,
+    )
+    op.create_index('ix_todos_archive_owner_id', 'todos_archive', ['owner_id'], if_not_exists=True)
+
+    # Todos completed before the column existed start their archive clock now.
+    with op.get_context().autocommit_block():
+        migrate.backfill(
+            op.get_bind(), 'todos.completed_at', 'todos',
+            values={'completed_at': sa.func.current_timestamp()},
+            where=sa.and_(sa.column('complete').is_(True), sa.column('completed_at').is_(None)),
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_todos_archive_owner_id', table_name='todos_archive')
+    op.drop_table('todos_archive')
+    with op.batch_alter_table('todos') as batch_op:
+        batch_op.drop_column('completed_at')
@@ -0,0 +1,32 @@
+"""add jobs owner and heartbeat
+
+Revision ID: f3b9d6a2c581
+Revises: d0a7c5e2f813
+Create Date: 2026-10-22 09:18:27.406115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b9d6a2c581'
+down_revision: Union[str, None] = 'd0a7c5e2f813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('jobs')}
+    if 'owner' not in columns:
+        op.add_column('jobs', sa.Column('owner', sa.String(), nullable=True))
+    if 'heartbeat_at' not in columns:
+        op.add_column('jobs', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('jobs') as batch:
+        batch.drop_column('heartbeat_at')
+        batch.drop_column('owner')
@@ -0,0 +1,205 @@
+# todo/archive.py
+"""Moves completed todos out of the hot ``todos`` table.
+
+Todos completed more than ``TODO_ARCHIVE_AFTER_DAYS`` days ago (default 30)
+are copied to ``todos_archive`` and deleted from ``todos`` in batches, so
+the hot table and its indexes only hold live work. The archive lives in
+the main database, or in ``ARCHIVE_DATABASE_URL`` when that is set; with
+sharding on, every shard is archived into it.
+
+A pass runs every ``TODO_ARCHIVE_INTERVAL_SECONDS`` in the app when that is
+set, in one worker process at a time (the others skip the pass while the
+``TODO_ARCHIVE_LOCK`` file lock is held), or on demand::
+
+    python -m todo.archive run --days 30
+
+Each batch is written to the archive before it is deleted from ``todos``,
+so an interrupted pass is safe to repeat. The delete re-checks the
+completed-before-cutoff condition, and only the rows it actually removed
+are taken off the stats and published as archived, so a todo reopened in
+between, or a concurrent pass on another host, is handled. Stats (``todo/stats.py``) count
+the hot table only; the read handlers consult the archive when called with
+``include_archived=true``.
+"""
+import argparse
+import asyncio
+import fcntl
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from . import changes, database, sharding, stats
+from .models import Todos, TodosArchive
+
+logger = logging.getLogger("todo.archive")
+
+ARCHIVE_DATABASE_URL = os.getenv("ARCHIVE_DATABASE_URL")
+ARCHIVE_AFTER_DAYS = float(os.getenv("TODO_ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("TODO_ARCHIVE_INTERVAL_SECONDS", "0"))
+BATCH_SIZE = int(os.getenv("TODO_ARCHIVE_BATCH_SIZE", "500"))
+LOCK_PATH = os.getenv("TODO_ARCHIVE_LOCK", os.path.join(tempfile.gettempdir(), "todo-archive.lock"))
+
+engine = (
+    create_engine(ARCHIVE_DATABASE_URL,
+                  connect_args={"check_same_thread": False} if ARCHIVE_DATABASE_URL.startswith("sqlite") else {})
+    if ARCHIVE_DATABASE_URL else None
+)
+_ArchiveSession = sessionmaker(autoflush=False, bind=engine) if engine is not None else None
+
+_columns = [column.name for column in Todos.__table__.columns]
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def session():
+    """A session on the archive database."""
+    if _ArchiveSession is not None:
+        return _ArchiveSession()
+    return database.SessionLocal()
+
+
+def create_all() -> None:
+    if engine is not None:
+        TodosArchive.metadata.create_all(bind=engine, tables=[TodosArchive.__table__])
+
+
+def dispose(close: bool = True) -> None:
+    if engine is not None:
+        engine.dispose(close=close)
+
+
+def archived_for_owner(owner_id: int):
+    archive_db = session()
+    try:
+        return archive_db.scalars(select(TodosArchive).where(TodosArchive.owner_id == owner_id)
+                                  .order_by(TodosArchive.id)).all()
+    finally:
+        archive_db.close()
+
+
+def archived_todo(todo_id: int, owner_id: int):
+    archive_db = session()
+    try:
+        return archive_db.scalars(select(TodosArchive).where(TodosArchive.id == todo_id,
+                                                             TodosArchive.owner_id == owner_id)).first()
+    finally:
+        archive_db.close()
+
+
+def archive_batch(db, archive_db, cutoff: datetime, batch_size: int = BATCH_SIZE) -> int:
+    """Move up to ``batch_size`` todos completed before ``cutoff``; returns how many
+    were selected (0 once none are left)."""
+    archivable = (Todos.complete.is_(True), Todos.completed_at < cutoff)
+    rows = db.execute(
+        select(Todos.__table__).where(*archivable)
+        .order_by(Todos.completed_at, Todos.id).limit(batch_size)
+    ).mappings().all()
+    if not rows:
+        return 0
+    ids = [row["id"] for row in rows]
+    archived_at = _now()
+    # Todo ids are never reused, so a row already in the archive is this same
+    # todo, copied by a pass that stopped before deleting it; keep that copy.
+    upsert = postgresql.insert if archive_db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    archive_db.execute(upsert(TodosArchive).on_conflict_do_nothing(index_elements=[TodosArchive.id]), [
+        {**{name: row[name] for name in _columns}, "archived_at": archived_at} for row in rows
+    ])
+    archive_db.commit()
+
+    # Rows reopened or deleted since the select are left alone.
+    deleted = db.execute(
+        delete(Todos).where(Todos.id.in_(ids), *archivable)
+        .returning(Todos.id, Todos.owner_id, Todos.complete, Todos.priority)
+    ).all()
+    for row in deleted:
+        stats.record(db, row.owner_id, row.complete, row.priority, -1)
+        changes.record(db, row.owner_id, "archived", row.id)
+    db.commit()
+    changes.notify()
+
+    # A copy of a todo that is still live (reopened in between) is dropped;
+    # copies of rows another pass deleted are that pass's archive rows.
+    kept = set(ids) - {row.id for row in deleted}
+    if kept:
+        live = db.scalars(select(Todos.id).where(Todos.id.in_(kept))).all()
+        if live:
+            archive_db.execute(delete(TodosArchive).where(TodosArchive.id.in_(live)))
+            archive_db.commit()
+    return len(rows)
+
+
+def run(days: float = None, batch_size: int = BATCH_SIZE, progress=None) -> int:
+    """Archive every todo completed more than ``days`` days ago; returns the count."""
+    cutoff = _now() - timedelta(days=ARCHIVE_AFTER_DAYS if days is None else days)
+    moved = 0
+    archive_db = session()
+    try:
+        for db in sharding.todo_sessions():
+            try:
+                while True:
+                    count = archive_batch(db, archive_db, cutoff, batch_size)
+                    if not count:
+                        break
+                    moved += count
+                    if progress is not None:
+                        progress(f"archived {moved} todos so far")
+            finally:
+                db.close()
+    finally:
+        archive_db.close()
+    return moved
+
+
+def run_exclusive(lock_path: str = LOCK_PATH, **kwargs):
+    """:func:`run` unless another process on this host is running a pass; then None."""
+    with open(lock_path, "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        try:
+            return run(**kwargs)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+async def run_periodically(interval: float = ARCHIVE_INTERVAL_SECONDS) -> None:
+    """Background task started by the lifespan hook when an interval is set.
+
+    Every worker process starts one; the lock lets only one of them run a
+    given pass.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            moved = await run_in_threadpool(run_exclusive)
+        except Exception:
+            logger.exception("archive pass failed")
+        else:
+            if moved:
+                logger.info("archived %d todos", moved)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Archive completed todos.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("run", help="archive todos completed before the threshold")
+    command.add_argument("--days", type=float, default=ARCHIVE_AFTER_DAYS)
+    command.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    create_all()
+    moved = run(days=args.days, batch_size=args.batch_size, progress=print)
+    print(f"Archived {moved} todos.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# todo/bench/bench_queries.py
+"""Per-request ORM overhead of the hot todo queries, before and after.
+
+Runs against an in-memory SQLite database so the numbers are dominated by
+Python-side work (query construction, cache lookups, ORM loading)::
+
+    python -m todo.bench.bench_queries --iterations 5000
+"""
+import argparse
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from todo import queries
+from todo.models import Base, Todos
+
+
+def _legacy_todo_for_owner(db, todo_id, owner_id):
+    return (
+        db.query(Todos)
+        .filter(Todos.id == todo_id)
+        .filter(Todos.owner_id == owner_id)
+        .first()
+    )
+
+
+def _legacy_todos_for_owner(db, owner_id):
+    return db.query(Todos).filter(Todos.owner_id == owner_id).all()
+
+
+CASES = [
+    ("read_todo", _legacy_todo_for_owner, queries.todo_for_owner, lambda i: (i % 1000 + 1, i % 10)),
+    ("read_all", _legacy_todos_for_owner, queries.todos_for_owner, lambda i: (i % 10,)),
+]
+
+
+def _time(session_factory, fn, args_for, iterations):
+    db = session_factory()
+    try:
+        started = time.perf_counter()
+        for i in range(iterations):
+            fn(db, *args_for(i))
+            db.expunge_all()  # one session per request in the app
+        return (time.perf_counter() - started) / iterations * 1e6
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+    with session_factory() as db:
+        db.add_all(Todos(title=f"todo {i}", description="benchmark", priority=i % 5 + 1,
+                         complete=False, owner_id=i % 10) for i in range(1000))
+        db.commit()
+
+    print(f"{'query':<12}{'db.query() us':>16}{'prebuilt us':>14}{'speedup':>10}")
+    for name, legacy, prebuilt, args_for in CASES:
+        _time(session_factory, prebuilt, args_for, 100)  # warm the compiled cache
+        before = _time(session_factory, legacy, args_for, args.iterations)
+        queries.reset_statement_cache_stats()
+        after = _time(session_factory, prebuilt, args_for, args.iterations)
+        print(f"{name:<12}{before:>16.1f}{after:>14.1f}{before / after:>9.2f}x")
+
+    cache = queries.statement_cache_stats()
+    print(f"compiled cache hit rate (prebuilt, last case): {cache['hit_rate']:.1%} {cache}")
+
+
+if __name__ == "__main__":
+    main()
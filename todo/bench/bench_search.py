@@ -0,0 +1,94 @@
+# todo/bench/bench_search.py
+"""Owner-scoped todo search: FTS5 + bm25 against a ``LIKE '%term%'`` scan.
+
+Builds a throwaway SQLite file (the FTS index is filled by the same triggers
+the app uses) and times both strategies for a few terms of different
+selectivity::
+
+    python -m todo.bench.bench_search --rows 1000000 --owners 10
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from todo import search
+from todo.models import Base, Todos
+
+WORDS = ("buy milk eggs bread call mom dentist invoice report deploy review "
+         "garden water plants taxes gym book flight hotel car insurance "
+         "meeting slides budget email refactor tests release backup").split()
+RARE = "zeppelin"
+
+
+def _fill(engine, rows, owners, batch_size=50_000):
+    rng = random.Random(7)
+    for start in range(0, rows, batch_size):
+        batch = []
+        for i in range(start, min(start + batch_size, rows)):
+            title = " ".join(rng.choices(WORDS, k=3))
+            description = " ".join(rng.choices(WORDS, k=8))
+            if i % 10_000 == 0:
+                description += f" {RARE}"
+            batch.append({"title": title, "description": description, "priority": i % 5 + 1,
+                          "complete": False, "owner_id": i % owners + 1})
+        with engine.begin() as connection:
+            connection.execute(insert(Todos), batch)
+        print(f"  inserted {start + len(batch):,} rows", end="\r")
+    print()
+
+
+def _like(db, owner_id, term, limit):
+    pattern = f"%{term}%"
+    return db.scalars(
+        select(Todos).where(Todos.owner_id == owner_id,
+                            Todos.title.like(pattern) | Todos.description.like(pattern))
+        .order_by(Todos.id).limit(limit)
+    ).all()
+
+
+def _time(session_factory, fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        db = session_factory()
+        try:
+            started = time.perf_counter()
+            found = fn(db)
+            timings.append(time.perf_counter() - started)
+        finally:
+            db.close()
+    return sorted(timings)[len(timings) // 2] * 1000, len(found)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--owners", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'search.db')}")
+        Base.metadata.create_all(bind=engine)
+        print(f"building {args.rows:,} todos for {args.owners} owners ...")
+        started = time.perf_counter()
+        _fill(engine, args.rows, args.owners)
+        print(f"built in {time.perf_counter() - started:.1f}s (FTS index maintained by triggers)")
+        session_factory = sessionmaker(bind=engine, autoflush=False)
+
+        print(f"{'term':<12}{'LIKE ms':>10}{'FTS5 ms':>10}{'speedup':>10}{'hits':>8}")
+        for term in ("milk", "plants", RARE):
+            like_ms, like_hits = _time(session_factory, lambda db: _like(db, 1, term, args.limit), args.repeat)
+            fts_ms, fts_hits = _time(
+                session_factory, lambda db: search.search_todos(db, 1, term, limit=args.limit), args.repeat)
+            print(f"{term:<12}{like_ms:>10.2f}{fts_ms:>10.2f}{like_ms / fts_ms:>9.1f}x{fts_hits:>8}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# todo/bench/bench_shards.py
+"""Write throughput of 1 shard versus N shards.
+
+Each writer thread inserts todos for random owners, one commit per todo as
+the create handler does, into temporary SQLite files::
+
+    python -m todo.bench.bench_shards --shards 4 --writers 8 --writes 200
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from todo import sharding
+from todo.models import Todos
+from todo.sharding import ShardSet
+
+
+def _writer(shard_set, writes, seed, errors):
+    rng = random.Random(seed)
+    for _ in range(writes):
+        owner_id = rng.randrange(1, 10_000)
+        db = shard_set.session_for(owner_id)
+        try:
+            todo = Todos(title="bench", description="shard benchmark", priority=1,
+                         complete=False, owner_id=owner_id)
+            todo.id = sharding.allocate_todo_id(db)
+            db.add(todo)
+            db.commit()
+        except OperationalError:  # "database is locked" past the busy timeout
+            errors.append(owner_id)
+        finally:
+            db.close()
+
+
+def run(shard_count, writers, writes, directory):
+    shard_set = ShardSet([f"sqlite:///{directory}/bench_{shard_count}_{index}.db"
+                          for index in range(shard_count)])
+    shard_set.create_all()
+    errors = []
+    threads = [threading.Thread(target=_writer, args=(shard_set, writes, seed, errors))
+               for seed in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    shard_set.dispose()
+    return (writers * writes - len(errors)) / elapsed, len(errors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=200, help="commits per writer")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for shard_count in (1, args.shards):
+            rate, errors = run(shard_count, args.writers, args.writes, directory)
+            print(f"{shard_count:>3} shard(s): {rate:8.1f} commits/s ({errors} lock errors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+# todo/changes.py
+"""Publish/subscribe feed of todo changes, shared by every worker process.
+
+The todos and admin write handlers :func:`record` a change in the same
+session and transaction as the write itself, so a change is stored
+exactly when its write commits, and then :func:`notify` the local poller.
+Changes go to the ``todo_changes`` table of the database holding the
+owner's todos (the owner's shard with sharding on), whose ``seq`` is the
+cursor clients resume from, so any worker can answer for any cursor and a
+write handled by one worker reaches subscribers on all the others. Each
+process runs one poller thread while it has live subscribers: it reads new
+rows every ``TODO_CHANGES_POLL_SECONDS`` (at once after a local write)
+and hands them to the subscribers' bounded queues.
+
+Each table keeps the newest ``TODO_CHANGES_HISTORY`` rows. A cursor older
+than that, one past the end of the log (e.g. from before a rebalance), or
+one that is not a number yields ``reset`` and the client refetches
+``/todos/``.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+
+from sqlalchemy import delete, func, select, text
+
+from . import database, sharding
+from .models import TodoChanges
+
+logger = logging.getLogger("todo.changes")
+
+HISTORY_SIZE = int(os.getenv("TODO_CHANGES_HISTORY", "100000"))  # rows kept in todo_changes
+MAX_BACKLOG = 1000   # changes returned for one cursor before asking for a reset
+BUFFER_SIZE = 100    # undelivered changes per live subscriber
+POLL_SECONDS = float(os.getenv("TODO_CHANGES_POLL_SECONDS", "0.5"))
+PRUNE_EVERY = 100    # recorded changes between prunes of old rows
+
+
+def todo_dict(todo) -> dict:
+    return {
+        "id": todo.id,
+        "title": todo.title,
+        "description": todo.description,
+        "priority": todo.priority,
+        "complete": todo.complete,
+        "owner_id": todo.owner_id,
+    }
+
+
+class Subscription:
+    def __init__(self, bus, owner_id, loop, size):
+        self._bus = bus
+        self.owner_id = owner_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+
+    def _offer(self, change):
+        # Runs on the subscriber's loop.
+        if self.queue.full():
+            self.overflowed = True
+        else:
+            self.queue.put_nowait(change)
+
+    async def get(self, timeout=None):
+        """Next change, or None on timeout."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def drain(self):
+        changes = []
+        while not self.queue.empty():
+            changes.append(self.queue.get_nowait())
+        return changes
+
+    def close(self):
+        self._bus._unsubscribe(self)
+
+
+def _change(row) -> dict:
+    return {"seq": row.seq, "op": row.op, "id": row.todo_id,
+            "todo": json.loads(row.todo) if row.todo is not None else None}
+
+
+class ChangeBus:
+    def __init__(self, session_factory=None, history_size=HISTORY_SIZE, buffer_size=BUFFER_SIZE,
+                 poll_seconds=POLL_SECONDS):
+        # None: the todo databases, looked up per call so a patched
+        # database.SessionLocal or shard set is honoured.
+        self._session_factory = session_factory
+        self._history_size = history_size
+        self._buffer_size = buffer_size
+        self._poll_seconds = poll_seconds
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._last_seen = {}  # log index -> last dispatched seq
+        self._poller = None
+        self._poller_pid = None
+        self._recorded = 0
+
+    def _logs(self) -> int:
+        if self._session_factory is None and sharding.ENABLED:
+            return len(sharding.shards)
+        return 1
+
+    def _session(self, index: int = 0):
+        if self._session_factory is not None:
+            return self._session_factory()
+        if sharding.ENABLED:
+            return sharding.shards.session(index)
+        return database.SessionLocal()
+
+    def _log_for(self, owner_id: int) -> int:
+        if self._session_factory is None and sharding.ENABLED:
+            return sharding.shards.index_for(owner_id)
+        return 0
+
+    def latest(self, owner_id: int) -> int:
+        """The newest seq in the log holding ``owner_id``'s changes."""
+        with self._session(self._log_for(owner_id)) as db:
+            return db.scalar(select(func.max(TodoChanges.seq))) or 0
+
+    @staticmethod
+    def cursor(seq: int) -> str:
+        return str(seq)
+
+    @staticmethod
+    def parse_cursor(cursor):
+        """The sequence number in ``cursor``, or None if it is not one."""
+        if not cursor or not cursor.isdigit():
+            return None
+        return int(cursor)
+
+    def record(self, db, owner_id: int, op: str, todo_id: int, todo: dict = None):
+        """Add a change to ``db``'s transaction; it is stored when the caller commits."""
+        if db.get_bind().dialect.name == "postgresql":
+            # Commit in seq order, so pollers never skip a late, lower seq.
+            db.execute(text("SELECT pg_advisory_xact_lock(8427001)"))
+        row = TodoChanges(owner_id=owner_id, op=op, todo_id=todo_id,
+                          todo=json.dumps(todo) if todo is not None else None)
+        db.add(row)
+        self._recorded += 1
+        if self._recorded % PRUNE_EVERY == 0:
+            self.prune(db, commit=False)
+        return row
+
+    def notify(self) -> None:
+        """Wake this process's poller after a commit that recorded changes."""
+        self._wake.set()
+
+    def publish(self, owner_id: int, op: str, todo_id: int, todo: dict = None) -> dict:
+        """Record a change in a transaction of its own; for callers without a write session."""
+        with self._session(self._log_for(owner_id)) as db:
+            row = self.record(db, owner_id, op, todo_id, todo)
+            db.flush()
+            change = _change(row)
+            db.commit()
+        self.notify()
+        return change
+
+    def prune(self, db=None, commit: bool = True) -> None:
+        """Drop all but the newest ``history_size`` changes of ``db`` (default every log)."""
+        sessions = [db] if db is not None else [self._session(index) for index in range(self._logs())]
+        for session in sessions:
+            try:
+                newest = select(func.max(TodoChanges.seq)).scalar_subquery()
+                session.execute(delete(TodoChanges).where(TodoChanges.seq <= newest - self._history_size))
+                if commit:
+                    session.commit()
+            finally:
+                if db is None:
+                    session.close()
+
+    def since(self, owner_id: int, seq: int):
+        """``(changes after seq, complete)``; incomplete means some were pruned
+        or ``seq`` is not from this log."""
+        with self._session(self._log_for(owner_id)) as db:
+            rows = db.scalars(select(TodoChanges)
+                              .where(TodoChanges.owner_id == owner_id, TodoChanges.seq > seq)
+                              .order_by(TodoChanges.seq).limit(MAX_BACKLOG + 1)).all()
+            oldest, newest = db.execute(select(func.min(TodoChanges.seq), func.max(TodoChanges.seq))).one()
+        # Every pruned row is older than the oldest one left.
+        complete = (oldest is None or seq >= oldest - 1) and seq <= (newest or 0) and len(rows) <= MAX_BACKLOG
+        return [_change(row) for row in rows], complete
+
+    def subscribe(self, owner_id: int) -> Subscription:
+        subscription = Subscription(self, owner_id, asyncio.get_running_loop(), self._buffer_size)
+        with self._lock:
+            if not self._subscribers:
+                # The poller was idle; the subscriber reads older changes with since().
+                self._last_seen = {index: self._newest(index) for index in range(self._logs())}
+            self._subscribers.setdefault(owner_id, set()).add(subscription)
+            # Threads do not survive a fork, so each process starts its own.
+            if self._poller_pid != os.getpid() or not self._poller.is_alive():
+                self._poller = threading.Thread(target=self._poll_loop, name="changes-poller", daemon=True)
+                self._poller_pid = os.getpid()
+                self._poller.start()
+        self._wake.set()
+        return subscription
+
+    def _newest(self, index: int) -> int:
+        with self._session(index) as db:
+            return db.scalar(select(func.max(TodoChanges.seq))) or 0
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.owner_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.owner_id]
+
+    def _poll_loop(self):
+        while True:
+            self._wake.wait(self._poll_seconds)
+            self._wake.clear()
+            if not self._subscribers:
+                continue
+            try:
+                for index in range(self._logs()):
+                    self._dispatch_new(index)
+            except Exception:
+                logger.exception("reading todo_changes failed; retrying")
+
+    def _dispatch_new(self, index: int = 0):
+        last_seen = self._last_seen.get(index, 0)
+        with self._session(index) as db:
+            rows = db.scalars(select(TodoChanges).where(TodoChanges.seq > last_seen)
+                              .order_by(TodoChanges.seq).limit(MAX_BACKLOG)).all()
+        for row in rows:
+            self._last_seen[index] = row.seq
+            with self._lock:
+                subscribers = list(self._subscribers.get(row.owner_id, ()))
+            change = _change(row)
+            for subscription in subscribers:
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription._offer, change)
+                except RuntimeError:  # the subscriber's loop is gone
+                    self._unsubscribe(subscription)
+
+
+bus = ChangeBus()
+
+
+def record(db, owner_id: int, op: str, todo_id: int, todo: dict = None) -> None:
+    bus.record(db, owner_id, op, todo_id, todo)
+
+
+def notify() -> None:
+    bus.notify()
+
+
+def _event(change: dict) -> str:
+    return f"id: {bus.cursor(change['seq'])}\nevent: {change['op']}\ndata: {json.dumps(change)}\n\n"
+
+
+def _reset_event(seq: int) -> str:
+    return f"id: {bus.cursor(seq)}\nevent: reset\ndata: {{}}\n\n"
+
+
+async def poll(owner_id: int, cursor: str = None, wait: float = 0) -> dict:
+    """Changes after ``cursor``, waiting up to ``wait`` seconds for one."""
+    # Subscribed before reading the backlog so nothing falls in between.
+    subscription = bus.subscribe(owner_id) if wait else None
+    try:
+        seq = bus.parse_cursor(cursor)
+        if seq is None:
+            return {"cursor": bus.cursor(bus.latest(owner_id)), "reset": cursor is not None, "changes": []}
+        pending, complete = bus.since(owner_id, seq)
+        if not complete:
+            return {"cursor": bus.cursor(bus.latest(owner_id)), "reset": True, "changes": []}
+        if not pending and subscription is not None:
+            first = await subscription.get(wait)
+            pending = [first] + subscription.drain() if first is not None else []
+    finally:
+        if subscription is not None:
+            subscription.close()
+    pending = [change for change in pending if change["seq"] > seq]
+    return {"cursor": bus.cursor(pending[-1]["seq"] if pending else seq),
+            "reset": False, "changes": pending}
+
+
+async def stream(request, owner_id: int, cursor: str = None, heartbeat: float = 15.0):
+    """Server-Sent Events for ``owner_id``, starting after ``cursor``."""
+    subscription = bus.subscribe(owner_id)
+    try:
+        seq = bus.parse_cursor(cursor)
+        pending, complete = bus.since(owner_id, seq) if seq is not None else ([], False)
+        if not complete:
+            seq = bus.latest(owner_id)
+            yield _reset_event(seq)
+        for change in pending:
+            seq = change["seq"]
+            yield _event(change)
+
+        while not await request.is_disconnected():
+            change = await subscription.get(heartbeat)
+            if subscription.overflowed:
+                # The client fell behind; it has to refetch anyway.
+                subscription.overflowed = False
+                subscription.drain()
+                seq = bus.latest(owner_id)
+                yield _reset_event(seq)
+            elif change is None:
+                yield ": keep-alive\n\n"
+            elif change["seq"] > seq:
+                seq = change["seq"]
+                yield _event(change)
+    finally:
+        subscription.close()
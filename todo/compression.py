@@ -0,0 +1,218 @@
+# todo/compression.py
+"""Response compression with a cache of precompressed GET responses.
+
+``CompressionMiddleware`` compresses response bodies of at least
+``minimum_size`` bytes with the best encoding the client accepts: brotli
+or zstd when the ``brotli`` / ``zstandard`` packages are installed, gzip
+otherwise. Streaming responses (more than one body message, e.g. the SSE
+change feed) and HEAD requests pass through untouched; a HEAD response has
+no body to compress and its ``content-length`` is the GET's.
+
+GETs under one of ``cache_paths`` are also cached for ``cache_ttl``
+seconds: a hit is answered from the cache without running the endpoint,
+and each encoding is compressed once per entry. Entries are keyed by path,
+query string and the request's credentials, and the whole cache is
+dropped whenever a POST/PUT/PATCH/DELETE succeeds. Changes made by another
+worker process or outside HTTP (jobs, the archiver) show up once the TTL
+expires.
+"""
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+ENCODERS = {"gzip": lambda body: gzip.compress(body, compresslevel=6, mtime=0)}
+if zstandard is not None:
+    ENCODERS["zstd"] = lambda body: zstandard.ZstdCompressor(level=3).compress(body)
+if brotli is not None:
+    ENCODERS["br"] = lambda body: brotli.compress(body, quality=5)
+
+# Preferred first when the client rates them equally.
+PREFERENCE = ["br", "zstd", "gzip"]
+
+SKIPPED_TYPES = ("text/event-stream", "image/", "video/", "audio/", "application/zip", "application/gzip")
+MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+def negotiate(accept_encoding: str, available=None):
+    """The encoding to use for ``accept_encoding``, or None for identity."""
+    available = ENCODERS if available is None else available
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for name in PREFERENCE:
+        if name not in available:
+            continue
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class CachedResponse:
+    def __init__(self, status, headers, body, expires):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.expires = expires
+        self.encoded = {}  # encoding -> compressed body
+
+
+class ResponseCache:
+    """Bounded LRU of identity responses plus their compressed variants."""
+
+    def __init__(self, max_entries=256, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires <= self.clock():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _header(headers, name: bytes):
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 500, cache_paths=(), cache_ttl: float = 30.0,
+                 cache_size: int = 256):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache_paths = tuple(cache_paths)
+        self.cache_ttl = cache_ttl
+        self.cache = ResponseCache(cache_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(_header(scope["headers"], b"accept-encoding") or "")
+        method = scope["method"]
+
+        cache_key = None
+        if method == "GET" and self.cache_ttl > 0 and scope["path"].startswith(self.cache_paths):
+            cache_key = self._cache_key(scope)
+            entry = self.cache.get(cache_key)
+            if entry is not None:
+                await self._send_entry(entry, encoding, send)
+                return
+
+        start = None
+        chunks = []
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal start, streaming
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or streaming:
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                # A streaming response: forward as is from here on.
+                streaming = True
+                await send(start)
+                for chunk in chunks:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                return
+
+            body = b"".join(chunks)
+            if method in MUTATING_METHODS and 200 <= start["status"] < 300:
+                self.cache.clear()
+            if not self._compressible(start["headers"]):
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+            entry = CachedResponse(start["status"], self._plain_headers(start["headers"]), body,
+                                   time.monotonic() + self.cache_ttl)
+            if cache_key is not None and start["status"] == 200:
+                self.cache.put(cache_key, entry)
+            await self._send_entry(entry, encoding, send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _cache_key(self, scope):
+        credentials = hashlib.sha256(
+            (_header(scope["headers"], b"authorization") or "").encode()
+            + b"\0" + (_header(scope["headers"], b"cookie") or "").encode()
+        ).hexdigest()
+        return scope["path"], scope.get("query_string", b""), credentials
+
+    @staticmethod
+    def _plain_headers(headers):
+        return [(key, value) for key, value in headers if key.lower() not in (b"content-length", b"vary")]
+
+    @staticmethod
+    def _compressible(headers):
+        if _header(headers, b"content-encoding") is not None:
+            return False
+        content_type = _header(headers, b"content-type") or ""
+        return not content_type.startswith(SKIPPED_TYPES)
+
+    async def _send_entry(self, entry, encoding, send):
+        body, headers = entry.body, list(entry.headers)
+        if encoding is not None and len(body) >= self.minimum_size:
+            compressed = entry.encoded.get(encoding)
+            if compressed is None:
+                compressed = entry.encoded[encoding] = ENCODERS[encoding](body)
+            body = compressed
+            headers.append((b"content-encoding", encoding.encode()))
+        headers.append((b"vary", b"Accept-Encoding"))
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
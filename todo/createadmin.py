@@ -1,43 +1,24 @@
+# todo/createadmin.py
+# Run from the repository root:  TODOPWD=... python -m todo.createadmin
 import os
-import sqlite3
-from passlib.context import CryptContext
 
-# Initialize bcrypt context with Passlib
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+from todo.provision import provision_users
 
-# The plain password to hash
+# The plain password comes from the environment, never from the source.
 plain_password = os.environ.get("TODOPWD")
 
-# Generate the hashed password using bcrypt
-hashed_password = bcrypt_context.hash(plain_password)
-
-# Connect to the SQLite database "todosapp.db" in the same directory
-conn = sqlite3.connect('todosapp.db')
-cursor = conn.cursor()
-
-# Prepare the SQL INSERT statement.
-sql = """
-INSERT INTO users (email, username, first_name, last_name, hashed_password, is_active, role, phone_number)
-VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-"""
-
 # Define the data for the admin user.
-data = (
-    "denis@example.com",  # email
-    "denis",              # username
-    "Denis",              # first_name
-    "Admin",              # last_name
-    hashed_password,      # hashed_password
-    1,                    # is_active (1 for True, 0 for False)
-    "admin",              # role (set to admin)
-    "0000000000"          # phone_number (dummy value)
-)
-
-# Insert the admin user into the database.
-cursor.execute(sql, data)
-conn.commit()
+admin = {
+    "email": "denis@example.com",
+    "username": "denis",
+    "first_name": "Denis",
+    "last_name": "Admin",
+    "password": plain_password,
+    "role": "admin",
+    "phone_number": "0000000000",  # dummy value
+}
+
+# Goes through the models and DATABASE_URL like the bulk provisioning CLI.
+provision_users([admin], workers=0)
 
 print("Admin user 'denis' created successfully.")
-
-# Close the database connection.
-conn.close()
@@ -1,7 +1,14 @@
 # todo/database.py
+import itertools
 import os
+import threading
+import time
+from contextvars import ContextVar
+
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
 
 # ❶ try to read DATABASE_URL from the environment; fall back to todosapp.db
 SQLALCHEMY_DATABASE_URL = os.getenv(
@@ -9,9 +16,201 @@ SQLALCHEMY_DATABASE_URL = os.getenv(
     "sqlite:///./todosapp.db"  # default when the var isn’t set
 )
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {},
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# ❷ optional read replicas, comma separated; reads of read-only sessions go there
+REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+# ❸ after a user commits, their reads stay on the primary for this long
+READ_YOUR_WRITES_SECONDS = float(os.getenv("DATABASE_READ_YOUR_WRITES_SECONDS", "2"))
+
+
+def _create_engine(url: str):
+    return create_engine(
+        url,
+        connect_args={"check_same_thread": False} if url.startswith("sqlite") else {},
+    )
+
+
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+read_engines = [_create_engine(url) for url in REPLICA_URLS]
+
+# The user the current request acts for (set by auth.get_current_user); it
+# keys read-your-writes stickiness.
+current_user_id: ContextVar = ContextVar("current_user_id", default=None)
+
+# The current request's write times, ``{"seen": ..., "wrote": ...}`` (see
+# ReadYourWritesMiddleware); the dict is shared with threadpool copies of the context.
+request_writes: ContextVar = ContextVar("request_writes", default=None)
+
+LAST_WRITE_COOKIE = "last_write"
+LAST_WRITE_HEADER = b"x-last-write"
+
+
+class EngineRouter:
+    """Primary/replica engines, round-robin replica choice and stickiness.
+
+    A user's reads stay on the primary for ``sticky_seconds`` after they
+    wrote. The write time is remembered per user in this process and also
+    handed to the client (see ReadYourWritesMiddleware), so the stickiness
+    holds when the next request lands on another worker.
+    """
+
+    def __init__(self, primary, replicas=(), sticky_seconds=READ_YOUR_WRITES_SECONDS,
+                 evict_interval: float = 60.0, clock=time.time):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.sticky_seconds = sticky_seconds
+        self._next_replica = itertools.cycle(self.replicas) if self.replicas else None
+        self._last_write = {}
+        self._lock = threading.Lock()
+        self._clock = clock
+        self._evict_interval = evict_interval
+        self._next_eviction = clock() + evict_interval
+
+    def pick_replica(self):
+        if self._next_replica is None:
+            return None
+        with self._lock:
+            return next(self._next_replica)
+
+    def mark_write(self, key) -> None:
+        if not self.replicas:
+            return
+        now = self._clock()
+        writes = request_writes.get()
+        if writes is not None:
+            writes["wrote"] = now
+        if key is None:
+            return
+        with self._lock:
+            self._last_write[key] = now
+            if now >= self._next_eviction:
+                self._last_write = {user: wrote_at for user, wrote_at in self._last_write.items()
+                                    if now - wrote_at < self.sticky_seconds}
+                self._next_eviction = now + self._evict_interval
+
+    def is_sticky(self, key) -> bool:
+        now = self._clock()
+        writes = request_writes.get()
+        seen = writes.get("seen") if writes is not None else None
+        if seen is not None and 0 <= now - seen < self.sticky_seconds:
+            return True
+        if key is None:
+            return False
+        wrote_at = self._last_write.get(key)
+        if wrote_at is None:
+            return False
+        if now - wrote_at < self.sticky_seconds:
+            return True
+        with self._lock:
+            self._last_write.pop(key, None)
+        return False
+
+    def __len__(self):
+        return len(self._last_write)
+
+
+def _is_textual_write(clause) -> bool:
+    # text() carries no statement type; anything but a plain SELECT may write.
+    return isinstance(clause, TextClause) and not clause.text.lstrip()[:6].upper() == "SELECT"
+
+
+class RoutingSession(Session):
+    """Session sending the reads of read-only sessions to a replica.
+
+    A session is read-only when ``session.info["read_only"]`` is set (see the
+    routers' ``get_read_db``); it keeps to one replica for its lifetime and
+    falls back to the primary while the current user is within the
+    read-your-writes window. Flushes, DML (textual statements other than a
+    plain SELECT count as DML) and every other session use the primary.
+    """
+
+    def __init__(self, *args, router: EngineRouter = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.router = router
+        self._replica = None
+        self._wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.router is None:
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if self._flushing or isinstance(clause, UpdateBase) or _is_textual_write(clause):
+            self._wrote = True
+        elif (self.info.get("read_only") and not self._wrote
+              and not self.router.is_sticky(current_user_id.get())):
+            if self._replica is None:
+                self._replica = self.router.pick_replica()
+            if self._replica is not None:
+                return self._replica
+        return self.router.primary
+
+    def commit(self):
+        super().commit()
+        if self._wrote and self.router is not None:
+            self.router.mark_write(current_user_id.get())
+            self._wrote = False
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware carrying the last write time between requests.
+
+    The time comes in as the ``last_write`` cookie or the ``X-Last-Write``
+    header and, when the request wrote, goes back out in both, so a client's
+    next read stays on the primary whichever worker serves it.
+    """
+
+    def __init__(self, app, sticky_seconds=READ_YOUR_WRITES_SECONDS):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        writes = {"seen": _last_write_from(scope["headers"]), "wrote": None}
+        token = request_writes.set(writes)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and writes["wrote"] is not None:
+                stamp = f"{writes['wrote']:.3f}"
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (LAST_WRITE_HEADER, stamp.encode()),
+                    (b"set-cookie", f"{LAST_WRITE_COOKIE}={stamp}; Max-Age={max(1, int(self.sticky_seconds))}; "
+                                    f"Path=/; HttpOnly; SameSite=Lax".encode()),
+                ])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_writes.reset(token)
+
+
+def _last_write_from(headers):
+    for key, value in headers:
+        if key == LAST_WRITE_HEADER:
+            return _parse_stamp(value.decode("latin-1"))
+    for key, value in headers:
+        if key == b"cookie":
+            for part in value.decode("latin-1").split(";"):
+                name, _, stamp = part.strip().partition("=")
+                if name == LAST_WRITE_COOKIE:
+                    return _parse_stamp(stamp)
+    return None
+
+
+def _parse_stamp(value: str):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def dispose_engines(close: bool = True) -> None:
+    """Dispose the primary and replica pools (e.g. after fork or at shutdown)."""
+    for bound in [engine, *read_engines]:
+        bound.dispose(close=close)
+
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine,
+                            class_=RoutingSession, router=EngineRouter(engine, read_engines))
 Base = declarative_base()
@@ -0,0 +1,226 @@
+# todo/idempotency.py
+"""``Idempotency-Key`` support for create endpoints.
+
+Clients on flaky networks retry POSTs whose response they never saw. When
+such a request carries an ``Idempotency-Key`` header, ``IdempotencyMiddleware``
+runs the handler once and answers retries with the stored response (marked
+``Idempotent-Replayed: true``) instead of creating another row:
+
+- keys are scoped to the route and the caller's credentials, or to the
+  client address for anonymous calls such as sign-up (behind a proxy that
+  is the proxy's address unless uvicorn runs with ``--proxy-headers``);
+- a retry whose body differs from the original's gets 422;
+- a retry arriving while the original is still running waits for it
+  (up to ``wait_timeout`` seconds, then 409) on its event loop, without
+  holding a threadpool thread;
+- only 2xx responses are kept, so a failed request can be retried as is.
+
+Entries live for ``TODO_IDEMPOTENCY_TTL`` seconds in a bounded in-process
+store (``TODO_IDEMPOTENCY_SIZE`` keys). Like the response cache it is per
+worker process: a retry routed to another worker runs the handler again.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+TTL_SECONDS = float(os.getenv("TODO_IDEMPOTENCY_TTL", "86400"))
+MAX_ENTRIES = int(os.getenv("TODO_IDEMPOTENCY_SIZE", "10000"))
+MAX_KEY_LENGTH = 255
+
+REPLAYED_HEADER = (b"idempotent-replayed", b"true")
+
+
+class Entry:
+    def __init__(self, fingerprint: str, expires: float):
+        self.fingerprint = fingerprint
+        self.expires = expires
+        self.response = None  # (status, headers, body) once the original finished
+        self.done = False
+        self._waiters = []  # (loop, future) per duplicate waiting for the original
+        self._lock = threading.Lock()
+
+    def set_done(self, response) -> None:
+        with self._lock:
+            self.response = response
+            self.done = True
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:  # that request's loop is already closed
+                pass
+
+    async def wait(self, timeout: float) -> None:
+        """Wait until the original finishes, or ``timeout`` seconds."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.done:
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+
+def _wake(future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class IdempotencyStore:
+    """Bounded LRU of keys to in-flight or finished requests."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, key, fingerprint: str):
+        """Return ``(entry, True)`` if the caller should run the request, else
+        the existing entry for ``key`` and False."""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > now:
+                return entry, False
+            entry = self._entries[key] = Entry(fingerprint, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry, True
+
+    def finish(self, key, entry: Entry, response) -> None:
+        """Store the original's response, or forget the key if ``response`` is None."""
+        with self._lock:
+            if response is None and self._entries.get(key) is entry:
+                del self._entries[key]
+        entry.set_done(response)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _header(headers, name: bytes):
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+def fingerprint(body: bytes) -> str:
+    """Hash of the request body; JSON bodies are compared by content, not layout."""
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode()
+    except ValueError:
+        pass
+    return hashlib.sha256(body).hexdigest()
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app, routes=(), store: IdempotencyStore = None, wait_timeout: float = 30.0):
+        self.app = app
+        self.routes = set(routes)  # (method, path)
+        self.store = store if store is not None else IdempotencyStore()
+        self.wait_timeout = wait_timeout
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in self.routes:
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = _header(scope["headers"], b"idempotency-key")
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await self._send_error(send, 400, "Invalid Idempotency-Key header.")
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        credentials = hashlib.sha256(self._caller(scope).encode()).hexdigest()
+        key = (scope["method"], scope["path"], credentials, idempotency_key)
+        entry, owner = self.store.claim(key, fingerprint(body))
+        if not owner:
+            await self._replay(entry, fingerprint(body), send)
+            return
+
+        replayed_body = False
+
+        async def replay_receive():
+            nonlocal replayed_body
+            if replayed_body:
+                return await receive()
+            replayed_body = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        start = None
+        parts = []
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                parts.append(message.get("body", b""))
+            await send(message)
+
+        response = None
+        try:
+            await self.app(scope, replay_receive, send_wrapper)
+            if start is not None and 200 <= start["status"] < 300:
+                response = (start["status"], list(start.get("headers", [])), b"".join(parts))
+        finally:
+            self.store.finish(key, entry, response)
+
+    @staticmethod
+    def _caller(scope) -> str:
+        authorization = _header(scope["headers"], b"authorization")
+        if authorization:
+            return "authorization:" + authorization
+        client = scope.get("client")
+        return "client:" + (client[0] if client else "")
+
+    async def _replay(self, entry: Entry, request_fingerprint: str, send):
+        if entry.fingerprint != request_fingerprint:
+            await self._send_error(send, 422, "Idempotency-Key was already used with a different request.")
+            return
+        await entry.wait(self.wait_timeout)
+        if entry.response is None:
+            # Still running, or it failed and the key was released.
+            await self._send_error(send, 409, "A request with this Idempotency-Key is in progress or failed.")
+            return
+        status, headers, body = entry.response
+        await send({"type": "http.response.start", "status": status, "headers": headers + [REPLAYED_HEADER]})
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _send_error(send, status: int, detail: str):
+        body = json.dumps({"detail": detail}).encode()
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
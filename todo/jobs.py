@@ -0,0 +1,398 @@
+# todo/jobs.py
+"""Background jobs for long-running admin operations.
+
+Admin endpoints submit a job and answer right away with its id; the work
+runs on a small thread pool of its own (``TODO_JOB_WORKERS``, default 2),
+never on the threads that serve requests. Each kind also has a concurrency
+limit (``KIND_LIMITS``), so e.g. two mass deletes never run side by side.
+State, progress and results live in the ``jobs`` table and are polled
+through ``GET /admin/jobs/{id}``.
+
+A handler is ``fn(context, **params)`` registered with :func:`handler`. It
+works in batches, committing each one, reports ``context.progress()`` and
+calls ``context.check_cancelled()`` between batches; what it returns is
+stored as the job's JSON result.
+
+Jobs run in the process that accepted them. Each job row records that
+process as ``owner`` (``host:pid``), and while the runner has work a
+heartbeat thread refreshes ``heartbeat_at`` every
+``TODO_JOB_HEARTBEAT_SECONDS``. :func:`fail_interrupted` marks jobs failed
+only when their owner is gone. The ``todo.server`` supervisor runs it
+once at startup and again for each worker it restarts; workers never
+sweep, so live siblings' jobs are left alone.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select, text, update
+
+from . import changes, database, sharding, stats
+from .models import Jobs, Todos
+
+logger = logging.getLogger("todo.jobs")
+
+MAX_WORKERS = int(os.getenv("TODO_JOB_WORKERS", "2"))
+EXPORT_DIR = os.getenv("TODO_EXPORT_DIR", "./exports")
+BATCH_SIZE = 500
+PROGRESS_INTERVAL = 0.5  # seconds between progress writes
+HEARTBEAT_SECONDS = float(os.getenv("TODO_JOB_HEARTBEAT_SECONDS", "10"))
+# A job whose owner has not beaten for this long is considered gone.
+HEARTBEAT_TIMEOUT = 3 * HEARTBEAT_SECONDS
+
+KIND_LIMITS = {"delete_todos": 1, "export": 2, "reindex": 1}
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+HANDLERS = {}
+
+
+def handler(kind: str):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def process_owner(pid: int = None) -> str:
+    """The ``owner`` recorded on jobs run by process ``pid`` (default this one)."""
+    return f"{socket.gethostname()}:{os.getpid() if pid is None else pid}"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """Handed to a running handler for progress reports and cancellation checks."""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self._reported_at = 0.0
+        self._checked_at = 0.0
+        self._cancelled = False
+
+    def _update(self, **values) -> None:
+        db = database.SessionLocal()
+        try:
+            db.execute(update(Jobs).where(Jobs.id == self.job_id).values(**values))
+            db.commit()
+        finally:
+            db.close()
+
+    def progress(self, done: int, total: int = None, force: bool = False) -> None:
+        now = time.monotonic()
+        if force or now - self._reported_at >= PROGRESS_INTERVAL:
+            self._reported_at = now
+            values = {"progress": done}
+            if total is not None:
+                values["total"] = total
+            self._update(**values)
+
+    def check_cancelled(self) -> None:
+        now = time.monotonic()
+        if not self._cancelled and now - self._checked_at >= PROGRESS_INTERVAL:
+            self._checked_at = now
+            db = database.SessionLocal()
+            try:
+                self._cancelled = bool(db.scalar(select(Jobs.cancel_requested).where(Jobs.id == self.job_id)))
+            finally:
+                db.close()
+        if self._cancelled:
+            raise JobCancelled()
+
+
+class JobRunner:
+    def __init__(self, max_workers: int = MAX_WORKERS, limits: dict = None):
+        self.max_workers = max_workers
+        self.limits = dict(KIND_LIMITS if limits is None else limits)
+        self._pending = deque()  # (job_id, kind, params)
+        self._running = Counter()
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._heartbeat = None
+
+    def submit(self, kind: str, params: dict = None, user_id: int = None) -> int:
+        if kind not in HANDLERS:
+            raise ValueError(f"unknown job kind {kind!r}")
+        params = params or {}
+        db = database.SessionLocal()
+        try:
+            job = Jobs(kind=kind, status="queued", params=json.dumps(params), progress=0,
+                       cancel_requested=False, created_by=user_id, created_at=_now(),
+                       owner=process_owner(), heartbeat_at=_now())
+            db.add(job)
+            db.commit()
+            job_id = job.id
+        finally:
+            db.close()
+        with self._lock:
+            self._pending.append((job_id, kind, params))
+            self._futures[job_id] = Future()
+        self._dispatch()
+        return job_id
+
+    def cancel(self, job_id: int) -> bool:
+        """Ask a job to stop; False if it already finished or does not exist."""
+        with self._lock:
+            queued = next((entry for entry in self._pending if entry[0] == job_id), None)
+            if queued is not None:
+                self._pending.remove(queued)
+        db = database.SessionLocal()
+        try:
+            if queued is not None:
+                self._finish(db, job_id, "cancelled")
+                self._resolve(job_id)
+                return True
+            result = db.execute(update(Jobs).where(Jobs.id == job_id, Jobs.status.not_in(FINISHED))
+                                .values(cancel_requested=True))
+            db.commit()
+            return result.rowcount > 0
+        finally:
+            db.close()
+
+    def wait(self, job_id: int, timeout: float = None) -> None:
+        """Block until a job submitted to this runner has finished."""
+        future = self._futures.get(job_id)
+        if future is not None:
+            future.result(timeout)
+
+    def _dispatch(self) -> None:
+        with self._lock:
+            # Threads do not survive a fork, so each process gets its own pool.
+            if self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+                self._executor_pid = os.getpid()
+                self._heartbeat = None
+            if self._heartbeat is None and (self._pending or sum(self._running.values())):
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+                self._heartbeat.start()
+            started = []
+            for entry in list(self._pending):
+                job_id, kind, params = entry
+                if sum(self._running.values()) >= self.max_workers:
+                    break
+                if self._running[kind] >= self.limits.get(kind, self.max_workers):
+                    continue
+                self._pending.remove(entry)
+                self._running[kind] += 1
+                started.append(entry)
+            for entry in started:
+                self._executor.submit(self._run, *entry)
+
+    def _run(self, job_id: int, kind: str, params: dict) -> None:
+        db = database.SessionLocal()
+        try:
+            # Only a queued job starts: one already failed by fail_interrupted stays failed.
+            started = db.execute(update(Jobs).where(Jobs.id == job_id, Jobs.status == "queued")
+                                 .values(status="running", started_at=_now()))
+            db.commit()
+            if started.rowcount == 0:
+                return
+            try:
+                result = HANDLERS[kind](JobContext(job_id), **params)
+            except JobCancelled:
+                self._finish(db, job_id, "cancelled")
+            except Exception as exc:
+                logger.exception("job %d (%s) failed", job_id, kind)
+                db.rollback()
+                self._finish(db, job_id, "failed", error=f"{type(exc).__name__}: {exc}")
+            else:
+                self._finish(db, job_id, "succeeded", result=result)
+        finally:
+            db.close()
+            with self._lock:
+                self._running[kind] -= 1
+            self._resolve(job_id)
+            self._dispatch()
+
+    def _heartbeat_loop(self) -> None:
+        """Beat every HEARTBEAT_SECONDS until this runner has no jobs left."""
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            with self._lock:
+                if not self._pending and not sum(self._running.values()):
+                    self._heartbeat = None
+                    return
+            try:
+                self.beat()
+            except Exception:
+                logger.exception("job heartbeat failed")
+
+    def beat(self) -> None:
+        db = database.SessionLocal()
+        try:
+            db.execute(update(Jobs).where(Jobs.owner == process_owner(), Jobs.status.in_(("queued", "running")))
+                       .values(heartbeat_at=_now()))
+            db.commit()
+        finally:
+            db.close()
+
+    def _resolve(self, job_id: int) -> None:
+        future = self._futures.pop(job_id, None)
+        if future is not None:
+            future.set_result(None)
+
+    def _finish(self, db, job_id: int, status: str, result=None, error: str = None) -> None:
+        db.execute(update(Jobs).where(Jobs.id == job_id).values(
+            status=status, finished_at=_now(), error=error,
+            result=json.dumps(result) if result is not None else None))
+        db.commit()
+
+
+runner = JobRunner()
+
+
+def job_dict(job) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "params": json.loads(job.params) if job.params else {},
+        "progress": job.progress,
+        "total": job.total,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "cancel_requested": job.cancel_requested,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def _owner_alive(owner: str, heartbeat_at, now) -> bool:
+    if heartbeat_at is None or now - heartbeat_at > timedelta(seconds=HEARTBEAT_TIMEOUT):
+        return False
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname():
+        return True  # another machine: only its heartbeat tells
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        pass
+    return True
+
+
+def fail_interrupted(db, owner: str = None) -> int:
+    """Mark queued or running jobs whose process is gone as failed.
+
+    With ``owner`` (a :func:`process_owner` value) only that process's jobs
+    are failed, e.g. for a worker that just exited. Otherwise a job counts
+    as interrupted when its heartbeat is older than HEARTBEAT_TIMEOUT or its
+    owner is a process of this host that no longer exists.
+    """
+    unfinished = Jobs.status.in_(("queued", "running"))
+    if owner is not None:
+        ids = db.scalars(select(Jobs.id).where(unfinished, Jobs.owner == owner)).all()
+    else:
+        now = _now()
+        ids = [job_id for job_id, job_owner, heartbeat_at
+               in db.execute(select(Jobs.id, Jobs.owner, Jobs.heartbeat_at).where(unfinished))
+               if not _owner_alive(job_owner, heartbeat_at, now)]
+    if not ids:
+        return 0
+    result = db.execute(update(Jobs).where(Jobs.id.in_(ids), unfinished)
+                        .values(status="failed", error="interrupted by a restart", finished_at=_now()))
+    db.commit()
+    return result.rowcount
+
+
+# ---------------------------------------------------------------------------
+# Handlers
+# ---------------------------------------------------------------------------
+def _todo_filter(owner_id=None, complete=None):
+    conditions = []
+    if owner_id is not None:
+        conditions.append(Todos.owner_id == owner_id)
+    if complete is not None:
+        conditions.append(Todos.complete == complete)
+    return conditions
+
+
+@handler("delete_todos")
+def delete_todos(context: JobContext, owner_id: int = None, complete: bool = None) -> dict:
+    """Delete the matching todos batch by batch."""
+    conditions = _todo_filter(owner_id, complete)
+    deleted = 0
+    for db in sharding.todo_sessions():
+        try:
+            while True:
+                context.check_cancelled()
+                rows = db.execute(
+                    select(Todos.id, Todos.owner_id, Todos.complete, Todos.priority)
+                    .where(*conditions).order_by(Todos.id).limit(BATCH_SIZE)
+                ).all()
+                if not rows:
+                    break
+                for row in rows:
+                    stats.record(db, row.owner_id, row.complete, row.priority, -1)
+                    changes.record(db, row.owner_id, "deleted", row.id)
+                db.execute(delete(Todos).where(Todos.id.in_([row.id for row in rows])))
+                db.commit()
+                changes.notify()
+                deleted += len(rows)
+                context.progress(deleted)
+        finally:
+            db.close()
+    context.progress(deleted, total=deleted, force=True)
+    return {"deleted": deleted}
+
+
+@handler("export")
+def export_todos(context: JobContext, owner_id: int = None) -> dict:
+    """Write the matching todos to an NDJSON file under ``EXPORT_DIR``."""
+    conditions = _todo_filter(owner_id)
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.abspath(os.path.join(EXPORT_DIR, f"todos-job{context.job_id}.ndjson"))
+    exported = 0
+    with open(path, "w") as out:
+        for db in sharding.todo_sessions():
+            try:
+                last_id = 0
+                while True:
+                    context.check_cancelled()
+                    todos = db.scalars(select(Todos).where(Todos.id > last_id, *conditions)
+                                       .order_by(Todos.id).limit(BATCH_SIZE)).all()
+                    if not todos:
+                        break
+                    for todo in todos:
+                        out.write(json.dumps(changes.todo_dict(todo)) + "\n")
+                    last_id = todos[-1].id
+                    exported += len(todos)
+                    db.expunge_all()
+                    context.progress(exported)
+            finally:
+                db.close()
+    context.progress(exported, total=exported, force=True)
+    return {"path": path, "rows": exported}
+
+
+@handler("reindex")
+def reindex(context: JobContext) -> dict:
+    """Rebuild the search index and the stats counters of every todo database."""
+    rebuilt = 0
+    for db in sharding.todo_sessions():
+        try:
+            context.check_cancelled()
+            if db.get_bind().dialect.name == "sqlite":
+                db.execute(text("INSERT INTO todos_fts(todos_fts) VALUES ('rebuild')"))
+            stats.rebuild_counters(db)
+            rebuilt += 1
+            context.progress(rebuilt, force=True)
+        finally:
+            db.close()
+    return {"databases": rebuilt}
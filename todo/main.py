@@ -1,12 +1,25 @@
 # todo/main.py
+import os
+
 from fastapi import FastAPI
-from todo import models
-from todo.database import engine
+from todo import startup
+from todo.database import ReadYourWritesMiddleware
+from todo.compression import CompressionMiddleware
+from todo.idempotency import IdempotencyMiddleware
 from todo.routers import auth, todos, admin, users
 
-app = FastAPI()
-
-models.Base.metadata.create_all(bind=engine)
+# create_all and the crypto backends are set up by startup.initialize(), from
+# the lifespan hook or (TODO_LAZY_INIT=1) on the first request, not at import.
+app = FastAPI(lifespan=startup.lifespan)
+app.add_middleware(startup.InitializeOnFirstRequest)
+# Keeps a client's reads on the primary right after it wrote, on any worker.
+app.add_middleware(ReadYourWritesMiddleware)
+# Retried creates carrying an Idempotency-Key get the original response back.
+app.add_middleware(IdempotencyMiddleware, routes=[("POST", "/todos/todo"), ("POST", "/auth/")])
+# Large admin listings are cached (already compressed) for a few seconds.
+app.add_middleware(CompressionMiddleware, minimum_size=500,
+                   cache_paths=("/admin/users", "/admin/todo"),
+                   cache_ttl=float(os.getenv("TODO_RESPONSE_CACHE_SECONDS", "5")))
 
 app.include_router(auth.router)
 app.include_router(todos.router)
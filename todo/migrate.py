@@ -0,0 +1,193 @@
+# todo/migrate.py
+"""Helpers for migrations that touch every row of a large table.
+
+A plain ``op.execute("UPDATE ...")`` runs inside the migration's
+transaction and keeps SQLite's write lock (or Postgres row locks) until the
+whole revision finishes. :func:`backfill` instead walks the table by primary
+key in small batches, committing each batch together with a checkpoint row
+in ``migration_checkpoints``. It can pause between batches, reports
+progress, and an interrupted run continues after the last committed batch
+when the migration is started again.
+
+Use it from a revision outside the migration transaction::
+
+    from todo import migrate
+
+    def upgrade():
+        op.add_column("todos", sa.Column("slug", sa.String()))
+        with op.get_context().autocommit_block():
+            migrate.backfill(op.get_bind(), "todos.slug", "todos",
+                             values={"slug": sa.func.lower(sa.column("title"))},
+                             where=sa.column("slug").is_(None))
+            migrate.create_index(op.get_bind(), "ix_todos_slug", "todos", ["slug"])
+
+Inspect or reset checkpoints with ``python -m todo.migrate status`` and
+``python -m todo.migrate reset NAME``.
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import (Boolean, Column, DateTime, Integer, MetaData, String, Table, and_, create_engine,
+                        func, insert, select, text, update)
+from sqlalchemy.engine import Connection
+
+checkpoint_metadata = MetaData()
+migration_checkpoints = Table(
+    "migration_checkpoints", checkpoint_metadata,
+    Column("name", String, primary_key=True),
+    Column("last_key", Integer, nullable=False, default=0),
+    Column("rows_done", Integer, nullable=False, default=0),
+    Column("finished", Boolean, nullable=False, default=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+
+def _engine(bind):
+    # Batches need their own connections so each one commits on its own.
+    return bind.engine if isinstance(bind, Connection) else bind
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def checkpoint(bind, name: str):
+    """The checkpoint row of ``name`` as a mapping, or None."""
+    engine = _engine(bind)
+    checkpoint_metadata.create_all(bind=engine)
+    with engine.connect() as connection:
+        return connection.execute(
+            select(migration_checkpoints).where(migration_checkpoints.c.name == name)
+        ).mappings().first()
+
+
+def reset(bind, name: str) -> None:
+    engine = _engine(bind)
+    checkpoint_metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(migration_checkpoints.delete().where(migration_checkpoints.c.name == name))
+
+
+def backfill(bind, name: str, table, values=None, apply=None, where=None, key: str = "id",
+             batch_size: int = 1000, pause: float = 0.0, progress=print) -> int:
+    """Update ``table`` in keyset-paged batches; returns the rows updated by this run.
+
+    Each batch either sets ``values`` (column name -> value or SQL
+    expression) on its rows or calls ``apply(connection, keys)``. ``where``
+    limits the rows visited. ``name`` identifies the checkpoint, so it must
+    stay the same between runs; a finished backfill is skipped. ``pause``
+    sleeps that many seconds after every batch to leave room for the
+    application's own writes.
+    """
+    if (values is None) == (apply is None):
+        raise ValueError("pass exactly one of values or apply")
+    engine = _engine(bind)
+    if isinstance(table, str):
+        table = Table(table, MetaData(), autoload_with=engine, resolve_fks=False)
+    key_column = table.c[key]
+    checkpoint_metadata.create_all(bind=engine)
+
+    state = checkpoint(engine, name)
+    if state is None:
+        with engine.begin() as connection:
+            connection.execute(insert(migration_checkpoints).values(
+                name=name, last_key=0, rows_done=0, finished=False, updated_at=_now()))
+        last_key, rows_done = 0, 0
+    elif state["finished"]:
+        if progress is not None:
+            progress(f"{name}: already finished ({state['rows_done']} rows)")
+        return 0
+    else:
+        last_key, rows_done = state["last_key"], state["rows_done"]
+        if progress is not None:
+            progress(f"{name}: resuming after {key} {last_key} ({rows_done} rows done)")
+
+    conditions = [where] if where is not None else []
+    with engine.connect() as connection:
+        remaining = connection.scalar(
+            select(func.count()).select_from(table).where(key_column > last_key, *conditions))
+
+    updated = 0
+    started = time.monotonic()
+    while True:
+        with engine.begin() as connection:
+            keys = connection.scalars(
+                select(key_column).where(key_column > last_key, *conditions)
+                .order_by(key_column).limit(batch_size)
+            ).all()
+            if keys:
+                if values is not None:
+                    connection.execute(
+                        update(table).where(and_(key_column >= keys[0], key_column <= keys[-1], *conditions))
+                        .values(values))
+                else:
+                    apply(connection, keys)
+                last_key = keys[-1]
+                rows_done += len(keys)
+            connection.execute(
+                update(migration_checkpoints).where(migration_checkpoints.c.name == name)
+                .values(last_key=last_key, rows_done=rows_done, finished=not keys, updated_at=_now()))
+        if not keys:
+            break
+        updated += len(keys)
+        if progress is not None:
+            rate = updated / max(time.monotonic() - started, 1e-9)
+            progress(f"{name}: {updated}/{remaining} rows ({rate:.0f} rows/s)")
+        if pause:
+            time.sleep(pause)
+    return updated
+
+
+def create_index(bind, name: str, table_name: str, columns, unique: bool = False, progress=print) -> None:
+    """Create an index without holding the migration transaction open.
+
+    Postgres builds it ``CONCURRENTLY``, so writes continue meanwhile. SQLite
+    has no online index build; the table is read once first so the pages
+    are cached, then the index is created in its own short transaction.
+    """
+    engine = _engine(bind)
+    column_list = ", ".join(columns)
+    statement = (f"CREATE {'UNIQUE ' if unique else ''}INDEX {{concurrently}}IF NOT EXISTS "
+                 f"{name} ON {table_name} ({column_list})")
+    started = time.monotonic()
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(statement.format(concurrently="CONCURRENTLY ")))
+    else:
+        with engine.connect() as connection:
+            connection.execute(text(f"SELECT count({column_list.split(',')[0]}) FROM {table_name}")).scalar()
+        with engine.begin() as connection:
+            connection.execute(text(statement.format(concurrently="")))
+    if progress is not None:
+        progress(f"{name}: built in {time.monotonic() - started:.1f}s")
+
+
+def main(argv=None) -> None:
+    from .database import SQLALCHEMY_DATABASE_URL
+
+    parser = argparse.ArgumentParser(description="Online migration checkpoints.")
+    parser.add_argument("--url", default=SQLALCHEMY_DATABASE_URL)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="list backfill checkpoints")
+    command = commands.add_parser("reset", help="forget a checkpoint so the backfill starts over")
+    command.add_argument("name")
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.url)
+    try:
+        if args.command == "reset":
+            reset(engine, args.name)
+            print(f"Reset {args.name}")
+            return
+        checkpoint_metadata.create_all(bind=engine)
+        with engine.connect() as connection:
+            for row in connection.execute(select(migration_checkpoints).order_by(migration_checkpoints.c.name)):
+                state = "finished" if row.finished else f"at key {row.last_key}"
+                print(f"{row.name}: {row.rows_done} rows, {state}, updated {row.updated_at:%Y-%m-%d %H:%M:%S}")
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
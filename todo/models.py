@@ -1,5 +1,6 @@
 from .database import Base
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import DDL, Column, DateTime, Index, Integer, String, Boolean, ForeignKey, Text, event
+from sqlalchemy.orm import relationship
 
 
 class Users(Base):
@@ -15,6 +16,9 @@ class Users(Base):
     role = Column(String)
     phone_number = Column(String)
 
+    # Read-only: loaded with selectinload by the admin overview (todo/overview.py).
+    todos = relationship("Todos", order_by="Todos.id", viewonly=True)
+
 
 class Todos(Base):
     __tablename__ = 'todos'
@@ -25,3 +29,102 @@ class Todos(Base):
     priority = Column(Integer)
     complete = Column(Boolean, default=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    completed_at = Column(DateTime)
+
+    __table_args__ = (
+        # Covers GET /todos/next: open todos of an owner in (priority, id) order.
+        # Its owner_id prefix also serves every lookup by owner.
+        Index("ix_todos_owner_next", "owner_id", "complete", "priority", "id"),
+        # The archiver's sweep for todos completed before the cutoff.
+        Index("ix_todos_completed_at", "completed_at"),
+        # Never hand out the id of a deleted (e.g. archived) todo again.
+        {"sqlite_autoincrement": True},
+    )
+
+
+class TodosArchive(Base):
+    """Completed todos moved out of ``todos`` by todo/archive.py."""
+    __tablename__ = 'todos_archive'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String)
+    description = Column(String)
+    priority = Column(Integer)
+    complete = Column(Boolean, default=True)
+    owner_id = Column(Integer, index=True)
+    completed_at = Column(DateTime)
+    archived_at = Column(DateTime)
+
+
+class Jobs(Base):
+    """Background admin jobs, see todo/jobs.py."""
+    __tablename__ = 'jobs'
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued")
+    params = Column(Text)
+    progress = Column(Integer, nullable=False, default=0)
+    total = Column(Integer)
+    result = Column(Text)
+    error = Column(String)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    created_by = Column(Integer)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    # "host:pid" of the process running the job and its last sign of life.
+    owner = Column(String)
+    heartbeat_at = Column(DateTime)
+
+
+# Full-text index over title/description for /todos/search (SQLite FTS5,
+# see todo/search.py). It is an external-content table: it stores only the
+# index and the triggers keep it in step with ``todos``.
+TODOS_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS todos_fts USING fts5("
+    "title, description, content='todos', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS todos_fts_ai AFTER INSERT ON todos BEGIN "
+    "INSERT INTO todos_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS todos_fts_ad AFTER DELETE ON todos BEGIN "
+    "INSERT INTO todos_fts(todos_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS todos_fts_au AFTER UPDATE OF title, description ON todos BEGIN "
+    "INSERT INTO todos_fts(todos_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO todos_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+]
+for _statement in TODOS_FTS_DDL:
+    event.listen(Todos.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(Todos.__table__, "before_drop",
+             DDL("DROP TABLE IF EXISTS todos_fts").execute_if(dialect="sqlite"))
+
+
+class TodoCounts(Base):
+    """Materialized per-owner todo counts, see todo/stats.py."""
+    __tablename__ = 'todo_counts'
+
+    owner_id = Column(Integer, primary_key=True)
+    complete = Column(Boolean, primary_key=True)
+    priority = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class TodoChanges(Base):
+    """Log of todo changes read by the /todos/changes feed, see todo/changes.py."""
+    __tablename__ = 'todo_changes'
+
+    # AUTOINCREMENT: seq is the feed cursor and must never be handed out twice.
+    seq = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)
+    todo_id = Column(Integer, nullable=False)
+    todo = Column(Text)
+
+    __table_args__ = (
+        Index("ix_todo_changes_owner_seq", "owner_id", "seq"),
+        {"sqlite_autoincrement": True},
+    )
@@ -0,0 +1,187 @@
+# todo/overview.py
+"""Users with their todo counts for the admin dashboard (``/admin/users/overview``).
+
+One ``users LEFT JOIN todos ... GROUP BY users.id`` statement returns each
+user with open/complete counts and the highest priority of their todos.
+Pages are keyset-paginated on ``(sort value, id)``: ``next_cursor`` encodes
+the last row's pair and the next page starts strictly after it. Sorted by
+``id`` the pages stay stable while rows are added. Sorted by an aggregate
+they are not a snapshot: a user whose counts change between two page
+requests moves in the order and can be skipped or returned twice. With
+``include_todos`` the open todos of the page's users come from one extra
+``selectinload`` query.
+
+With sharding on the todos live in the shards while users stay in the main
+database. Sorted by ``id``, a page of users comes from the main database and
+the shards aggregate only those owners. An aggregate sort needs every
+owner's totals from every shard before the first row is known, so each
+page of it costs a pass over all users and is merged and sorted here.
+"""
+import base64
+import binascii
+import json
+
+from sqlalchemy import and_, case, false, func, or_, select, true
+from sqlalchemy.orm import selectinload
+
+from .changes import todo_dict
+from .models import Todos, Users
+
+_open_todos = func.count(case((Todos.complete == false(), Todos.id)))
+_complete_todos = func.count(case((Todos.complete == true(), Todos.id)))
+_max_priority = func.max(Todos.priority)
+
+# Users without todos sort as max_priority 0.
+SORT_EXPRESSIONS = {
+    "id": Users.id,
+    "open_todos": _open_todos,
+    "complete_todos": _complete_todos,
+    "max_priority": func.coalesce(_max_priority, 0),
+}
+
+_overview = (
+    select(Users, _open_todos, _complete_todos, _max_priority)
+    .outerjoin(Todos, Todos.owner_id == Users.id)
+    .group_by(Users.id)
+)
+_owner_aggregates = select(Todos.owner_id, _open_todos, _complete_todos, _max_priority).group_by(Todos.owner_id)
+
+
+def encode_cursor(value: int, user_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, user_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """``(value, user_id)`` from a ``next_cursor``; ValueError if malformed."""
+    try:
+        value, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, TypeError, ValueError):
+        raise ValueError("invalid cursor")
+    if not isinstance(value, int) or not isinstance(user_id, int):
+        raise ValueError("invalid cursor")
+    return value, user_id
+
+
+def _item(user, open_todos: int, complete_todos: int, max_priority) -> dict:
+    return {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "role": user.role,
+        "is_active": user.is_active,
+        "open_todos": open_todos,
+        "complete_todos": complete_todos,
+        "max_priority": max_priority,
+    }
+
+
+def _sort_value(item: dict, sort: str) -> int:
+    return item[sort] or 0
+
+
+def _page(items, sort: str, limit: int) -> dict:
+    """The first ``limit`` of ``items`` (fetched with one extra) and the cursor after them."""
+    page = items[:limit]
+    next_cursor = None
+    if len(items) > limit:
+        next_cursor = encode_cursor(_sort_value(page[-1], sort), page[-1]["id"])
+    return {"users": page, "next_cursor": next_cursor}
+
+
+def users_overview(db, sort: str = "id", descending: bool = False, after=None,
+                   limit: int = 50, include_todos: bool = False) -> dict:
+    """A page of users starting after ``after``, a decoded ``(value, user_id)`` cursor."""
+    key = SORT_EXPRESSIONS[sort]
+    stmt = _overview
+    if after is not None:
+        value, after_id = after
+        if sort == "id":
+            stmt = stmt.where(Users.id < after_id if descending else Users.id > after_id)
+        elif descending:
+            stmt = stmt.having(or_(key < value, and_(key == value, Users.id < after_id)))
+        else:
+            stmt = stmt.having(or_(key > value, and_(key == value, Users.id > after_id)))
+    if descending:
+        stmt = stmt.order_by(key.desc(), Users.id.desc())
+    else:
+        stmt = stmt.order_by(key, Users.id)
+    if include_todos:
+        stmt = stmt.options(selectinload(Users.todos.and_(Todos.complete == false())))
+
+    items = []
+    for user, open_todos, complete_todos, max_priority in db.execute(stmt.limit(limit + 1)):
+        item = _item(user, open_todos, complete_todos, max_priority)
+        if include_todos:
+            item["todos"] = [todo_dict(todo) for todo in user.todos]
+        items.append(item)
+    return _page(items, sort, limit)
+
+
+def owner_aggregates(db, owner_ids=None):
+    """``(owner_id, open, complete, max_priority)`` for ``owner_ids`` (default every owner) in ``db``."""
+    stmt = _owner_aggregates
+    if owner_ids is not None:
+        stmt = stmt.where(Todos.owner_id.in_(owner_ids))
+    return db.execute(stmt).all()
+
+
+def _shard_totals(shards, owner_ids=None) -> dict:
+    """owner_id -> [open, complete, max_priority] summed over every shard."""
+    totals = {}
+    for rows in shards.fan_out(lambda shard_db: owner_aggregates(shard_db, owner_ids)):
+        for owner_id, open_todos, complete_todos, max_priority in rows:
+            total = totals.setdefault(owner_id, [0, 0, None])
+            total[0] += open_todos
+            total[1] += complete_todos
+            if max_priority is not None and (total[2] is None or max_priority > total[2]):
+                total[2] = max_priority
+    return totals
+
+
+def open_todos_for_owners(db, owner_ids):
+    return db.scalars(select(Todos).where(Todos.owner_id.in_(owner_ids), Todos.complete == false())
+                      .order_by(Todos.id)).all()
+
+
+def sharded_users_overview(db, shards, sort: str = "id", descending: bool = False, after=None,
+                           limit: int = 50, include_todos: bool = False) -> dict:
+    """:func:`users_overview` for todos spread over ``shards``; users come from ``db``.
+
+    Sorted by ``id`` this reads one page of users and their totals. Any
+    other sort loads every user and every owner's totals per page.
+    """
+    if sort == "id":
+        stmt = select(Users)
+        if after is not None:
+            stmt = stmt.where(Users.id < after[1] if descending else Users.id > after[1])
+        stmt = stmt.order_by(Users.id.desc() if descending else Users.id).limit(limit + 1)
+        users = db.scalars(stmt).all()
+        totals = _shard_totals(shards, [user.id for user in users]) if users else {}
+        items = [_item(user, *totals.get(user.id, (0, 0, None))) for user in users]
+    else:
+        totals = _shard_totals(shards)
+        items = [_item(user, *totals.get(user.id, (0, 0, None))) for user in db.scalars(select(Users))]
+        items.sort(key=lambda item: (_sort_value(item, sort), item["id"]), reverse=descending)
+        if after is not None:
+            items = [item for item in items
+                     if ((_sort_value(item, sort), item["id"]) < after if descending
+                         else (_sort_value(item, sort), item["id"]) > after)]
+    page = _page(items[:limit + 1], sort, limit)
+
+    if include_todos:
+        by_shard = {}
+        for item in page["users"]:
+            by_shard.setdefault(shards.index_for(item["id"]), []).append(item["id"])
+        todos = {}
+        for index, owner_ids in by_shard.items():
+            shard_db = shards.session(index)
+            try:
+                for todo in open_todos_for_owners(shard_db, owner_ids):
+                    todos.setdefault(todo.owner_id, []).append(todo_dict(todo))
+            finally:
+                shard_db.close()
+        for item in page["users"]:
+            item["todos"] = todos.get(item["id"], [])
+    return page
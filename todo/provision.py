@@ -0,0 +1,160 @@
+# todo/provision.py
+"""Bulk user provisioning.
+
+Streams users from a CSV or JSON Lines file, hashes the passwords across a
+process pool and inserts them in chunked transactions through the
+SQLAlchemy models, so it honours DATABASE_URL like the app does::
+
+    python -m todo.provision users.csv --workers 8 --chunk-size 1000
+    cat users.jsonl | python -m todo.provision - --format jsonl
+
+Each input record needs ``username``, ``email`` and ``password``; the other
+``Users`` columns are optional (``role`` defaults to ``user``).
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from passlib.context import CryptContext
+from sqlalchemy import insert
+
+from . import database
+from .models import Users
+
+bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+
+REQUIRED_FIELDS = ('username', 'email', 'password')
+OPTIONAL_FIELDS = ('first_name', 'last_name', 'role', 'phone_number')
+
+
+def hash_password(password: str) -> str:
+    # Module level so ProcessPoolExecutor can pickle it by reference.
+    return bcrypt_context.hash(password)
+
+
+def read_users(path: str, fmt: str = None):
+    """Yield one dict per user record without loading the whole file."""
+    if fmt is None:
+        fmt = 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+    stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        if fmt == 'csv':
+            for line_no, row in enumerate(csv.DictReader(stream), start=2):
+                yield _validate(row, line_no)
+        else:
+            for line_no, line in enumerate(stream, start=1):
+                if line.strip():
+                    yield _validate(json.loads(line), line_no)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def _validate(row: dict, line_no: int) -> dict:
+    missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+    if missing:
+        raise ValueError(f"line {line_no}: missing {', '.join(missing)}")
+    return row
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _records(chunk, hashes):
+    return [
+        {
+            'email': row['email'],
+            'username': row['username'],
+            'first_name': row.get('first_name'),
+            'last_name': row.get('last_name'),
+            'hashed_password': hashed,
+            'is_active': True,
+            'role': row.get('role') or 'user',
+            'phone_number': row.get('phone_number'),
+        }
+        for row, hashed in zip(chunk, hashes)
+    ]
+
+
+def provision_users(rows, bind=None, workers=None, chunk_size=500, progress=None) -> int:
+    """Insert ``rows`` and return how many users were created.
+
+    Passwords for the next chunk are hashed in the pool while the current
+    chunk is written, and every chunk is one ``executemany`` in its own
+    transaction. ``workers=0`` hashes in-process (handy for tests).
+    """
+    bind = bind if bind is not None else database.engine
+    statement = insert(Users)
+    started = time.perf_counter()
+    created = 0
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+    try:
+        def submit(chunk):
+            passwords = [row['password'] for row in chunk]
+            if pool is None:
+                return chunk, map(hash_password, passwords)
+            return chunk, pool.map(hash_password, passwords, chunksize=16)
+
+        pending = None
+        for chunk in _chunks(rows, chunk_size):
+            ready, pending = pending, submit(chunk)
+            if ready is not None:
+                created += _insert(bind, statement, *ready)
+                _report(progress, created, started)
+        if pending is not None:
+            created += _insert(bind, statement, *pending)
+            _report(progress, created, started)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return created
+
+
+def _insert(bind, statement, chunk, hashes) -> int:
+    records = _records(chunk, list(hashes))
+    with bind.begin() as connection:
+        connection.execute(statement, records)
+    return len(records)
+
+
+def _report(progress, created, started):
+    if progress is not None:
+        elapsed = time.perf_counter() - started
+        progress(created, elapsed)
+
+
+def _print_progress(created, elapsed):
+    rate = created / elapsed if elapsed else 0.0
+    print(f"provisioned {created} users in {elapsed:.1f}s ({rate:.1f} users/s)",
+          file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-create users from CSV or JSON Lines.')
+    parser.add_argument('path', help="input file, or '-' for stdin")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default=None,
+                        help='input format (default: guessed from the file extension)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='password hashing processes (0 hashes in-process)')
+    parser.add_argument('--chunk-size', type=int, default=500,
+                        help='users per insert transaction')
+    args = parser.parse_args(argv)
+
+    created = provision_users(read_users(args.path, args.format),
+                              workers=args.workers,
+                              chunk_size=args.chunk_size,
+                              progress=_print_progress)
+    print(f"Created {created} users.")
+
+
+if __name__ == '__main__':
+    main()
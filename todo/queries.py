@@ -0,0 +1,106 @@
+# todo/queries.py
+"""Prebuilt statements for the hot todo queries.
+
+The statements are constructed once at import with bound parameters, so a
+request only binds values; SQLAlchemy's compiled cache then serves the SQL
+without rebuilding or recompiling the query. ``statement_cache_stats()``
+reports how often executions hit that cache (``python -m
+todo.bench.bench_queries`` compares against the old ``db.query()`` chains).
+"""
+import threading
+from collections import Counter
+
+from sqlalchemy import bindparam, event, func, select, update
+from sqlalchemy.engine import Engine
+
+from .models import Todos
+
+_all_todos = select(Todos)
+_todos_for_owner = select(Todos).where(Todos.owner_id == bindparam("owner_id"))
+_todo_by_id = select(Todos).where(Todos.id == bindparam("todo_id"))
+_todo_for_owner = select(Todos).where(
+    Todos.id == bindparam("todo_id"),
+    Todos.owner_id == bindparam("owner_id"),
+)
+
+# Open todos of an owner, most urgent (priority 1) first; a range scan of
+# ix_todos_owner_next with no sort step.
+_next_open = (
+    select(Todos.id)
+    .where(Todos.owner_id == bindparam("claimant_id"), Todos.complete == False)  # noqa: E712
+    .order_by(Todos.priority, Todos.id)
+)
+# Reads only columns of ix_todos_owner_next (an index-only scan); the rows
+# are then fetched by primary key.
+_next_todo_ids = (
+    select(Todos.id)
+    .where(Todos.owner_id == bindparam("owner_id"), Todos.complete == False)  # noqa: E712
+    .order_by(Todos.priority, Todos.id)
+    .limit(bindparam("n"))
+)
+_todos_by_ids = select(Todos).where(Todos.id.in_(bindparam("ids", expanding=True)))
+# One statement, so two workers can never complete the same todo.
+_complete_next = (
+    update(Todos)
+    .where(Todos.id == _next_open.limit(1).with_for_update(skip_locked=True).scalar_subquery())
+    .values(complete=True, completed_at=func.current_timestamp())
+    .returning(*Todos.__table__.columns)
+)
+
+
+def all_todos(db):
+    return db.scalars(_all_todos).all()
+
+
+def todos_for_owner(db, owner_id: int):
+    return db.scalars(_todos_for_owner, {"owner_id": owner_id}).all()
+
+
+def todo_by_id(db, todo_id: int):
+    return db.scalars(_todo_by_id, {"todo_id": todo_id}).first()
+
+
+def todo_for_owner(db, todo_id: int, owner_id: int):
+    return db.scalars(_todo_for_owner, {"todo_id": todo_id, "owner_id": owner_id}).first()
+
+
+def next_todos(db, owner_id: int, n: int):
+    ids = db.scalars(_next_todo_ids, {"owner_id": owner_id, "n": n}).all()
+    if not ids:
+        return []
+    todos = {todo.id: todo for todo in db.scalars(_todos_by_ids, {"ids": ids})}
+    return [todos[todo_id] for todo_id in ids if todo_id in todos]
+
+
+def complete_next(db, owner_id: int):
+    """Mark the owner's next open todo complete; its row (as a mapping) or None."""
+    return db.execute(_complete_next, {"claimant_id": owner_id}).mappings().first()
+
+
+# ---------------------------------------------------------------------------
+# Compiled-cache hit reporting
+# ---------------------------------------------------------------------------
+_cache_counts = Counter()
+_cache_lock = threading.Lock()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_cache_use(conn, cursor, statement, parameters, context, executemany):
+    outcome = getattr(context, "cache_hit", None)
+    if outcome is not None:
+        with _cache_lock:
+            _cache_counts[outcome.name.lower()] += 1
+
+
+def statement_cache_stats() -> dict:
+    """Executions per compiled-cache outcome and the overall hit rate."""
+    with _cache_lock:
+        counts = dict(_cache_counts)
+    looked_up = counts.get("cache_hit", 0) + counts.get("cache_miss", 0)
+    counts["hit_rate"] = counts.get("cache_hit", 0) / looked_up if looked_up else 0.0
+    return counts
+
+
+def reset_statement_cache_stats() -> None:
+    with _cache_lock:
+        _cache_counts.clear()
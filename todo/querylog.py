@@ -0,0 +1,134 @@
+# todo/querylog.py
+"""Slow-query log with per-statement-shape aggregates.
+
+:func:`install` hooks the cursor events of every engine (primary, replicas,
+shards, the archive database). Each statement is reduced to a fingerprint,
+its SQL with literals, bound parameters and ``IN`` lists replaced by ``?``,
+and ``log`` counts the calls and time spent per fingerprint. Statements
+slower than ``TODO_SLOW_QUERY_MS`` are also logged to ``todo.querylog``
+with their parameters.
+
+:func:`scans` runs ``EXPLAIN QUERY PLAN`` for a statement on SQLite and
+returns the tables it reads with a full scan; the test suite uses it to
+fail when a filtered query stops using an index.
+"""
+import functools
+import logging
+import os
+import re
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("todo.querylog")
+
+SLOW_QUERY_MS = float(os.getenv("TODO_SLOW_QUERY_MS", "100"))
+MAX_FINGERPRINTS = int(os.getenv("TODO_QUERY_LOG_SIZE", "1000"))
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PARAMETER = re.compile(r"%\(\w+\)s|%s|:\w+|\$\d+|__\[POSTCOMPILE_\w+\]")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """``statement`` with every literal and parameter replaced by ``?``."""
+    text = _STRING.sub("?", statement)
+    text = _PARAMETER.sub("?", text)
+    text = _NUMBER.sub("?", text)
+    text = _IN_LIST.sub("IN (...)", text)
+    return _SPACE.sub(" ", text).strip()
+
+
+class QueryLog:
+    def __init__(self, slow_ms=SLOW_QUERY_MS, max_fingerprints=MAX_FINGERPRINTS):
+        self.slow_ms = slow_ms
+        self.max_fingerprints = max_fingerprints
+        self._entries = {}  # fingerprint -> [calls, total_ms, max_ms, slow]
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def record(self, statement: str, parameters, elapsed_ms: float) -> None:
+        key = fingerprint(statement)
+        slow = elapsed_ms >= self.slow_ms
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_fingerprints:
+                    self.dropped += 1
+                    return
+                entry = self._entries[key] = [0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += elapsed_ms
+            entry[2] = max(entry[2], elapsed_ms)
+            entry[3] += slow
+        if slow:
+            logger.warning("slow query (%.1f ms): %s %r", elapsed_ms, statement, parameters)
+
+    def top(self, limit: int = 20, sort: str = "total_ms"):
+        """The ``limit`` fingerprints with the highest ``sort`` value."""
+        with self._lock:
+            rows = [{"fingerprint": key, "calls": calls, "total_ms": round(total, 3),
+                     "mean_ms": round(total / calls, 3), "max_ms": round(longest, 3), "slow": slow}
+                    for key, (calls, total, longest, slow) in self._entries.items()]
+        return sorted(rows, key=lambda row: row[sort], reverse=True)[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.dropped = 0
+
+
+log = QueryLog()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    log.record(statement, parameters, (time.perf_counter() - started) * 1000)
+
+
+def _handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def install(target=Engine) -> None:
+    """Time the statements of ``target`` (by default every engine)."""
+    for installed in {Engine, target}:
+        if event.contains(installed, "before_cursor_execute", _before_cursor_execute):
+            return
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
+    event.listen(target, "handle_error", _handle_error)
+
+
+_SCAN = re.compile(r"^SCAN (\w+)(.*)$")
+
+
+def scans(connection, statement: str, parameters=()):
+    """Tables ``statement`` reads with a full scan, per SQLite's query plan.
+
+    ``connection`` is a DBAPI connection. Scans of FTS5 tables (``VIRTUAL
+    TABLE INDEX``) and of single-row constants are not counted.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        details = [row[-1] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+    tables = []
+    for detail in details:
+        match = _SCAN.match(detail)
+        if match and match.group(1) != "CONSTANT" and "VIRTUAL TABLE INDEX" not in match.group(2):
+            tables.append(match.group(1))
+    return tables
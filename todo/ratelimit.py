@@ -0,0 +1,208 @@
+# todo/ratelimit.py
+"""Token-bucket rate limiting for the API.
+
+Routes opt in with a dependency naming the keys to limit on and what one
+call costs. Buckets are shared per bucket name and key, so bcrypt-heavy
+routes (``BCRYPT_COST``) drain a client's budget faster than cheap ones::
+
+    @router.post("/token", dependencies=[rate_limit("ip", "username", cost=BCRYPT_COST)])
+
+Keys are ``ip`` (client address), ``username`` (login form field) and
+``user`` (authenticated user id, needs ``current_user=get_current_user``).
+
+Budgets come from ``LIMITS`` and can be overridden per bucket with
+``TODO_RATE_LIMIT_<BUCKET>=<tokens per second>/<burst>``. Buckets live in
+process memory unless ``TODO_RATE_LIMIT_REDIS_URL`` points at a Redis
+shared by all workers; ``TODO_RATE_LIMIT=off`` disables limiting.
+"""
+import math
+import os
+import threading
+import time
+from typing import Annotated, NamedTuple
+
+from fastapi import Depends, HTTPException, Request
+from starlette import status
+from starlette.concurrency import run_in_threadpool
+
+
+class Limit(NamedTuple):
+    rate: float   # tokens added per second
+    burst: float  # bucket capacity
+
+
+LIMITS = {
+    # 10 bcrypt calls up front, then one every 5 seconds per key.
+    'auth': Limit(rate=2.0, burst=100.0),
+}
+
+BCRYPT_COST = 10
+
+ENABLED = os.getenv('TODO_RATE_LIMIT', 'on') != 'off'
+
+
+def get_limit(bucket: str) -> Limit:
+    override = os.getenv(f'TODO_RATE_LIMIT_{bucket.upper()}')
+    if override:
+        rate, burst = override.split('/')
+        return Limit(float(rate), float(burst))
+    return LIMITS[bucket]
+
+
+class MemoryBucketStore:
+    """Token buckets in a dict: ``key -> (tokens, updated_at, full_at)``.
+
+    ``consume`` is O(1). Every ``evict_interval`` seconds buckets that have
+    refilled completely are dropped, since a missing bucket means full.
+    """
+
+    blocking = False
+
+    def __init__(self, evict_interval: float = 60.0, clock=time.monotonic):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._clock = clock
+        self._evict_interval = evict_interval
+        self._next_eviction = clock() + evict_interval
+
+    def consume(self, key: str, cost: float, limit: Limit) -> float:
+        """Take ``cost`` tokens; return 0 if allowed, else seconds to wait."""
+        return self.consume_all([key], cost, limit)
+
+    def consume_all(self, keys, cost: float, limit: Limit) -> float:
+        """Take ``cost`` tokens from every bucket in ``keys``, or from none.
+
+        Returns 0 if every bucket had the tokens, else the longest wait; a
+        rejected call leaves all the buckets as they were.
+        """
+        now = self._clock()
+        with self._lock:
+            if now >= self._next_eviction:
+                self._evict(now)
+            levels = {}
+            for key in keys:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    levels[key] = limit.burst
+                else:
+                    levels[key] = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+            wait = max([(cost - tokens) / limit.rate for tokens in levels.values() if tokens < cost],
+                       default=0.0)
+            if wait:
+                return wait
+            for key, tokens in levels.items():
+                tokens -= cost
+                self._buckets[key] = (tokens, now, now + (limit.burst - tokens) / limit.rate)
+            return 0.0
+
+    def _evict(self, now: float) -> None:
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+        self._next_eviction = now + self._evict_interval
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisBucketStore:
+    """The same buckets kept in Redis so every worker shares them."""
+
+    blocking = True
+
+    # Check every bucket first, then take the tokens from all or none.
+    _SCRIPT = """
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local levels = {}
+    local wait = 0
+    for i, key in ipairs(KEYS) do
+        local state = redis.call('HMGET', key, 'tokens', 'ts')
+        local tokens = tonumber(state[1]) or burst
+        local ts = tonumber(state[2]) or now
+        tokens = math.min(burst, tokens + (now - ts) * rate)
+        levels[i] = tokens
+        if tokens < cost then wait = math.max(wait, (cost - tokens) / rate) end
+    end
+    if wait > 0 then return tostring(wait) end
+    for i, key in ipairs(KEYS) do
+        local tokens = levels[i] - cost
+        redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+        redis.call('PEXPIRE', key, math.ceil((burst - tokens) / rate * 1000) + 1000)
+    end
+    return '0'
+    """
+
+    def __init__(self, url: str, prefix: str = 'ratelimit:'):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._consume = self._redis.register_script(self._SCRIPT)
+        self._prefix = prefix
+
+    def consume(self, key: str, cost: float, limit: Limit) -> float:
+        return self.consume_all([key], cost, limit)
+
+    def consume_all(self, keys, cost: float, limit: Limit) -> float:
+        return float(self._consume(keys=[self._prefix + key for key in keys],
+                                   args=[limit.rate, limit.burst, cost]))
+
+    def clear(self) -> None:
+        for key in self._redis.scan_iter(self._prefix + '*'):
+            self._redis.delete(key)
+
+
+def _make_store():
+    url = os.getenv('TODO_RATE_LIMIT_REDIS_URL')
+    return RedisBucketStore(url) if url else MemoryBucketStore()
+
+
+store = _make_store()
+
+
+async def _check(request: Request, user, scopes, cost, bucket):
+    if not ENABLED:
+        return
+    limit = get_limit(bucket)
+    keys = []
+    for scope in scopes:
+        if scope == 'ip':
+            value = request.client.host if request.client else 'unknown'
+        elif scope == 'username':
+            value = (await request.form()).get('username')
+        else:
+            value = user.get('id') if user else None
+        if value is not None:
+            keys.append(f'{bucket}:{scope}:{value}')
+    if not keys:
+        return
+    # All scopes are charged together or not at all, so a request turned
+    # away by one bucket (say a targeted username) costs the others nothing.
+    if store.blocking:
+        wait = await run_in_threadpool(store.consume_all, keys, cost, limit)
+    else:
+        wait = store.consume_all(keys, cost, limit)
+    if wait:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                            detail='Too many requests.',
+                            headers={'Retry-After': str(math.ceil(wait))})
+
+
+def rate_limit(*scopes: str, cost: float = 1, bucket: str = 'auth', current_user=None):
+    """Build the route dependency limiting on ``scopes``."""
+    if 'user' in scopes:
+        if current_user is None:
+            raise ValueError("the 'user' scope needs current_user")
+
+        async def limit_user(request: Request, user: Annotated[dict, Depends(current_user)]):
+            await _check(request, user, scopes, cost, bucket)
+
+        return Depends(limit_user)
+
+    async def limit(request: Request):
+        await _check(request, None, scopes, cost, bucket)
+
+    return Depends(limit)
@@ -1,9 +1,12 @@
-from typing import Annotated
+from typing import Annotated, Optional
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException, Path
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from fastapi.responses import FileResponse
 from starlette import status
-from ..models import Todos, Users  # Assuming you have a User model defined
+from ..models import Jobs, Users  # Assuming you have a User model defined
 from ..database import SessionLocal
+from .. import changes, jobs, overview, queries, querylog, sharding, stats, usercache
 from .auth import get_current_user
 
 router = APIRouter(
@@ -20,47 +23,188 @@ def get_db():
         db.close()
 
 
+def get_read_db():
+    db = SessionLocal()
+    db.info['read_only'] = True
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_todo_db(todo_id: int = Path(gt=0)):
+    # With sharding on, open the shard that holds the todo.
+    if sharding.ENABLED:
+        db = sharding.shards.session(sharding.shards.locate_todo(todo_id) or 0)
+    else:
+        db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 db_dependency = Annotated[Session, Depends(get_db)]
+read_db_dependency = Annotated[Session, Depends(get_read_db)]
+todo_db_dependency = Annotated[Session, Depends(get_todo_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
 
 @router.get("/todo", status_code=status.HTTP_200_OK)
-async def read_all(user: user_dependency, db: db_dependency):
+async def read_all(user: user_dependency, db: read_db_dependency):
     if user is None or user.get('user_role') != 'admin':
         raise HTTPException(status_code=401, detail='Authentication Failed')
-    return db.query(Todos).all()
+    if sharding.ENABLED:
+        return sharding.merge_by_id(sharding.shards.fan_out(queries.all_todos))
+    return queries.all_todos(db)
 
 
 @router.delete("/todo/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_todo(user: user_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
+async def delete_todo(user: user_dependency, db: todo_db_dependency, todo_id: int = Path(gt=0)):
     if user is None or user.get('user_role') != 'admin':
         raise HTTPException(status_code=401, detail='Authentication Failed')
-    todo_model = db.query(Todos).filter(Todos.id == todo_id).first()
+    todo_model = queries.todo_by_id(db, todo_id)
     if todo_model is None:
         raise HTTPException(status_code=404, detail='Todo not found.')
-    db.query(Todos).filter(Todos.id == todo_id).delete()
+    stats.record(db, todo_model.owner_id, todo_model.complete, todo_model.priority, -1)
+    changes.record(db, todo_model.owner_id, "deleted", todo_id)
+    db.delete(todo_model)
     db.commit()
+    changes.notify()
+
+
+@router.get("/stats", status_code=status.HTTP_200_OK)
+async def read_stats(user: user_dependency, db: read_db_dependency):
+    if user is None or user.get('user_role') != 'admin':
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    if sharding.ENABLED:
+        results = sharding.shards.fan_out(stats.count_rows)
+        return stats.summarize([row for rows in results for row in rows])
+    return stats.global_stats(db)
+
+
+@router.get("/user-cache", status_code=status.HTTP_200_OK)
+async def read_user_cache_stats(user: user_dependency):
+    if user is None or user.get('user_role') != 'admin':
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    return usercache.cache.stats()
+
+
+@router.get("/queries", status_code=status.HTTP_200_OK)
+async def read_query_log(user: user_dependency,
+                         sort: str = Query(default="total_ms", pattern="^(total_ms|mean_ms|max_ms|calls|slow)$"),
+                         limit: int = Query(default=20, gt=0, le=1000)):
+    if user is None or user.get('user_role') != 'admin':
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    return {"slow_query_ms": querylog.log.slow_ms, "dropped": querylog.log.dropped,
+            "queries": querylog.log.top(limit, sort)}
 
 
 @router.get("/users", status_code=status.HTTP_200_OK)
-async def get_users(user: user_dependency, db: db_dependency):
+async def get_users(user: user_dependency, db: read_db_dependency):
     # Ensure only admin users have access to the list of all users
     if user is None or user.get('user_role') != 'admin':
         raise HTTPException(status_code=401, detail='Authentication Failed')
     return db.query(Users).all()
 
 
+@router.get("/users/overview", status_code=status.HTTP_200_OK)
+async def get_users_overview(user: user_dependency, db: read_db_dependency,
+                             sort: str = Query(default="id", pattern=f"^({'|'.join(overview.SORT_EXPRESSIONS)})$"),
+                             order: str = Query(default="asc", pattern="^(asc|desc)$"),
+                             cursor: Optional[str] = Query(default=None),
+                             limit: int = Query(default=50, gt=0, le=500),
+                             include_todos: bool = Query(default=False)):
+    if user is None or user.get('user_role') != 'admin':
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    after = None
+    if cursor is not None:
+        try:
+            after = overview.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail='Invalid cursor.')
+    options = dict(sort=sort, descending=order == "desc", after=after, limit=limit, include_todos=include_todos)
+    if sharding.ENABLED:
+        return overview.sharded_users_overview(db, sharding.shards, **options)
+    return overview.users_overview(db, **options)
+
+
 @router.get("/todo/{todo_id}", status_code=status.HTTP_200_OK)
 async def read_one_todo(
     user: user_dependency,
-    db: db_dependency,
+    db: todo_db_dependency,
     todo_id: int = Path(gt=0),
 ):
     if user is None or user.get("user_role") != "admin":
         raise HTTPException(status_code=401, detail="Authentication Failed")
 
-    todo = db.query(Todos).filter(Todos.id == todo_id).first()
+    todo = queries.todo_by_id(db, todo_id)
     if todo is None:
         raise HTTPException(status_code=404, detail="Todo not found.")
 
     return todo
+
+
+class DeleteTodosJob(BaseModel):
+    owner_id: Optional[int] = None
+    complete: Optional[bool] = None
+
+
+class ExportJob(BaseModel):
+    owner_id: Optional[int] = None
+
+
+def _submit(user, kind, params=None):
+    if user is None or user.get('user_role') != 'admin':
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    return {"id": jobs.runner.submit(kind, params, user_id=user.get('id'))}
+
+
+@router.post("/jobs/delete-todos", status_code=status.HTTP_202_ACCEPTED)
+async def submit_delete_todos(user: user_dependency, job_request: DeleteTodosJob):
+    return _submit(user, "delete_todos", job_request.model_dump(exclude_none=True))
+
+
+@router.post("/jobs/export", status_code=status.HTTP_202_ACCEPTED)
+async def submit_export(user: user_dependency, job_request: ExportJob):
+    return _submit(user, "export", job_request.model_dump(exclude_none=True))
+
+
+@router.post("/jobs/reindex", status_code=status.HTTP_202_ACCEPTED)
+async def submit_reindex(user: user_dependency):
+    return _submit(user, "reindex")
+
+
+def _job_or_404(db, job_id):
+    job = db.get(Jobs, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail='Job not found.')
+    return job
+
+
+@router.get("/jobs/{job_id}", status_code=status.HTTP_200_OK)
+async def read_job(user: user_dependency, db: db_dependency, job_id: int = Path(gt=0)):
+    if user is None or user.get('user_role') != 'admin':
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    return jobs.job_dict(_job_or_404(db, job_id))
+
+
+@router.post("/jobs/{job_id}/cancel", status_code=status.HTTP_202_ACCEPTED)
+async def cancel_job(user: user_dependency, db: db_dependency, job_id: int = Path(gt=0)):
+    if user is None or user.get('user_role') != 'admin':
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    _job_or_404(db, job_id)
+    if not jobs.runner.cancel(job_id):
+        raise HTTPException(status_code=409, detail='Job already finished.')
+    db.expire_all()
+    return jobs.job_dict(_job_or_404(db, job_id))
+
+
+@router.get("/jobs/{job_id}/download", status_code=status.HTTP_200_OK)
+async def download_export(user: user_dependency, db: db_dependency, job_id: int = Path(gt=0)):
+    if user is None or user.get('user_role') != 'admin':
+        raise HTTPException(status_code=401, detail='Authentication Failed')
+    job = jobs.job_dict(_job_or_404(db, job_id))
+    if job["kind"] != "export" or job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail='No finished export for this job.')
+    return FileResponse(job["result"]["path"], media_type="application/x-ndjson")
@@ -4,11 +4,12 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from starlette import status
-from ..database import SessionLocal
+from ..database import SessionLocal, current_user_id
 from ..models import Users
+from .. import usercache
+from ..ratelimit import rate_limit, BCRYPT_COST
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from jose import jwt, JWTError
 
 router = APIRouter(
     prefix='/auth',
@@ -49,15 +50,17 @@ db_dependency = Annotated[Session, Depends(get_db)]
 
 
 def authenticate_user(username: str, password: str, db):
-    user = db.query(Users).filter(Users.username == username).first()
-    if not user:
+    record = usercache.cache.get_by_username(db, username)
+    if not record:
         return False
-    if not bcrypt_context.verify(password, user.hashed_password):
+    if not bcrypt_context.verify(password, record['hashed_password']):
         return False
-    return user
+    return Users(**record)
 
 
 def create_access_token(username: str, user_id: int, role: str, expires_delta: timedelta):
+    # python-jose is imported on first use to keep it out of the cold start.
+    from jose import jwt
     encode = {'sub': username, 'id': user_id, 'role': role}
     expires = datetime.now(timezone.utc) + expires_delta
     encode.update({'exp': expires})
@@ -65,6 +68,7 @@ def create_access_token(username: str, user_id: int, role: str, expires_delta: t
 
 
 async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
+    from jose import jwt, JWTError
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get('sub')
@@ -73,13 +77,15 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
         if username is None or user_id is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                 detail='Could not validate user.')
+        current_user_id.set(user_id)
         return {'username': username, 'id': user_id, 'user_role': user_role}
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail='Could not validate user.')
 
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
+@router.post("/", status_code=status.HTTP_201_CREATED,
+             dependencies=[rate_limit("ip", cost=BCRYPT_COST)])
 async def create_user(db: db_dependency,
                       create_user_request: CreateUserRequest):
     create_user_model = Users(
@@ -95,9 +101,11 @@ async def create_user(db: db_dependency,
 
     db.add(create_user_model)
     db.commit()
+    usercache.cache.invalidate(create_user_model.id)
 
 
-@router.post("/token", response_model=Token)
+@router.post("/token", response_model=Token,
+             dependencies=[rate_limit("ip", "username", cost=BCRYPT_COST)])
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
                                  db: db_dependency):
     user = authenticate_user(form_data.username, form_data.password, db)
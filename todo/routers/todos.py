@@ -1,10 +1,13 @@
-from typing import Annotated
+from datetime import datetime, timezone
+from typing import Annotated, Optional
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException, Path
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
+from fastapi.responses import StreamingResponse
 from starlette import status
 
 from ..models import Todos
+from .. import archive, changes, queries, search, sharding, stats, writepipe
 from ..database import SessionLocal
 from .auth import get_current_user
 
@@ -14,8 +17,27 @@ router = APIRouter(
 )
 
 
-def get_db():
-    db = SessionLocal()
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+
+def _session(user):
+    # With sharding on, the owner's todos live on their shard.
+    if sharding.ENABLED:
+        return sharding.shards.session_for(user.get("id"))
+    return SessionLocal()
+
+
+def get_db(user: user_dependency):
+    db = _session(user)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db(user: user_dependency):
+    db = _session(user)
+    db.info["read_only"] = True
     try:
         yield db
     finally:
@@ -23,7 +45,11 @@ def get_db():
 
 
 db_dependency = Annotated[Session, Depends(get_db)]
-user_dependency = Annotated[dict, Depends(get_current_user)]
+read_db_dependency = Annotated[Session, Depends(get_read_db)]
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
 class TodoRequest(BaseModel):
@@ -34,27 +60,110 @@ class TodoRequest(BaseModel):
 
 
 @router.get("/", status_code=status.HTTP_200_OK)
-async def read_all(user: user_dependency, db: db_dependency):
+async def read_all(
+    user: user_dependency,
+    db: read_db_dependency,
+    include_archived: bool = Query(default=False),
+):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+    todo_models = queries.todos_for_owner(db, user.get("id"))
+    if include_archived:
+        todo_models = sorted([*todo_models, *archive.archived_for_owner(user.get("id"))],
+                             key=lambda todo: todo.id)
+    return todo_models
+
+
+@router.get("/stats", status_code=status.HTTP_200_OK)
+async def read_stats(user: user_dependency, db: read_db_dependency):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    return db.query(Todos).filter(Todos.owner_id == user.get("id")).all()
+    return stats.user_stats(db, user.get("id"))
+
+
+@router.get("/changes", status_code=status.HTTP_200_OK)
+async def read_changes(
+    user: user_dependency,
+    request: Request,
+    since: Optional[str] = Query(default=None),
+    wait: float = Query(default=25, ge=0, le=60),
+):
+    """Changes to the user's todos after the ``since`` cursor.
+
+    Sent as Server-Sent Events when the client accepts ``text/event-stream``
+    (resuming from ``Last-Event-ID``), otherwise long-polled for up to
+    ``wait`` seconds. Without a cursor, or with ``reset`` in the answer,
+    fetch ``/todos/`` once and continue from the returned cursor.
+    """
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+    cursor = since or request.headers.get("last-event-id")
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return StreamingResponse(changes.stream(request, user.get("id"), cursor),
+                                 media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache"})
+    return await changes.poll(user.get("id"), cursor, wait)
+
+
+@router.get("/search", status_code=status.HTTP_200_OK)
+async def search_todos(
+    user: user_dependency,
+    db: read_db_dependency,
+    q: str = Query(min_length=1, max_length=200),
+    limit: int = Query(default=20, gt=0, le=100),
+    offset: int = Query(default=0, ge=0),
+):
+    """The user's todos whose title or description contain every term of ``q``, best match first."""
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+    return search.search_todos(db, user.get("id"), q, limit=limit, offset=offset)
+
+
+@router.get("/next", status_code=status.HTTP_200_OK)
+async def read_next(
+    user: user_dependency,
+    db: read_db_dependency,
+    n: int = Query(default=5, gt=0, le=100),
+):
+    """The user's ``n`` most urgent open todos (priority 1 first, then oldest)."""
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+    return queries.next_todos(db, user.get("id"), n)
+
+
+@router.post("/next/complete", status_code=status.HTTP_200_OK)
+async def complete_next(user: user_dependency, db: db_dependency):
+    """Atomically complete the user's most urgent open todo and return it."""
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication Failed")
+
+    def op(db):
+        row = queries.complete_next(db, user.get("id"))
+        if row is None:
+            raise HTTPException(status_code=404, detail="No open todos.")
+        stats.record(db, row["owner_id"], False, row["priority"], -1)
+        stats.record(db, row["owner_id"], True, row["priority"], 1)
+        changes.record(db, row["owner_id"], "updated", row["id"], changes.todo_dict(Todos(**row)))
+        return dict(row)
+
+    todo = await writepipe.run(db, op)
+    changes.notify()
+    return todo
 
 
 @router.get("/todo/{todo_id}", status_code=status.HTTP_200_OK)
 async def read_todo(
     user: user_dependency,
-    db: db_dependency,
+    db: read_db_dependency,
     todo_id: int = Path(gt=0),
+    include_archived: bool = Query(default=False),
 ):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
 
-    todo_model = (
-        db.query(Todos)
-        .filter(Todos.id == todo_id)
-        .filter(Todos.owner_id == user.get("id"))
-        .first()
-    )
+    todo_model = queries.todo_for_owner(db, todo_id, user.get("id"))
+    if todo_model is None and include_archived:
+        todo_model = archive.archived_todo(todo_id, user.get("id"))
     if todo_model is not None:
         return todo_model
     raise HTTPException(status_code=404, detail="Todo not found.")
@@ -68,10 +177,19 @@ async def create_todo(
 ):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
-    todo_model = Todos(**todo_request.model_dump(), owner_id=user.get("id"))
 
-    db.add(todo_model)
-    db.commit()
+    def op(db):
+        todo_model = Todos(**todo_request.model_dump(), owner_id=user.get("id"),
+                           completed_at=_utcnow() if todo_request.complete else None)
+        if sharding.ENABLED:
+            todo_model.id = sharding.allocate_todo_id(db)
+        db.add(todo_model)
+        stats.record(db, todo_model.owner_id, todo_model.complete, todo_model.priority, 1)
+        db.flush()
+        changes.record(db, todo_model.owner_id, "created", todo_model.id, changes.todo_dict(todo_model))
+
+    await writepipe.run(db, op)
+    changes.notify()
 
 
 @router.put("/todo/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -84,22 +202,24 @@ async def update_todo(
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
 
-    todo_model = (
-        db.query(Todos)
-        .filter(Todos.id == todo_id)
-        .filter(Todos.owner_id == user.get("id"))
-        .first()
-    )
-    if todo_model is None:
-        raise HTTPException(status_code=404, detail="Todo not found.")
+    def op(db):
+        todo_model = queries.todo_for_owner(db, todo_id, user.get("id"))
+        if todo_model is None:
+            raise HTTPException(status_code=404, detail="Todo not found.")
 
-    todo_model.title = todo_request.title
-    todo_model.description = todo_request.description
-    todo_model.priority = todo_request.priority
-    todo_model.complete = todo_request.complete
+        stats.record(db, todo_model.owner_id, todo_model.complete, todo_model.priority, -1)
+        todo_model.title = todo_request.title
+        todo_model.description = todo_request.description
+        todo_model.priority = todo_request.priority
+        if todo_request.complete != bool(todo_model.complete):
+            todo_model.completed_at = _utcnow() if todo_request.complete else None
+        todo_model.complete = todo_request.complete
+        stats.record(db, todo_model.owner_id, todo_model.complete, todo_model.priority, 1)
+        db.add(todo_model)
+        changes.record(db, todo_model.owner_id, "updated", todo_id, changes.todo_dict(todo_model))
 
-    db.add(todo_model)
-    db.commit()
+    await writepipe.run(db, op)
+    changes.notify()
 
 
 @router.delete("/todo/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -111,19 +231,14 @@ async def delete_todo(
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
 
-    todo_model = (
-        db.query(Todos)
-        .filter(Todos.id == todo_id)
-        .filter(Todos.owner_id == user.get("id"))
-        .first()
-    )
-    if todo_model is None:
-        raise HTTPException(status_code=404, detail="Todo not found.")
-
-    (
-        db.query(Todos)
-        .filter(Todos.id == todo_id)
-        .filter(Todos.owner_id == user.get("id"))
-        .delete()
-    )
-    db.commit()
+    def op(db):
+        todo_model = queries.todo_for_owner(db, todo_id, user.get("id"))
+        if todo_model is None:
+            raise HTTPException(status_code=404, detail="Todo not found.")
+
+        stats.record(db, todo_model.owner_id, todo_model.complete, todo_model.priority, -1)
+        db.delete(todo_model)
+        changes.record(db, todo_model.owner_id, "deleted", todo_id)
+
+    await writepipe.run(db, op)
+    changes.notify()
@@ -1,11 +1,14 @@
 from typing import Annotated
 from pydantic import BaseModel, Field
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 # from fastapi import APIRouter, Depends, HTTPException, Path
 from fastapi import APIRouter, Depends, HTTPException
 from starlette import status
 from ..models import Users
 from ..database import SessionLocal
+from .. import usercache, writepipe
+from ..ratelimit import rate_limit, BCRYPT_COST
 from .auth import get_current_user
 from passlib.context import CryptContext
 
@@ -23,7 +26,17 @@ def get_db():
         db.close()
 
 
+def get_read_db():
+    db = SessionLocal()
+    db.info['read_only'] = True
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 db_dependency = Annotated[Session, Depends(get_db)]
+read_db_dependency = Annotated[Session, Depends(get_read_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 
@@ -34,13 +47,14 @@ class UserVerification(BaseModel):
 
 
 @router.get('/', status_code=status.HTTP_200_OK)
-async def get_user(user: user_dependency, db: db_dependency):
+async def get_user(user: user_dependency, db: read_db_dependency):
     if user is None:
         raise HTTPException(status_code=401, detail='Authentication Failed')
-    return db.query(Users).filter(Users.id == user.get('id')).first()
+    return usercache.cache.get_by_id(db, user.get('id'))
 
 
-@router.put("/password", status_code=status.HTTP_204_NO_CONTENT)
+@router.put("/password", status_code=status.HTTP_204_NO_CONTENT,
+            dependencies=[rate_limit("user", cost=BCRYPT_COST, current_user=get_current_user)])
 async def change_password(user: user_dependency, db: db_dependency,
                           user_verification: UserVerification):
     if user is None:
@@ -52,6 +66,7 @@ async def change_password(user: user_dependency, db: db_dependency,
     user_model.hashed_password = bcrypt_context.hash(user_verification.new_password)
     db.add(user_model)
     db.commit()
+    usercache.cache.invalidate(user_model.id)
 
 
 @router.put("/phonenumber/{phone_number}", status_code=status.HTTP_204_NO_CONTENT)
@@ -63,10 +78,10 @@ async def change_phone_number(
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication Failed")
 
-    user_model = db.query(Users).filter(Users.id == user.get("id")).first()
-    if user_model is None:
-        raise HTTPException(status_code=404, detail="User not found.")
+    def op(db):
+        result = db.execute(update(Users).where(Users.id == user.get("id")).values(phone_number=phone_number))
+        if result.rowcount == 0:
+            raise HTTPException(status_code=404, detail="User not found.")
 
-    user_model.phone_number = phone_number
-    db.add(user_model)
-    db.commit()
+    await writepipe.run(db, op)
+    usercache.cache.invalidate(user.get("id"))
@@ -0,0 +1,63 @@
+# todo/search.py
+"""Full-text search over the current user's todos.
+
+On SQLite the ``todos_fts`` FTS5 index (created with the ``todos`` table, or
+by migration ``c41d7e9a0b52`` for existing databases) answers the query and
+ranks matches with bm25; other databases fall back to a case-insensitive
+``LIKE`` per term. ``python -m todo.bench.bench_search`` compares the two.
+
+The user's text never reaches FTS5 query syntax: every term is quoted, so
+``AND``/``NEAR``/column filters are matched literally. A trailing ``*``
+makes a term a prefix search.
+"""
+import re
+
+from sqlalchemy import and_, or_, select, text
+
+from .models import Todos
+
+_search = select(Todos).from_statement(text(
+    "SELECT todos.* FROM todos_fts JOIN todos ON todos.id = todos_fts.rowid "
+    "WHERE todos_fts MATCH :query AND todos.owner_id = :owner_id "
+    "ORDER BY bm25(todos_fts), todos.id "
+    "LIMIT :limit OFFSET :offset"
+))
+
+
+def terms(query: str):
+    return re.findall(r"[^\s\"]+", query)
+
+
+def match_expression(query: str) -> str:
+    """FTS5 MATCH expression requiring every term of ``query``."""
+    quoted = []
+    for term in terms(query):
+        prefix = term.endswith("*")
+        term = term.rstrip("*")
+        if term:
+            quoted.append(f'"{term}"*' if prefix else f'"{term}"')
+    return " ".join(quoted)
+
+
+def search_todos(db, owner_id: int, query: str, limit: int = 20, offset: int = 0):
+    """``owner_id``'s todos matching every term of ``query``, best first."""
+    if db.get_bind().dialect.name != "sqlite":
+        return _like_search(db, owner_id, query, limit, offset)
+    expression = match_expression(query)
+    if not expression:
+        return []
+    return db.scalars(_search, {"query": expression, "owner_id": owner_id,
+                                "limit": limit, "offset": offset}).all()
+
+
+def _like_search(db, owner_id, query, limit, offset):
+    clauses = []
+    for term in terms(query):
+        pattern = f"%{term.rstrip('*')}%"
+        clauses.append(or_(Todos.title.ilike(pattern), Todos.description.ilike(pattern)))
+    if not clauses:
+        return []
+    return db.scalars(
+        select(Todos).where(Todos.owner_id == owner_id, and_(*clauses))
+        .order_by(Todos.id).limit(limit).offset(offset)
+    ).all()
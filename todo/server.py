@@ -0,0 +1,225 @@
+# todo/server.py
+"""Pre-forking launcher for the todo app.
+
+The master process prepares the schema once, imports ``todo.main`` so every
+worker shares the loaded app copy-on-write, binds the listening socket and
+then forks the uvicorn workers::
+
+    python -m todo.server --workers 4 --port 8000 --schema upgrade
+
+``--schema create`` (the default) runs ``create_all``; ``--schema upgrade``
+runs Alembic, bootstrapping the version table on databases that predate it.
+SIGTERM/SIGINT are forwarded to the workers, which finish in-flight requests
+and dispose the connection pool before exiting. The master is also the only
+process that fails interrupted jobs: those of dead processes at startup, and
+those of each worker that exits.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+from sqlalchemy import create_engine, inspect
+
+from . import archive, database, jobs, sharding
+
+logger = logging.getLogger("todo.server")
+
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), "alembic.ini")
+# The revision matching the models before Alembic managed the database.
+BASELINE_REVISION = "aeff25f89db0"
+# A worker that crashes sooner than MIN_UPTIME seconds after starting is
+# restarted after a delay doubling from RESTART_DELAY_MIN to RESTART_DELAY_MAX.
+MIN_UPTIME = 10.0
+RESTART_DELAY_MIN = 0.5
+RESTART_DELAY_MAX = 30.0
+
+
+def prepare_schema(mode: str = "create", url: str = None) -> None:
+    """Bring the schema up to date; meant to run once, before workers start."""
+    if mode == "none":
+        return
+    engine = database.engine if url is None else create_engine(url)
+    try:
+        if url is None and sharding.ENABLED:
+            # Shards only hold the todo tables and are not Alembic managed.
+            sharding.shards.create_all()
+        if url is None:
+            archive.create_all()
+        if mode == "create":
+            database.Base.metadata.create_all(bind=engine)
+            return
+
+        from alembic import command
+        from alembic.config import Config
+
+        config = Config(ALEMBIC_INI)
+        config.set_main_option("sqlalchemy.url", engine.url.render_as_string(hide_password=False).replace("%", "%%"))
+        tables = inspect(engine).get_table_names()
+        if "alembic_version" in tables:
+            command.upgrade(config, "head")
+        elif not tables:
+            # Fresh database: the models already describe the head revision.
+            database.Base.metadata.create_all(bind=engine)
+            command.stamp(config, "head")
+        else:
+            # Created by create_all before migrations were tracked.
+            command.stamp(config, BASELINE_REVISION)
+            command.upgrade(config, "head")
+    finally:
+        if url is not None:
+            engine.dispose()
+
+
+def restart_delay(previous: float, uptime: float) -> float:
+    """Seconds to wait before restarting a worker that ran for ``uptime`` seconds."""
+    if uptime >= MIN_UPTIME:
+        return 0.0
+    return min(RESTART_DELAY_MAX, max(RESTART_DELAY_MIN, previous * 2))
+
+
+def fail_interrupted_jobs(owner: str = None) -> int:
+    """:func:`jobs.fail_interrupted`, or 0 on a database without a jobs table (``--schema none``)."""
+    if not inspect(database.engine).has_table("jobs"):
+        return 0
+    with database.SessionLocal() as db:
+        return jobs.fail_interrupted(db, owner=owner)
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(index: int, app, sock: socket.socket, args, forked_at: float) -> None:
+    import uvicorn
+
+    # Default handlers; uvicorn installs its own graceful ones in run().
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # Never reuse a pooled connection inherited from the master.
+    database.dispose_engines(close=False)
+    if sharding.ENABLED:
+        sharding.shards.dispose(close=False)
+    archive.dispose(close=False)
+
+    class WorkerServer(uvicorn.Server):
+        async def startup(self, sockets=None):
+            await super().startup(sockets=sockets)
+            logger.info("worker %d (pid %d) ready in %.1f ms",
+                        index, os.getpid(), (time.perf_counter() - forked_at) * 1000)
+
+    config = uvicorn.Config(app, log_level=args.log_level, lifespan="on")
+    server = WorkerServer(config)
+    try:
+        server.run(sockets=[sock])
+    finally:
+        database.dispose_engines()
+
+
+def serve(args) -> int:
+    started = time.perf_counter()
+    prepare_schema(args.schema)
+    logger.info("schema (%s) ready in %.1f ms", args.schema, (time.perf_counter() - started) * 1000)
+    # Only the supervisor sweeps: jobs of processes that are gone, never a
+    # live sibling's.
+    fail_interrupted_jobs()
+
+    # Preload the app in the master so workers share it copy-on-write.
+    os.environ["TODO_SCHEMA_MANAGED"] = "1"
+    from .main import app
+    database.dispose_engines()
+    if sharding.ENABLED:
+        sharding.shards.dispose()
+    archive.dispose()
+    logger.info("app preloaded in %.1f ms", (time.perf_counter() - started) * 1000)
+
+    sock = _bind_socket(args.host, args.port)
+    workers = {}
+    started_at = {}  # index -> monotonic start of its current process
+    delays = {}      # index -> last restart delay
+    stopping = False
+
+    def spawn(index):
+        forked_at = time.perf_counter()
+        started_at[index] = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(index, app, sock, args, forked_at)
+            except BaseException:
+                logger.exception("worker %d crashed", index)
+                code = 1
+            finally:
+                os._exit(code)
+        workers[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(args.workers):
+        spawn(index)
+    logger.info("listening on %s:%d with %d workers", args.host, args.port, args.workers)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = workers.pop(pid, None)
+        if index is not None:
+            failed = fail_interrupted_jobs(owner=jobs.process_owner(pid))
+            database.dispose_engines()
+            if failed:
+                logger.warning("worker %d (pid %d) left %d jobs unfinished", index, pid, failed)
+        if index is not None and not stopping:
+            delays[index] = restart_delay(delays.get(index, 0.0), time.monotonic() - started_at[index])
+            logger.warning("worker %d (pid %d) exited with status %d; restarting in %.1f s",
+                           index, pid, os.waitstatus_to_exitcode(status), delays[index])
+            deadline = time.monotonic() + delays[index]
+            while not stopping and time.monotonic() < deadline:
+                time.sleep(0.1)  # short steps, so SIGTERM is not held up
+            if not stopping:
+                spawn(index)
+
+    sock.close()
+    database.dispose_engines()
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the todo app with pre-forked workers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int,
+                        default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--schema", choices=["create", "upgrade", "none"], default="create")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(levelname)s: [%(name)s] %(message)s")
+    # Set on our logger: alembic's fileConfig resets the root logger level.
+    logger.setLevel(args.log_level.upper())
+    return serve(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+# todo/sharding.py
+"""Optional sharding of todos across several databases by ``owner_id``.
+
+Enable it with ``TODO_SHARDS=N`` (``todosapp_shard<i>.db`` next to the app)
+or an explicit ``TODO_SHARD_URLS=url0,url1,...``. Users stay in the main
+database; ``todos`` (with ``todo_counts`` and the ``todo_changes`` feed) live
+on the shard picked by a jump consistent hash of the owner, each shard with
+its own engine and pool, so SQLite's single-writer lock is per shard
+instead of global.
+
+Todo ids stay globally unique: shard ``i`` hands out ids from its own range
+``[i * ID_RANGE + 1, (i + 1) * ID_RANGE)`` through ``todo_id_sequence``.
+Rows keep their id when they move, so lookups by id fan out to all shards.
+
+Rebalance after changing the shard count (old config in the environment)::
+
+    python -m todo.sharding rebalance --shards 8
+    python -m todo.sharding rebalance --urls sqlite:///a.db,sqlite:///b.db
+
+To shard an existing single database, run the first rebalance with
+``TODO_SHARD_URLS`` set to its ``DATABASE_URL``.
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, delete, func, insert, inspect, select, update
+from sqlalchemy.orm import sessionmaker
+
+from . import database, stats
+from .models import TodoChanges, TodoCounts, Todos, TodosArchive
+
+ID_RANGE = 1 << 40
+
+shard_metadata = MetaData()
+todo_id_sequence = Table(
+    "todo_id_sequence", shard_metadata,
+    Column("shard", Integer, primary_key=True),
+    Column("next_id", Integer, nullable=False),
+)
+
+SHARDED_TABLES = [Todos.__table__, TodoCounts.__table__, TodoChanges.__table__]
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Lamping & Veach jump consistent hash: growing N to N+1 moves 1/(N+1) of keys."""
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, j = -1, 0
+    while j < buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_urls_from_env():
+    urls = [url.strip() for url in os.getenv("TODO_SHARD_URLS", "").split(",") if url.strip()]
+    if not urls and os.getenv("TODO_SHARDS"):
+        urls = default_urls(int(os.environ["TODO_SHARDS"]))
+    return urls
+
+
+def default_urls(count: int):
+    return [f"sqlite:///./todosapp_shard{index}.db" for index in range(count)]
+
+
+class ShardSet:
+    def __init__(self, urls):
+        self.urls = list(urls)
+        self.engines = [
+            create_engine(url, connect_args={"check_same_thread": False} if url.startswith("sqlite") else {})
+            for url in self.urls
+        ]
+        self.sessionmakers = [sessionmaker(autoflush=False, bind=engine) for engine in self.engines]
+        self._executor = None
+        self._executor_pid = None
+
+    def __len__(self):
+        return len(self.urls)
+
+    def index_for(self, owner_id: int) -> int:
+        return jump_hash(owner_id, len(self.urls))
+
+    def session(self, index: int):
+        db = self.sessionmakers[index]()
+        db.info["shard"] = index
+        return db
+
+    def session_for(self, owner_id: int):
+        return self.session(self.index_for(owner_id))
+
+    def fan_out(self, fn):
+        """Run ``fn(session)`` on every shard concurrently; results in shard order."""
+        def run(index):
+            db = self.session(index)
+            try:
+                return fn(db)
+            finally:
+                db.close()
+
+        # Threads do not survive a fork, so each process gets its own pool.
+        if self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=len(self.urls), thread_name_prefix="shard")
+            self._executor_pid = os.getpid()
+        return list(self._executor.map(run, range(len(self.urls))))
+
+    def locate_todo(self, todo_id: int):
+        """Index of the shard holding ``todo_id``, or None."""
+        found = self.fan_out(lambda db: db.scalar(select(Todos.id).where(Todos.id == todo_id)))
+        for index, hit in enumerate(found):
+            if hit is not None:
+                return index
+        return None
+
+    def create_all(self) -> None:
+        for engine in self.engines:
+            Todos.metadata.create_all(bind=engine, tables=SHARDED_TABLES)
+            shard_metadata.create_all(bind=engine)
+        for index, engine in enumerate(self.engines):
+            with engine.begin() as connection:
+                if connection.scalar(select(todo_id_sequence.c.next_id)
+                                     .where(todo_id_sequence.c.shard == index)) is None:
+                    connection.execute(insert(todo_id_sequence).values(
+                        shard=index, next_id=_first_free_id(self.engines, index)))
+
+    def dispose(self, close: bool = True) -> None:
+        for engine in self.engines:
+            engine.dispose(close=close)
+
+
+def _first_free_id(engines, index: int) -> int:
+    """Next unused id in shard ``index``'s range, looking at every shard and the archive."""
+    low, high = index * ID_RANGE, (index + 1) * ID_RANGE
+    highest = low
+    for engine in engines:
+        with engine.connect() as connection:
+            value = connection.scalar(select(func.max(Todos.id))
+                                      .where(Todos.id > low, Todos.id < high))
+        if value is not None:
+            highest = max(highest, value)
+    # Archived todos keep their ids; a new todo must not take one of them.
+    value = _archived_max(low, high)
+    if value is not None:
+        highest = max(highest, value)
+    return max(highest + 1, 1)
+
+
+def _archived_max(low: int, high: int):
+    from . import archive  # archive imports this module
+
+    archive_db = archive.session()
+    try:
+        if not inspect(archive_db.get_bind()).has_table(TodosArchive.__tablename__):
+            return None
+        return archive_db.scalar(select(func.max(TodosArchive.id))
+                                 .where(TodosArchive.id > low, TodosArchive.id < high))
+    finally:
+        archive_db.close()
+
+
+def allocate_todo_id(db) -> int:
+    """Take the next id of ``db``'s shard inside the caller's transaction."""
+    index = db.info["shard"]
+    return db.execute(
+        update(todo_id_sequence)
+        .where(todo_id_sequence.c.shard == index)
+        .values(next_id=todo_id_sequence.c.next_id + 1)
+        .returning(todo_id_sequence.c.next_id - 1)
+    ).scalar_one()
+
+
+def todo_sessions():
+    """One new session per database holding todos: every shard, or the main one."""
+    if ENABLED:
+        return [shards.session(index) for index in range(len(shards))]
+    return [database.SessionLocal()]
+
+
+def merge_by_id(results):
+    """Flatten per-shard lists of todos into one list ordered by id."""
+    return sorted((todo for result in results for todo in result), key=lambda todo: todo.id)
+
+
+_urls = shard_urls_from_env()
+shards = ShardSet(_urls) if _urls else None
+ENABLED = shards is not None
+
+
+# ---------------------------------------------------------------------------
+# Rebalancing
+# ---------------------------------------------------------------------------
+def rebalance(source: ShardSet, target: ShardSet, batch_size: int = 1000, progress=print) -> int:
+    """Move every todo to the shard ``target`` assigns its owner; returns rows moved.
+
+    Shards are matched by URL, so a shard kept between the two layouts is
+    only scanned, not copied. Each batch is written to the new shard before
+    it is deleted from the old one, which makes an interrupted run safe to
+    repeat. Counters and id sequences of ``target`` are rebuilt at the end.
+    """
+    target.create_all()
+    target_index = {url: index for index, url in enumerate(target.urls)}
+    scanned = {url: engine for url, engine in zip(source.urls + target.urls,
+                                                   source.engines + target.engines)}
+    columns = [column.name for column in Todos.__table__.columns]
+    moved = 0
+    for url, engine in scanned.items():
+        last_id = 0
+        while True:
+            with engine.connect() as connection:
+                rows = connection.execute(
+                    select(Todos.__table__).where(Todos.id > last_id)
+                    .order_by(Todos.id).limit(batch_size)
+                ).mappings().all()
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            outgoing = {}
+            for row in rows:
+                destination = target.index_for(row["owner_id"])
+                if target.urls[destination] != url:
+                    outgoing.setdefault(destination, []).append({name: row[name] for name in columns})
+            for destination, batch in outgoing.items():
+                ids = [row["id"] for row in batch]
+                with target.engines[destination].begin() as connection:
+                    connection.execute(delete(Todos.__table__).where(Todos.id.in_(ids)))
+                    connection.execute(insert(Todos.__table__), batch)
+                with engine.begin() as connection:
+                    connection.execute(delete(Todos.__table__).where(Todos.id.in_(ids)))
+                moved += len(batch)
+            if progress is not None and outgoing:
+                progress(f"{url}: moved {moved} todos so far")
+        if url not in target_index and progress is not None:
+            progress(f"{url} is no longer a shard; its todos table is now empty")
+
+    for index in range(len(target)):
+        db = target.session(index)
+        try:
+            stats.rebuild_counters(db)
+            # Only ever raise the sequence: ids issued before, even of todos
+            # deleted since, must not be handed out again.
+            greatest = func.greatest if db.get_bind().dialect.name == "postgresql" else func.max
+            db.execute(update(todo_id_sequence).where(todo_id_sequence.c.shard == index)
+                       .values(next_id=greatest(todo_id_sequence.c.next_id,
+                                                _first_free_id(target.engines, index))))
+            db.commit()
+        finally:
+            db.close()
+    return moved
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Todo shard maintenance.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("rebalance", help="move todos to a new shard layout")
+    layout = command.add_mutually_exclusive_group(required=True)
+    layout.add_argument("--shards", type=int, help="new number of default shard files")
+    layout.add_argument("--urls", help="comma separated URLs of the new layout")
+    command.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    source_urls = shard_urls_from_env()
+    if not source_urls:
+        sys.exit("set TODO_SHARDS or TODO_SHARD_URLS to the current layout")
+    target_urls = default_urls(args.shards) if args.shards else [url.strip() for url in args.urls.split(",")]
+    source, target = ShardSet(source_urls), ShardSet(target_urls)
+    try:
+        moved = rebalance(source, target, batch_size=args.batch_size)
+    finally:
+        source.dispose()
+        target.dispose()
+    print(f"Moved {moved} todos; now export TODO_SHARD_URLS={','.join(target_urls)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# todo/startup.py
+"""Startup instrumentation and deferred initialization.
+
+Importing ``todo.main`` only builds the app. The expensive one-off work
+(``create_all`` and loading the bcrypt / JOSE backends) runs in
+:func:`initialize`, either from the lifespan hook or, with
+``TODO_LAZY_INIT=1``, on the first request. Every step is timed into
+``report`` so cold starts can be inspected::
+
+    python -m todo.startup          # import-time + startup-phase report
+"""
+import asyncio
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from starlette.concurrency import run_in_threadpool
+
+from . import archive, database, querylog, sharding
+
+logger = logging.getLogger("todo.startup")
+
+LAZY_INIT = os.getenv("TODO_LAZY_INIT") == "1"
+
+# phase name -> milliseconds, in the order the phases ran
+report: dict = {}
+
+_initialized = False
+_init_lock = threading.Lock()
+
+
+@contextmanager
+def phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        report[name] = (time.perf_counter() - started) * 1000
+
+
+def initialize() -> None:
+    """Run the one-off startup work exactly once per process."""
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        querylog.install()
+        # todo.server already prepared the schema before forking.
+        if not os.getenv("TODO_SCHEMA_MANAGED"):
+            with phase("create_all"):
+                from . import models
+                models.Base.metadata.create_all(bind=database.engine)
+                if sharding.ENABLED:
+                    sharding.shards.create_all()
+                archive.create_all()
+        with phase("crypto"):
+            from jose import jwt  # noqa: F401
+            from .routers.auth import bcrypt_context
+            bcrypt_context.handler().get_backend()
+        _initialized = True
+    logger.info("startup phases: %s",
+                ", ".join(f"{name}={ms:.1f}ms" for name, ms in report.items()))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if not LAZY_INIT:
+        await run_in_threadpool(initialize)
+    archiver = None
+    if archive.ARCHIVE_INTERVAL_SECONDS > 0:
+        archiver = asyncio.create_task(archive.run_periodically())
+    yield
+    if archiver is not None:
+        archiver.cancel()
+    database.dispose_engines()
+    archive.dispose()
+    if sharding.ENABLED:
+        sharding.shards.dispose()
+
+
+class InitializeOnFirstRequest:
+    """ASGI middleware running :func:`initialize` before the first request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not _initialized and scope["type"] == "http":
+            await run_in_threadpool(initialize)
+        await self.app(scope, receive, send)
+
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_report(module: str = "todo.main", top: int = 15):
+    """Return the ``top`` slowest imports of ``module`` in a fresh interpreter.
+
+    Each entry is ``(module, cumulative_ms)`` taken from the first two levels
+    of the ``-X importtime`` tree, i.e. ``module`` and what it imports directly.
+    """
+    env = dict(os.environ, TODO_LAZY_INIT="1")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    entries, pending = [], []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        depth, name, ms = len(match.group(2)), match.group(3), int(match.group(1)) / 1000
+        if depth == 3:
+            pending.append((name, ms))
+        elif depth == 1:
+            # Children are printed before their parent; keep only ``module``'s.
+            if name == module:
+                entries = [(name, ms)] + pending
+            pending = []
+    return sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+
+
+def main() -> None:
+    print("slowest imports of todo.main (cumulative ms):")
+    for name, ms in import_report():
+        print(f"  {ms:8.1f}  {name}")
+
+    with phase("import todo.main"):
+        import todo.main  # noqa: F401
+    initialize()
+    print("startup phases (ms):")
+    for name, ms in report.items():
+        print(f"  {ms:8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# todo/stats.py
+"""Todo counts by ``complete`` and ``priority``.
+
+By default the counts come from a ``GROUP BY`` over ``todos`` (per owner it
+uses the ``owner_id`` index). With ``TODO_STATS_COUNTERS=1`` the write
+handlers also keep ``todo_counts`` up to date in the same transaction, and
+reads come from that table instead, whatever the number of todos. Run
+``python -m todo.stats rebuild`` after turning counters on for an existing
+database.
+"""
+import os
+import sys
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .models import TodoCounts, Todos
+
+COUNTERS_ENABLED = os.getenv("TODO_STATS_COUNTERS") == "1"
+
+
+def summarize(rows) -> dict:
+    summary = {"total": 0, "complete": 0, "open": 0, "by_priority": {}}
+    for complete, priority, count in rows:
+        if not count:
+            continue
+        summary["total"] += count
+        summary["complete" if complete else "open"] += count
+        summary["by_priority"][priority] = summary["by_priority"].get(priority, 0) + count
+    summary["by_priority"] = dict(sorted(summary["by_priority"].items()))
+    return summary
+
+
+def count_rows(db, owner_id=None):
+    """``(complete, priority, count)`` rows for one owner, or everybody."""
+    if COUNTERS_ENABLED:
+        stmt = select(TodoCounts.complete, TodoCounts.priority, func.sum(TodoCounts.count))
+        if owner_id is not None:
+            stmt = stmt.where(TodoCounts.owner_id == owner_id)
+        stmt = stmt.group_by(TodoCounts.complete, TodoCounts.priority)
+    else:
+        stmt = select(Todos.complete, Todos.priority, func.count())
+        if owner_id is not None:
+            stmt = stmt.where(Todos.owner_id == owner_id)
+        stmt = stmt.group_by(Todos.complete, Todos.priority)
+    return db.execute(stmt).all()
+
+
+def user_stats(db, owner_id: int) -> dict:
+    return summarize(count_rows(db, owner_id))
+
+
+def global_stats(db) -> dict:
+    return summarize(count_rows(db))
+
+
+def record(db, owner_id: int, complete: bool, priority: int, delta: int) -> None:
+    """Adjust the materialized count; call before the write is committed."""
+    if not COUNTERS_ENABLED:
+        return
+    upsert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    # One statement, so two first writes for the same key cannot race.
+    stmt = upsert(TodoCounts).values(owner_id=owner_id, complete=bool(complete), priority=priority, count=delta)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[TodoCounts.owner_id, TodoCounts.complete, TodoCounts.priority],
+        set_={"count": TodoCounts.count + delta},
+    ))
+
+
+def rebuild_counters(db) -> None:
+    """Recompute ``todo_counts`` from ``todos`` in one transaction."""
+    db.execute(delete(TodoCounts))
+    db.execute(insert(TodoCounts).from_select(
+        ["owner_id", "complete", "priority", "count"],
+        select(Todos.owner_id, Todos.complete, Todos.priority, func.count())
+        .group_by(Todos.owner_id, Todos.complete, Todos.priority),
+    ))
+    db.commit()
+
+
+def main(argv=None) -> None:
+    from .database import SessionLocal
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv != ["rebuild"]:
+        sys.exit("usage: python -m todo.stats rebuild")
+    db = SessionLocal()
+    try:
+        rebuild_counters(db)
+    finally:
+        db.close()
+    print("todo_counts rebuilt.")
+
+
+if __name__ == "__main__":
+    main()
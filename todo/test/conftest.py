@@ -1,11 +1,20 @@
 # todo/test/test_todos.py
+import os
+import re
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from fastapi.testclient import TestClient
 import pytest
-from todo.models import Todos, Users
-from todo.routers.auth import bcrypt_context
+
+# Read at import time by todo modules, so set before the first todo import.
+# Fixtures write straight to the database, behind the response cache's back.
+os.environ.setdefault("TODO_RESPONSE_CACHE_SECONDS", "0")
+# Limits are exercised in test_ratelimit.py only; elsewhere bucket state would leak between tests.
+os.environ.setdefault("TODO_RATE_LIMIT", "off")
+
+from todo.models import Todos, Users                      # noqa: E402
+from todo.routers.auth import bcrypt_context             # noqa: E402
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Build an isolated test engine / SessionLocal
@@ -27,6 +36,7 @@ _db.Base.metadata.create_all(bind=TEST_ENGINE)           # ensure tables
 
 # Now that the database module is patched, import the rest of the app
 from todo.main import app                                # noqa: E402 noqa: F811 This imports all the routers from main.py
+from todo import querylog, usercache                     # noqa: E402
 
 
 def override_get_db():
@@ -44,6 +54,42 @@ def override_get_current_user():
 client = TestClient(app)
 
 
+# ──────────────────────────────────────────────────────────────────────────────
+# Query-plan guard: every filtered statement a test issues must use an index
+# ──────────────────────────────────────────────────────────────────────────────
+def pytest_configure(config):
+    config.addinivalue_line("markers", "allow_scan: the test may issue queries that scan a whole table")
+
+
+_FILTERED = ("SELECT", "UPDATE", "DELETE")
+_WHERE = re.compile(r"\bWHERE\b", re.IGNORECASE)
+# Tables small enough that a scan is the right plan (jobs is only swept at startup).
+SCAN_ALLOWED = {"jobs", "sqlite_sequence"}
+
+
+@pytest.fixture(autouse=True)
+def query_plan_guard(request):
+    issued = {}
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(_FILTERED) and _WHERE.search(statement):
+            issued.setdefault(statement, parameters[0] if executemany else parameters)
+
+    event.listen(TEST_ENGINE, "before_cursor_execute", collect)
+    yield
+    event.remove(TEST_ENGINE, "before_cursor_execute", collect)
+    if request.node.get_closest_marker("allow_scan"):
+        return
+    scanned = []
+    with TEST_ENGINE.connect() as connection:
+        for statement, parameters in issued.items():
+            tables = set(querylog.scans(connection.connection.dbapi_connection, statement, parameters))
+            tables -= SCAN_ALLOWED
+            if tables:
+                scanned.append(f"SCAN {', '.join(sorted(tables))}: {querylog.fingerprint(statement)}")
+    assert not scanned, "queries without a usable index:\n" + "\n".join(scanned)
+
+
 @pytest.fixture
 def test_todo():
     todo = Todos(
@@ -60,6 +106,8 @@ def test_todo():
     yield todo
     with TEST_ENGINE.connect() as connection:
         connection.execute(text("DELETE FROM todos;"))
+        # todos ids are AUTOINCREMENT; start the next test from id 1 again.
+        connection.execute(text("DELETE FROM sqlite_sequence WHERE name = 'todos';"))
         connection.commit()
 
 
@@ -81,3 +129,5 @@ def test_user():
     with TEST_ENGINE.connect() as connection:
         connection.execute(text("DELETE FROM users;"))
         connection.commit()
+    # The rows went away behind the user cache's back (and ids get reused).
+    usercache.cache.clear()
@@ -19,7 +19,7 @@ def test_admin_read_all_authenticated(test_todo):
     assert response.status_code == status.HTTP_200_OK
     assert response.json() == [{'complete': False, 'title': 'Learn to code!',
                                 'description': 'Need to learn everyday!', 'id': 1,
-                                'priority': 5, 'owner_id': 1}]
+                                'priority': 5, 'owner_id': 1, 'completed_at': None}]
 
 
 def test_admin_delete_todo(test_todo):
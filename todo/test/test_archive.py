@@ -0,0 +1,138 @@
+import fcntl
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, text
+from starlette import status
+
+from todo import archive
+from todo.models import Todos, TodosArchive
+from todo.routers import todos
+from .conftest import client, app, override_get_db, override_get_current_user, TestingSessionLocal, TEST_ENGINE
+
+app.dependency_overrides[todos.get_db] = override_get_db
+app.dependency_overrides[todos.get_current_user] = override_get_current_user
+
+
+def _add(db, complete, days_ago=None):
+    completed_at = datetime.utcnow() - timedelta(days=days_ago) if days_ago is not None else None
+    todo = Todos(title="Archive me", description="done long ago", priority=2, complete=complete,
+                 owner_id=1, completed_at=completed_at)
+    db.add(todo)
+    db.commit()
+    return todo.id
+
+
+def _clear_archive():
+    with TEST_ENGINE.connect() as connection:
+        connection.execute(text("DELETE FROM todos_archive;"))
+        connection.commit()
+
+
+def test_completing_a_todo_stamps_completed_at(test_todo):
+    request = {"title": "Learn to code!", "description": "Need to learn everyday!", "priority": 5}
+    client.put(f"/todos/todo/{test_todo.id}", json={**request, "complete": True})
+    db = TestingSessionLocal()
+    assert db.get(Todos, test_todo.id).completed_at is not None
+
+    client.put(f"/todos/todo/{test_todo.id}", json={**request, "complete": False})
+    db.expire_all()
+    assert db.get(Todos, test_todo.id).completed_at is None
+    db.close()
+
+
+def test_old_completed_todos_move_to_the_archive(test_todo):
+    db = TestingSessionLocal()
+    old = [_add(db, True, days_ago=60) for _ in range(5)]
+    recent = _add(db, True, days_ago=1)
+
+    assert archive.run(days=30, batch_size=2) == 5
+    assert archive.run(days=30) == 0
+
+    hot = {todo["id"] for todo in client.get("/todos").json()}
+    assert hot == {test_todo.id, recent}
+    everything = client.get("/todos", params={"include_archived": True}).json()
+    assert [todo["id"] for todo in everything] == sorted([test_todo.id, recent, *old])
+
+    assert client.get(f"/todos/todo/{old[0]}").status_code == status.HTTP_404_NOT_FOUND
+    response = client.get(f"/todos/todo/{old[0]}", params={"include_archived": True})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["archived_at"] is not None
+
+    assert db.scalars(select(TodosArchive.id).order_by(TodosArchive.id)).all() == old
+    db.close()
+    _clear_archive()
+
+
+def test_archived_ids_are_never_reused(test_todo):
+    db = TestingSessionLocal()
+    first = _add(db, True, days_ago=60)
+    assert archive.run(days=30) == 1
+
+    # The newest todo went to the archive; the next one must not take its id.
+    second = _add(db, True, days_ago=60)
+    assert second > first
+    assert archive.run(days=30) == 1
+
+    archived = db.execute(select(TodosArchive.id, TodosArchive.title).order_by(TodosArchive.id)).all()
+    assert [row.id for row in archived] == [first, second]
+    db.close()
+    _clear_archive()
+
+
+def test_repeated_pass_keeps_the_archived_copy(test_todo):
+    db = TestingSessionLocal()
+    todo_id = _add(db, True, days_ago=60)
+    # A pass that copied the todo but stopped before deleting it.
+    archive_db = archive.session()
+    archive.archive_batch(db, archive_db, datetime.utcnow())
+    db.add(Todos(id=todo_id, title="Archive me", description="done long ago", priority=2, complete=True,
+                 owner_id=1, completed_at=datetime.utcnow() - timedelta(days=60)))
+    db.commit()
+
+    assert archive.archive_batch(db, archive_db, datetime.utcnow()) == 1
+    assert db.scalars(select(TodosArchive.id)).all() == [todo_id]
+    assert db.get(Todos, todo_id) is None
+    archive_db.close()
+    db.close()
+    _clear_archive()
+
+
+def test_rows_changed_mid_batch_are_not_archived(test_todo, monkeypatch):
+    db = TestingSessionLocal()
+    reopened, gone, archived = (_add(db, True, days_ago=60) for _ in range(3))
+    recorded, published = [], []
+    monkeypatch.setattr(archive.stats, "record", lambda db, owner_id, complete, priority, delta:
+                        recorded.append(delta))
+    monkeypatch.setattr(archive.changes, "record", lambda db, owner_id, op, todo_id: published.append(todo_id))
+
+    # Between the select and the delete: the user reopens one todo, another
+    # pass archives a second one.
+    archive_db = archive.session()
+    commit = archive_db.commit
+
+    def commit_then_race():
+        commit()
+        archive_db.commit = commit
+        db.get(Todos, reopened).complete = False
+        db.delete(db.get(Todos, gone))
+        db.flush()
+    archive_db.commit = commit_then_race
+
+    assert archive.archive_batch(db, archive_db, datetime.utcnow()) == 3
+    assert published == [archived]
+    assert recorded == [-1]
+    assert db.get(Todos, reopened) is not None
+    assert sorted(db.scalars(select(TodosArchive.id)).all()) == [gone, archived]
+    archive_db.close()
+    db.close()
+    _clear_archive()
+
+
+def test_only_one_process_runs_a_pass(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "run", lambda **kwargs: 0)
+    lock_path = str(tmp_path / "archive.lock")
+    assert archive.run_exclusive(lock_path) == 0
+    with open(lock_path, "a") as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        # flock locks are per open file, so a second open stands in for another process.
+        assert archive.run_exclusive(lock_path) is None
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from fastapi import status
+
+from todo import changes
+from todo.changes import ChangeBus
+from todo.models import TodoChanges
+from .conftest import override_get_db, override_get_current_user, client, app, TestingSessionLocal, TEST_ENGINE
+from todo.routers.todos import get_db, get_current_user
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+@pytest.fixture
+def change_log(tmp_path, monkeypatch):
+    # The pollers read from their own threads, which the single shared test
+    # connection cannot serve, so buses with subscribers get a database of their own.
+    engine = create_engine(f"sqlite:///{tmp_path / 'changes.db'}", connect_args={"check_same_thread": False})
+    TodoChanges.__table__.create(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(changes, "bus", ChangeBus(session_factory=factory, poll_seconds=0.01))
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def todo_log(monkeypatch):
+    """A fresh bus over the test database, where the write handlers record changes."""
+    monkeypatch.setattr(changes, "bus", ChangeBus())
+    yield changes.bus
+    with TEST_ENGINE.connect() as connection:
+        connection.execute(text("DELETE FROM todo_changes;"))
+        connection.commit()
+
+
+TODO = {"title": "Watch me", "description": "Published change", "priority": 3, "complete": False}
+
+
+def test_poll_returns_deltas_after_cursor(test_todo, todo_log):
+    cursor = client.get("/todos/changes").json()["cursor"]
+
+    client.post("/todos/todo", json=TODO)
+    client.put(f"/todos/todo/{test_todo.id}", json={**TODO, "complete": True})
+    client.delete(f"/todos/todo/{test_todo.id}")
+
+    response = client.get("/todos/changes", params={"since": cursor, "wait": 0})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["reset"] is False
+    assert [change["op"] for change in data["changes"]] == ["created", "updated", "deleted"]
+    assert data["changes"][0]["todo"]["title"] == "Watch me"
+    assert data["changes"][1]["todo"]["complete"] is True
+
+    again = client.get("/todos/changes", params={"since": data["cursor"], "wait": 0}).json()
+    assert again["changes"] == []
+    assert again["cursor"] == data["cursor"]
+
+
+def test_poll_with_unknown_cursor_resets(todo_log):
+    data = client.get("/todos/changes", params={"since": "deadbeef-12", "wait": 0}).json()
+    assert data["reset"] is True
+    assert data["cursor"] == str(todo_log.latest(1))
+    # A cursor past the end of the log is from another log, e.g. before a rebalance.
+    assert client.get("/todos/changes", params={"since": "999999", "wait": 0}).json()["reset"] is True
+
+
+def test_change_is_stored_only_with_its_write(test_todo, todo_log):
+    cursor = client.get("/todos/changes").json()["cursor"]
+    db = TestingSessionLocal()
+    changes.record(db, 1, "deleted", test_todo.id)
+    db.rollback()
+    db.close()
+    assert client.put("/todos/todo/999", json=TODO).status_code == status.HTTP_404_NOT_FOUND
+    assert todo_log.since(1, int(cursor)) == ([], True)
+
+
+def test_pruned_history_is_incomplete(change_log):
+    bus = ChangeBus(change_log, history_size=2)
+    seqs = [bus.publish(7, "created", todo_id)["seq"] for todo_id in range(3)]
+    bus.prune()
+
+    _, complete = bus.since(7, seqs[0] - 1)
+    assert not complete
+    pending, complete = bus.since(7, seqs[0])
+    assert complete
+    assert [change["id"] for change in pending] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_changes_reach_subscribers_of_other_workers(change_log):
+    # Two buses over one database stand in for two worker processes.
+    here, there = ChangeBus(change_log, poll_seconds=0.01), ChangeBus(change_log, poll_seconds=0.01)
+    subscription = there.subscribe(9)
+    try:
+        published = here.publish(9, "created", 3, {"id": 3})
+        received = await subscription.get(5)
+        assert received == published
+        # Cursors mean the same thing on every worker.
+        pending, complete = there.since(9, published["seq"] - 1)
+        assert complete and pending == [published]
+    finally:
+        subscription.close()
+
+
+class FakeRequest:
+    async def is_disconnected(self):
+        return False
+
+
+@pytest.mark.asyncio
+async def test_stream_resumes_and_follows_live_changes(change_log):
+    bus = changes.bus
+    cursor = bus.cursor(bus.latest(42))
+    bus.publish(42, "deleted", 1)
+    events = changes.stream(FakeRequest(), 42, cursor, heartbeat=0.01)
+
+    backlog = await anext(events)
+    assert "event: deleted" in backlog
+
+    assert await anext(events) == ": keep-alive\n\n"
+    bus.publish(42, "created", 2, {"id": 2})
+    live = await anext(events)
+    while live == ": keep-alive\n\n":
+        live = await anext(events)
+    assert "event: created" in live
+    assert live.startswith(f"id: {bus.cursor(bus.latest(42))}")
+    await events.aclose()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_gets_reset(change_log):
+    bus = ChangeBus(change_log, buffer_size=1, poll_seconds=0.01)
+    subscription = bus.subscribe(5)
+    bus.publish(5, "created", 1)
+    bus.publish(5, "created", 2)
+    await asyncio.sleep(0.2)
+    assert await subscription.get(1) is not None
+    assert subscription.overflowed
+    subscription.close()
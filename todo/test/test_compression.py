@@ -0,0 +1,98 @@
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from todo.compression import CompressionMiddleware, negotiate
+
+calls = {"items": 0}
+items = [{"id": i, "title": f"Item number {i}"} for i in range(100)]
+
+mini = FastAPI()
+mini.add_middleware(CompressionMiddleware, minimum_size=200, cache_paths=("/items",), cache_ttl=60)
+
+
+@mini.get("/items")
+async def read_items():
+    calls["items"] += 1
+    return items
+
+
+@mini.head("/items")
+async def head_items():
+    return Response(headers={"content-length": "3481", "content-type": "application/json"})
+
+
+@mini.post("/items")
+async def add_item():
+    items.append({"id": len(items), "title": "Added"})
+
+
+@mini.get("/small")
+async def read_small():
+    return {"ok": True}
+
+
+@mini.get("/stream")
+async def read_stream():
+    async def chunks():
+        for i in range(3):
+            yield f"data: {i}\n\n" * 100
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+mini_client = TestClient(mini)
+
+
+def test_negotiate_honours_q_values():
+    available = {"gzip": None, "br": None}
+    assert negotiate("gzip, br", available) == "br"
+    assert negotiate("gzip;q=1.0, br;q=0.5", available) == "gzip"
+    assert negotiate("br;q=0, gzip;q=0", available) is None
+    assert negotiate("*", available) == "br"
+    assert negotiate("", available) is None
+
+
+def test_large_bodies_are_compressed_small_ones_are_not():
+    response = mini_client.get("/items", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json()[0]["title"] == "Item number 0"
+
+    response = mini_client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"ok": True}
+
+
+def test_identity_when_client_accepts_no_encoding():
+    response = mini_client.get("/small", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+
+def test_cache_hits_skip_the_endpoint_until_a_write():
+    mini_client.post("/items")
+    calls["items"] = 0
+    first = mini_client.get("/items", headers={"Accept-Encoding": "gzip"})
+    second = mini_client.get("/items", headers={"Accept-Encoding": "gzip"})
+    assert calls["items"] == 1
+    assert second.content == first.content
+
+    # Another client with other credentials gets its own entry.
+    mini_client.get("/items", headers={"Authorization": "Bearer other"})
+    assert calls["items"] == 2
+
+    mini_client.post("/items")
+    assert len(mini_client.get("/items").json()) == len(items)
+    assert calls["items"] == 3
+
+
+def test_streaming_responses_pass_through():
+    with mini_client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        body = b"".join(response.iter_raw())
+    assert "content-encoding" not in response.headers
+    assert body.count(b"data:") == 300
+
+
+def test_head_keeps_the_get_content_length():
+    response = mini_client.head("/items", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-length"] == "3481"
+    assert "content-encoding" not in response.headers
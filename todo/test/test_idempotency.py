@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import uuid
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from starlette import status
+
+from todo.idempotency import IdempotencyMiddleware, IdempotencyStore
+from todo.models import Todos, Users
+from todo.routers import auth, todos
+from .conftest import client, app, override_get_db, override_get_current_user, TestingSessionLocal
+
+app.dependency_overrides[todos.get_db] = override_get_db
+app.dependency_overrides[todos.get_current_user] = override_get_current_user
+app.dependency_overrides[auth.get_db] = override_get_db
+
+todo_request = {"title": "Retried todo", "description": "Sent twice", "priority": 3, "complete": False}
+
+
+def _count(model):
+    db = TestingSessionLocal()
+    try:
+        return db.scalar(select(func.count()).select_from(model))
+    finally:
+        db.close()
+
+
+def test_retried_create_todo_runs_once(test_todo):
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    first = client.post("/todos/todo", json=todo_request, headers=headers)
+    retry = client.post("/todos/todo", json=dict(reversed(todo_request.items())), headers=headers)
+    assert first.status_code == retry.status_code == status.HTTP_201_CREATED
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert _count(Todos) == 2
+
+    # Another key, or no key at all, is another request.
+    client.post("/todos/todo", json=todo_request, headers={"Idempotency-Key": str(uuid.uuid4())})
+    client.post("/todos/todo", json=todo_request)
+    assert _count(Todos) == 4
+
+
+def test_key_reused_with_another_body_is_rejected(test_todo):
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    client.post("/todos/todo", json=todo_request, headers=headers)
+    response = client.post("/todos/todo", json={**todo_request, "priority": 4}, headers=headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert _count(Todos) == 2
+
+
+def test_failed_requests_are_not_stored(test_todo):
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    invalid = {**todo_request, "priority": 0}
+    assert client.post("/todos/todo", json=invalid, headers=headers).status_code == 422
+    assert client.post("/todos/todo", json=invalid, headers=headers).status_code == 422
+    assert client.post("/todos/todo", json=todo_request, headers={"Idempotency-Key": ""}).status_code == 400
+
+
+def test_retried_create_user_hashes_once(test_user, monkeypatch):
+    hashes = []
+    real_hash = auth.bcrypt_context.hash
+    monkeypatch.setattr(auth.bcrypt_context, "hash", lambda secret: hashes.append(secret) or real_hash(secret))
+    request = {"username": "retrier", "email": "retrier@email.com", "first_name": "Re", "last_name": "Try",
+               "password": "secret", "role": "user", "phone_number": "3333333333"}
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    for _ in range(3):
+        assert client.post("/auth/", json=request, headers=headers).status_code == status.HTTP_201_CREATED
+    assert len(hashes) == 1
+    assert _count(Users) == 2
+
+
+def test_concurrent_duplicates_wait_for_the_original():
+    calls = []
+    release = threading.Event()
+    mini = FastAPI()
+    mini.add_middleware(IdempotencyMiddleware, routes=[("POST", "/items")])
+
+    @mini.post("/items", status_code=201)
+    def create_item():
+        calls.append(1)
+        release.wait(10)
+        return {"id": len(calls)}
+
+    mini_client = TestClient(mini)
+    responses = []
+
+    def post():
+        responses.append(mini_client.post("/items", json={"name": "x"}, headers={"Idempotency-Key": "k"}))
+
+    threads = [threading.Thread(target=post) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while not calls:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert [response.json() for response in responses] == [{"id": 1}] * 3
+    assert sum(response.headers.get("idempotent-replayed") == "true" for response in responses) == 2
+
+
+def test_anonymous_keys_are_scoped_by_client():
+    calls = []
+    mini = FastAPI()
+    mini.add_middleware(IdempotencyMiddleware, routes=[("POST", "/items")])
+
+    @mini.post("/items", status_code=201)
+    def create_item():
+        calls.append(1)
+        return {"id": len(calls)}
+
+    headers = {"Idempotency-Key": "k"}
+    first = TestClient(mini, client=("10.0.0.1", 1000))
+    assert first.post("/items", json={}, headers=headers).json() == {"id": 1}
+    assert first.post("/items", json={}, headers=headers).json() == {"id": 1}
+    assert TestClient(mini, client=("10.0.0.2", 1000)).post("/items", json={}, headers=headers).json() == {"id": 2}
+
+
+def test_waiting_duplicate_times_out():
+    entry, _ = IdempotencyStore().claim("k", "f")
+
+    async def wait():
+        await entry.wait(0.05)
+        return entry.response
+
+    assert asyncio.run(wait()) is None
+    assert not entry._waiters
+
+
+def test_store_ttl_and_bound():
+    now = [0.0]
+    store = IdempotencyStore(max_entries=2, ttl=10, clock=lambda: now[0])
+    entry, owner = store.claim("a", "f")
+    assert owner
+    store.finish("a", entry, (201, [], b"{}"))
+    assert store.claim("a", "f") == (entry, False)
+
+    now[0] = 11
+    assert store.claim("a", "f")[1]  # expired, runs again
+    store.claim("b", "f")
+    store.claim("c", "f")
+    assert len(store) == 2
@@ -0,0 +1,193 @@
+import json
+import subprocess
+import sys
+import threading
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import text
+from starlette import status
+
+from todo import jobs
+from todo.models import Jobs, Todos
+from todo.routers import admin
+from .conftest import client, app, override_get_db, override_get_current_user, TestingSessionLocal, TEST_ENGINE
+
+app.dependency_overrides[admin.get_db] = override_get_db
+app.dependency_overrides[admin.get_current_user] = override_get_current_user
+
+
+@pytest.fixture(autouse=True)
+def clean_jobs():
+    yield
+    with TEST_ENGINE.connect() as connection:
+        connection.execute(text("DELETE FROM jobs;"))
+        connection.commit()
+
+
+def _add_todos(count, owner_id=1, complete=False):
+    db = TestingSessionLocal()
+    db.add_all(Todos(title=f"Todo {i}", description="bulk", priority=1, complete=complete, owner_id=owner_id)
+               for i in range(count))
+    db.commit()
+    db.close()
+
+
+def _wait(job_id):
+    jobs.runner.wait(job_id, timeout=10)
+    return client.get(f"/admin/jobs/{job_id}").json()
+
+
+def test_delete_todos_job(test_todo):
+    _add_todos(3, owner_id=2)
+    response = client.post("/admin/jobs/delete-todos", json={"owner_id": 2})
+    assert response.status_code == status.HTTP_202_ACCEPTED
+
+    job = _wait(response.json()["id"])
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"deleted": 3}
+    assert job["progress"] == job["total"] == 3
+    assert [todo["id"] for todo in client.get("/admin/todo").json()] == [test_todo.id]
+
+
+def test_export_job(test_todo, tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "EXPORT_DIR", str(tmp_path))
+    job = _wait(client.post("/admin/jobs/export", json={}).json()["id"])
+    assert job["status"] == "succeeded"
+    assert job["result"]["rows"] == 1
+
+    response = client.get(f"/admin/jobs/{job['id']}/download")
+    assert response.status_code == status.HTTP_200_OK
+    assert json.loads(response.text.splitlines()[0])["title"] == "Learn to code!"
+
+
+def test_failed_job_records_the_error(monkeypatch):
+    def broken(context):
+        raise RuntimeError("disk full")
+    monkeypatch.setitem(jobs.HANDLERS, "reindex", broken)
+
+    job = _wait(client.post("/admin/jobs/reindex").json()["id"])
+    assert job["status"] == "failed"
+    assert job["error"] == "RuntimeError: disk full"
+    assert client.get("/admin/jobs/999").status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_kind_limit_queues_and_cancel(monkeypatch):
+    release = threading.Event()
+
+    def slow(context):
+        release.wait(10)
+        return {"done": True}
+    monkeypatch.setitem(jobs.HANDLERS, "reindex", slow)
+
+    first = client.post("/admin/jobs/reindex").json()["id"]
+    second = client.post("/admin/jobs/reindex").json()["id"]
+    # reindex is limited to one at a time, so the second one waits its turn.
+    assert client.get(f"/admin/jobs/{second}").json()["status"] == "queued"
+
+    response = client.post(f"/admin/jobs/{second}/cancel")
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.json()["status"] == "cancelled"
+
+    release.set()
+    assert _wait(first)["status"] == "succeeded"
+    assert client.post(f"/admin/jobs/{first}/cancel").status_code == status.HTTP_409_CONFLICT
+
+
+def test_running_job_stops_at_its_next_check(monkeypatch):
+    started = threading.Event()
+
+    def loop(context):
+        started.set()
+        while True:
+            context.check_cancelled()
+    monkeypatch.setitem(jobs.HANDLERS, "reindex", loop)
+
+    job_id = client.post("/admin/jobs/reindex").json()["id"]
+    assert started.wait(5)
+    client.post(f"/admin/jobs/{job_id}/cancel")
+    assert _wait(job_id)["status"] == "cancelled"
+
+
+def _job(owner, heartbeat_age, status="running"):
+    db = TestingSessionLocal()
+    job = Jobs(kind="reindex", status=status, progress=0, cancel_requested=False, owner=owner,
+               heartbeat_at=jobs._now() - timedelta(seconds=heartbeat_age))
+    db.add(job)
+    db.commit()
+    job_id = job.id
+    db.close()
+    return job_id
+
+
+def _statuses():
+    db = TestingSessionLocal()
+    try:
+        return dict(db.query(Jobs.id, Jobs.status).all())
+    finally:
+        db.close()
+
+
+def test_fail_interrupted_spares_live_owners():
+    dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                          capture_output=True, text=True).stdout.strip()
+    live = _job(jobs.process_owner(), 1)
+    dead_here = _job(jobs.process_owner(int(dead)), 1)
+    remote = _job("elsewhere:1", 1)
+    remote_stale = _job("elsewhere:2", jobs.HEARTBEAT_TIMEOUT + 60, status="queued")
+    finished = _job("elsewhere:3", jobs.HEARTBEAT_TIMEOUT + 60, status="succeeded")
+
+    db = TestingSessionLocal()
+    try:
+        assert jobs.fail_interrupted(db) == 2
+    finally:
+        db.close()
+    assert _statuses() == {live: "running", dead_here: "failed", remote: "running",
+                           remote_stale: "failed", finished: "succeeded"}
+
+
+def test_fail_interrupted_for_one_owner():
+    gone = _job("host:41", 1)
+    sibling = _job("host:42", 1)
+    db = TestingSessionLocal()
+    try:
+        assert jobs.fail_interrupted(db, owner="host:41") == 1
+    finally:
+        db.close()
+    assert _statuses() == {gone: "failed", sibling: "running"}
+
+
+def test_jobs_record_their_owner_and_beat(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def parked(context):
+        started.set()
+        release.wait(10)
+    monkeypatch.setitem(jobs.HANDLERS, "reindex", parked)
+
+    job_id = client.post("/admin/jobs/reindex").json()["id"]
+    # The job thread shares the test connection; touch the row only while it is parked.
+    assert started.wait(5)
+    with TEST_ENGINE.connect() as connection:
+        connection.execute(text("UPDATE jobs SET heartbeat_at = NULL"))
+        connection.commit()
+    jobs.runner.beat()
+    db = TestingSessionLocal()
+    try:
+        job = db.get(Jobs, job_id)
+        assert job.owner == jobs.process_owner()
+        assert job.heartbeat_at is not None
+    finally:
+        db.close()
+    release.set()
+    assert _wait(job_id)["status"] == "succeeded"
+
+
+def test_failed_queued_job_does_not_start(monkeypatch):
+    calls = []
+    monkeypatch.setitem(jobs.HANDLERS, "reindex", lambda context: calls.append(1))
+    job_id = _job(jobs.process_owner(), 1, status="failed")
+    jobs.runner._running["reindex"] += 1  # as _dispatch would
+    jobs.runner._run(job_id, "reindex", {})
+    assert calls == []
+    assert _statuses() == {job_id: "failed"}
@@ -0,0 +1,68 @@
+import pytest
+from sqlalchemy import column, create_engine, func, inspect, insert, select, text
+
+from todo import migrate
+from todo.database import Base
+from todo.models import Todos
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+    Base.metadata.create_all(bind=engine, tables=[Todos.__table__])
+    with engine.begin() as connection:
+        connection.execute(insert(Todos), [
+            {"title": f"Todo {i}", "description": "backfill", "priority": 1, "complete": False, "owner_id": 1}
+            for i in range(50)
+        ])
+        connection.execute(text("ALTER TABLE todos ADD COLUMN slug VARCHAR"))
+    yield engine
+    engine.dispose()
+
+
+def _missing(engine):
+    with engine.connect() as connection:
+        return connection.scalar(text("SELECT count(*) FROM todos WHERE slug IS NULL"))
+
+
+def test_backfill_resumes_from_its_checkpoint(engine):
+    batches = []
+
+    def flaky(connection, keys):
+        if len(batches) == 3:
+            raise RuntimeError("interrupted")
+        batches.append(keys)
+        connection.execute(text("UPDATE todos SET slug = lower(title) WHERE id IN (%s)"
+                                % ",".join(map(str, keys))))
+
+    with pytest.raises(RuntimeError):
+        migrate.backfill(engine, "todos.slug", "todos", apply=flaky, batch_size=7, progress=None)
+    state = migrate.checkpoint(engine, "todos.slug")
+    assert (state["rows_done"], state["last_key"], state["finished"]) == (21, 21, False)
+    assert _missing(engine) == 29
+
+    updated = migrate.backfill(engine, "todos.slug", "todos", values={"slug": func.lower(column("title"))},
+                               batch_size=7, progress=None)
+    assert updated == 29
+    assert _missing(engine) == 0
+    assert migrate.checkpoint(engine, "todos.slug")["finished"]
+    assert migrate.backfill(engine, "todos.slug", "todos", values={"slug": "x"}, progress=None) == 0
+
+
+def test_backfill_only_visits_matching_rows(engine):
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE todos SET slug = 'kept' WHERE id <= 10"))
+    messages = []
+    updated = migrate.backfill(engine, "todos.slug", "todos", values={"slug": "filled"},
+                               where=column("slug").is_(None), batch_size=15, progress=messages.append)
+    assert updated == 40
+    assert len(messages) == 3
+    with engine.connect() as connection:
+        assert connection.scalar(select(func.count()).where(text("slug = 'kept'"))
+                                 .select_from(Todos.__table__)) == 10
+
+
+def test_create_index_outside_the_migration_transaction(engine):
+    migrate.create_index(engine, "ix_todos_slug", "todos", ["slug"], progress=None)
+    migrate.create_index(engine, "ix_todos_slug", "todos", ["slug"], progress=None)
+    assert "ix_todos_slug" in {index["name"] for index in inspect(engine).get_indexes("todos")}
@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette import status
+
+from todo import queries
+from todo.database import Base
+from todo.models import Todos
+from todo.routers import todos
+from .conftest import client, app, override_get_db, override_get_current_user, TestingSessionLocal
+
+app.dependency_overrides[todos.get_db] = override_get_db
+app.dependency_overrides[todos.get_current_user] = override_get_current_user
+
+
+def _add(db, title, priority, complete=False, owner_id=1):
+    todo = Todos(title=title, description="queued", priority=priority, complete=complete, owner_id=owner_id)
+    db.add(todo)
+    db.commit()
+    return todo.id
+
+
+def test_next_orders_open_todos_by_priority_then_id(test_todo):
+    db = TestingSessionLocal()
+    urgent = _add(db, "Urgent", 1)
+    also_urgent = _add(db, "Also urgent", 1)
+    _add(db, "Done", 1, complete=True)
+    _add(db, "Not mine", 1, owner_id=2)
+    middle = _add(db, "Middle", 3)
+    db.close()
+
+    response = client.get("/todos/next", params={"n": 3})
+    assert response.status_code == status.HTTP_200_OK
+    assert [todo["id"] for todo in response.json()] == [urgent, also_urgent, middle]
+    assert [todo["id"] for todo in client.get("/todos/next").json()][-1] == test_todo.id
+
+
+def test_next_is_an_index_only_range_scan():
+    db = TestingSessionLocal()
+    sql = str(queries._next_todo_ids.compile(db.get_bind()))
+    plan = " ".join(row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", (1, 5, 0)))
+    db.close()
+    assert "USING COVERING INDEX ix_todos_owner_next (owner_id=? AND complete=?)" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_complete_next_endpoint(test_todo):
+    db = TestingSessionLocal()
+    urgent = _add(db, "Urgent", 1)
+    db.close()
+
+    response = client.post("/todos/next/complete")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["id"] == urgent
+    assert response.json()["complete"] is True
+    assert client.post("/todos/next/complete").json()["id"] == test_todo.id
+    assert client.post("/todos/next/complete").status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_concurrent_complete_next_hands_out_each_todo_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'next.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[Todos.__table__])
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        ids = [_add(db, f"Job {i}", i % 3 + 1) for i in range(20)]
+
+    def claim(_):
+        with Session() as db:
+            row = queries.complete_next(db, 1)
+            db.commit()
+            return row["id"] if row is not None else None
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        claimed = list(pool.map(claim, range(25)))
+    assert sorted(todo_id for todo_id in claimed if todo_id is not None) == ids
+    assert claimed.count(None) == 5
+    engine.dispose()
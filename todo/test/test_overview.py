@@ -0,0 +1,85 @@
+from sqlalchemy import event
+from starlette import status
+
+from todo.models import Todos, Users
+from todo.routers import admin
+from .conftest import client, app, override_get_db, override_get_current_user, TestingSessionLocal, TEST_ENGINE
+
+app.dependency_overrides[admin.get_db] = override_get_db
+app.dependency_overrides[admin.get_current_user] = override_get_current_user
+
+
+def _add_users(test_user):
+    """test_user plus three more; (open, complete, max priority) per user id."""
+    db = TestingSessionLocal()
+    users = [Users(username=f"user{i}", email=f"user{i}@email.com", hashed_password="x", role="user")
+             for i in range(3)]
+    db.add_all(users)
+    db.flush()
+    todos = {
+        test_user.id: [(False, 2), (True, 4)],
+        users[0].id: [(False, 1), (False, 3), (False, 5)],
+        users[1].id: [(True, 1)],
+        users[2].id: [],
+    }
+    db.add_all(Todos(title=f"Todo {owner_id}-{i}", description="overview", priority=priority,
+                     complete=complete, owner_id=owner_id)
+               for owner_id, rows in todos.items() for i, (complete, priority) in enumerate(rows))
+    db.commit()
+    ids = [test_user.id] + [user.id for user in users]
+    db.close()
+    return ids
+
+
+def _walk(**params):
+    pages, cursor = [], None
+    while True:
+        response = client.get("/admin/users/overview", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        pages.append(body["users"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_aggregates_per_user(test_user, test_todo):
+    me, busy, done, idle = _add_users(test_user)
+    users = {user["id"]: user for user in client.get("/admin/users/overview").json()["users"]}
+    assert [(users[i]["open_todos"], users[i]["complete_todos"], users[i]["max_priority"])
+            for i in (me, busy, done, idle)] == [(2, 1, 5), (3, 0, 5), (0, 1, 1), (0, 0, None)]
+    assert users[me]["username"] == "codingwithrobytest"
+    assert "hashed_password" not in users[me]
+
+
+def test_keyset_pages_sorted_by_aggregate(test_user, test_todo):
+    me, busy, done, idle = _add_users(test_user)
+    pages = _walk(sort="open_todos", order="desc", limit=1)
+    assert [[user["id"] for user in page] for page in pages] == [[busy], [me], [idle], [done]]
+
+    pages = _walk(sort="complete_todos", limit=3)
+    assert [len(page) for page in pages] == [3, 1]
+    assert [user["id"] for page in pages for user in page] == [busy, idle, me, done]
+
+    pages = _walk(sort="max_priority", order="desc", limit=2)
+    assert [user["id"] for page in pages for user in page] == [busy, me, done, idle]
+
+
+def test_open_todos_are_loaded_in_one_extra_query(test_user, test_todo):
+    me, busy, done, idle = _add_users(test_user)
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(TEST_ENGINE, "before_cursor_execute", listener)
+    try:
+        users = client.get("/admin/users/overview", params={"include_todos": True}).json()["users"]
+    finally:
+        event.remove(TEST_ENGINE, "before_cursor_execute", listener)
+
+    todos = {user["id"]: [todo["priority"] for todo in user["todos"]] for user in users}
+    assert todos == {me: [5, 2], busy: [1, 3, 5], done: [], idle: []}
+    assert len([statement for statement in statements if "FROM todos" in statement]) == 1
+
+
+def test_invalid_cursor_and_sort():
+    assert client.get("/admin/users/overview", params={"cursor": "nope"}).status_code == 400
+    assert client.get("/admin/users/overview", params={"sort": "hashed_password"}).status_code == 422
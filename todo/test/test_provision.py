@@ -0,0 +1,57 @@
+import json
+
+import pytest
+from sqlalchemy import text
+
+from todo.models import Users
+from todo.provision import provision_users, read_users, bcrypt_context
+from .conftest import TEST_ENGINE, TestingSessionLocal
+
+
+@pytest.fixture
+def cleanup_users():
+    yield
+    with TEST_ENGINE.connect() as connection:
+        connection.execute(text("DELETE FROM users;"))
+        connection.commit()
+
+
+def test_provision_users_from_csv(tmp_path, cleanup_users):
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "username,email,password,first_name,last_name,role\n"
+        "alice,alice@example.com,alicepass,Alice,A,admin\n"
+        "bob,bob@example.com,bobpass,Bob,B,\n"
+    )
+    progress = []
+
+    created = provision_users(read_users(str(path)), bind=TEST_ENGINE, workers=0,
+                              chunk_size=1, progress=lambda n, _: progress.append(n))
+    assert created == 2
+    assert progress == [1, 2]
+
+    db = TestingSessionLocal()
+    users = {user.username: user for user in db.query(Users).all()}
+    assert users['alice'].role == 'admin'
+    assert users['bob'].role == 'user'
+    assert users['bob'].is_active is True
+    assert bcrypt_context.verify('bobpass', users['bob'].hashed_password)
+
+
+def test_provision_users_from_jsonl(tmp_path, cleanup_users):
+    path = tmp_path / "users.jsonl"
+    path.write_text(json.dumps({"username": "carol", "email": "carol@example.com",
+                                "password": "carolpass", "phone_number": "555"}) + "\n\n")
+
+    assert provision_users(read_users(str(path)), bind=TEST_ENGINE, workers=0) == 1
+
+    db = TestingSessionLocal()
+    assert db.query(Users).filter(Users.username == 'carol').first().phone_number == '555'
+
+
+def test_read_users_missing_password(tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text("username,email,password\ndave,dave@example.com,\n")
+
+    with pytest.raises(ValueError, match="line 2: missing password"):
+        list(read_users(str(path)))
@@ -0,0 +1,22 @@
+from todo import queries
+from .conftest import TestingSessionLocal
+
+
+def test_prebuilt_queries_are_owner_scoped(test_todo):
+    db = TestingSessionLocal()
+    assert queries.todo_for_owner(db, test_todo.id, 1).title == "Learn to code!"
+    assert queries.todo_for_owner(db, test_todo.id, 2) is None
+    assert [todo.id for todo in queries.todos_for_owner(db, 1)] == [test_todo.id]
+    assert queries.todos_for_owner(db, 2) == []
+
+
+def test_repeated_queries_hit_the_compiled_cache(test_todo):
+    db = TestingSessionLocal()
+    queries.todo_by_id(db, test_todo.id)
+    queries.reset_statement_cache_stats()
+
+    for _ in range(3):
+        queries.todo_by_id(db, test_todo.id)
+    stats = queries.statement_cache_stats()
+    assert stats["cache_hit"] == 3
+    assert stats["hit_rate"] == 1.0
@@ -0,0 +1,67 @@
+import logging
+
+import pytest
+from sqlalchemy import create_engine, text
+from starlette import status
+
+from todo import querylog
+from todo.querylog import QueryLog, fingerprint
+from todo.routers import admin
+from .conftest import client, app, override_get_current_user, TEST_ENGINE
+
+app.dependency_overrides[admin.get_current_user] = override_get_current_user
+
+
+def test_fingerprint_replaces_literals_and_parameters():
+    assert fingerprint("SELECT * FROM todos WHERE id = 5 AND title = 'it''s'") == \
+        "SELECT * FROM todos WHERE id = ? AND title = ?"
+    assert fingerprint("SELECT *\n  FROM todos WHERE owner_id IN (?, ?, ?)") == \
+        "SELECT * FROM todos WHERE owner_id IN (...)"
+    assert fingerprint("SELECT * FROM todos WHERE owner_id = :owner_id LIMIT %(n)s") == \
+        "SELECT * FROM todos WHERE owner_id = ? LIMIT ?"
+    assert fingerprint("SELECT t1.id FROM todos AS t1") == "SELECT t1.id FROM todos AS t1"
+
+
+def test_aggregates_per_fingerprint(caplog):
+    log = QueryLog(slow_ms=50)
+    log.record("SELECT * FROM todos WHERE id = 1", (), 10.0)
+    log.record("SELECT * FROM todos WHERE id = 2", (), 30.0)
+    with caplog.at_level(logging.WARNING, logger="todo.querylog"):
+        log.record("SELECT * FROM users WHERE id = 1", (), 60.0)
+    assert "slow query (60.0 ms)" in caplog.text
+
+    first, second = log.top()
+    assert first == {"fingerprint": "SELECT * FROM users WHERE id = ?", "calls": 1, "total_ms": 60.0,
+                     "mean_ms": 60.0, "max_ms": 60.0, "slow": 1}
+    assert (second["calls"], second["mean_ms"], second["max_ms"], second["slow"]) == (2, 20.0, 30.0, 0)
+    assert log.top(sort="calls")[0] == second
+
+
+def test_installed_engines_are_timed(monkeypatch):
+    monkeypatch.setattr(querylog, "log", QueryLog())
+    engine = create_engine("sqlite://")
+    querylog.install(engine)
+    querylog.install(engine)  # idempotent
+    with engine.connect() as connection:
+        for value in range(3):
+            connection.execute(text(f"SELECT {value}"))
+    assert querylog.log.top()[0]["fingerprint"] == "SELECT ?"
+    assert querylog.log.top()[0]["calls"] == 3
+
+
+@pytest.mark.allow_scan
+def test_scans_reads_the_query_plan():
+    with TEST_ENGINE.connect() as connection:
+        dbapi_connection = connection.connection.dbapi_connection
+        assert querylog.scans(dbapi_connection, "SELECT * FROM todos WHERE owner_id = ?", (1,)) == []
+        assert querylog.scans(dbapi_connection, "SELECT * FROM todos WHERE title = ?", ("x",)) == ["todos"]
+        assert querylog.scans(dbapi_connection, "SELECT rowid FROM todos_fts WHERE todos_fts MATCH ?",
+                              ("code",)) == []
+
+
+def test_admin_endpoint(test_user):
+    client.get("/admin/users")
+    response = client.get("/admin/queries", params={"sort": "calls", "limit": 5})
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()["queries"]) <= 5
+    assert client.get("/admin/queries", params={"sort": "nope"}).status_code == 422
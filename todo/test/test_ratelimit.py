@@ -0,0 +1,79 @@
+import pytest
+from fastapi import status
+
+from todo import ratelimit
+from todo.ratelimit import Limit, MemoryBucketStore
+from .conftest import client, app, override_get_db
+from ..routers.auth import get_db
+
+app.dependency_overrides[get_db] = override_get_db
+
+
+@pytest.fixture(autouse=True)
+def rate_limiting_on(monkeypatch):
+    monkeypatch.setattr(ratelimit, "ENABLED", True)
+
+
+@pytest.fixture
+def tight_auth_limit(monkeypatch):
+    monkeypatch.setenv("TODO_RATE_LIMIT_AUTH", f"0.01/{2 * ratelimit.BCRYPT_COST}")
+    ratelimit.store.clear()
+    yield
+    ratelimit.store.clear()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_refills_over_time():
+    clock = FakeClock()
+    store = MemoryBucketStore(clock=clock)
+    limit = Limit(rate=1.0, burst=3.0)
+
+    assert store.consume("k", 3, limit) == 0
+    assert store.consume("k", 2, limit) == pytest.approx(2.0)
+    clock.now = 2.0
+    assert store.consume("k", 2, limit) == 0
+
+
+def test_full_buckets_are_evicted():
+    clock = FakeClock()
+    store = MemoryBucketStore(evict_interval=10, clock=clock)
+    limit = Limit(rate=1.0, burst=5.0)
+    store.consume("a", 5, limit)
+    store.consume("b", 1, limit)
+    clock.now = 4.0
+    store.consume("c", 1, limit)
+    assert len(store) == 3
+
+    clock.now = 11.0
+    store.consume("d", 1, limit)
+    assert len(store) == 1  # a, b and c refilled; only d is left
+
+
+def test_rejected_calls_take_no_tokens_from_other_buckets():
+    clock = FakeClock()
+    store = MemoryBucketStore(clock=clock)
+    limit = Limit(rate=1.0, burst=3.0)
+
+    assert store.consume("victim", 3, limit) == 0
+    # The shared ip bucket is full, but the username bucket turns the call away.
+    assert store.consume_all(["ip", "victim"], 2, limit) == pytest.approx(2.0)
+    assert store.consume_all(["ip", "victim"], 2, limit) == pytest.approx(2.0)
+    assert store.consume("ip", 3, limit) == 0
+
+
+def test_login_is_throttled_per_client(tight_auth_limit):
+    form = {"username": "nobody", "password": "wrong"}
+    for _ in range(2):
+        assert client.post("/auth/token", data=form).status_code == status.HTTP_401_UNAUTHORIZED
+
+    response = client.post("/auth/token", data=form)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response.headers["Retry-After"]) > 0
+
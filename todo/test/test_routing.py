@@ -0,0 +1,114 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text, update
+from sqlalchemy.orm import sessionmaker
+
+from todo.database import (Base, EngineRouter, ReadYourWritesMiddleware, RoutingSession,
+                           current_user_id, request_writes)
+from todo.models import Todos
+
+
+def _engine(path, title):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(Todos(id=1, title=title, description="d", priority=1, complete=False, owner_id=1))
+        db.commit()
+    return engine
+
+
+@pytest.fixture
+def routed(tmp_path):
+    primary = _engine(tmp_path / "primary.db", "primary")
+    replicas = [_engine(tmp_path / "replica1.db", "replica1"),
+                _engine(tmp_path / "replica2.db", "replica2")]
+    router = EngineRouter(primary, replicas, sticky_seconds=60)
+    yield sessionmaker(autoflush=False, class_=RoutingSession, router=router)
+    for engine in [primary, *replicas]:
+        engine.dispose()
+
+
+def _read(factory, read_only=True):
+    with factory() as db:
+        db.info["read_only"] = read_only
+        return db.query(Todos).filter(Todos.id == 1).first().title
+
+
+def test_read_only_sessions_round_robin_over_replicas(routed):
+    assert [_read(routed) for _ in range(3)] == ["replica1", "replica2", "replica1"]
+
+
+def test_other_sessions_use_primary(routed):
+    assert _read(routed, read_only=False) == "primary"
+
+
+def test_read_your_writes_after_commit(routed):
+    token = current_user_id.set(1)
+    try:
+        with routed() as db:
+            db.execute(update(Todos).where(Todos.id == 1).values(title="written"))
+            db.commit()
+        assert _read(routed) == "written"
+    finally:
+        current_user_id.reset(token)
+
+    # Another user is not pinned to the primary.
+    assert _read(routed).startswith("replica")
+
+
+def test_textual_writes_go_to_the_primary(routed):
+    with routed() as db:
+        db.info["read_only"] = True
+        db.execute(text("UPDATE todos SET title = 'textual' WHERE id = 1"))
+        db.commit()
+    assert _read(routed, read_only=False) == "textual"
+
+
+def test_stickiness_travels_with_the_client(routed):
+    # The write's time goes back to the client...
+    writes = {"seen": None, "wrote": None}
+    token = request_writes.set(writes)
+    try:
+        with routed() as db:
+            db.execute(update(Todos).where(Todos.id == 1).values(title="written"))
+            db.commit()
+    finally:
+        request_writes.reset(token)
+    assert writes["wrote"] is not None
+
+    # ...and a request carrying it reads from the primary on any worker.
+    token = request_writes.set({"seen": writes["wrote"], "wrote": None})
+    try:
+        assert _read(routed) == "written"
+    finally:
+        request_writes.reset(token)
+    assert _read(routed).startswith("replica")
+
+
+def test_expired_writers_are_evicted():
+    now = [0.0]
+    router = EngineRouter(None, [None], sticky_seconds=2, evict_interval=10, clock=lambda: now[0])
+    for user in range(3):
+        router.mark_write(user)
+    assert len(router) == 3
+    now[0] = 11
+    router.mark_write(99)
+    assert len(router) == 1
+
+
+def test_middleware_round_trips_the_last_write():
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(request_writes.get()["seen"])
+        request_writes.get()["wrote"] = 1234.5
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    client = TestClient(ReadYourWritesMiddleware(app))
+    response = client.get("/", headers={"Cookie": "last_write=1000.25"})
+    assert calls == [1000.25]
+    assert response.headers["x-last-write"] == "1234.500"
+    assert response.cookies["last_write"] == "1234.500"
+    client.get("/", headers={"X-Last-Write": "2000"})
+    assert calls[-1] == 2000.0
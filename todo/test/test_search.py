@@ -0,0 +1,54 @@
+from sqlalchemy import text
+from starlette import status
+
+from todo.models import Todos
+from todo.routers import todos
+from todo.search import match_expression
+from .conftest import client, app, override_get_db, override_get_current_user, TestingSessionLocal
+
+app.dependency_overrides[todos.get_db] = override_get_db
+app.dependency_overrides[todos.get_current_user] = override_get_current_user
+
+
+def _add(db, title, description, owner_id=1):
+    todo = Todos(title=title, description=description, priority=3, complete=False, owner_id=owner_id)
+    db.add(todo)
+    db.commit()
+    return todo.id
+
+
+def test_match_expression_quotes_user_input():
+    assert match_expression('milk OR "eggs') == '"milk" "OR" "eggs"'
+    assert match_expression("gro* *") == '"gro"*'
+    assert match_expression("  ") == ""
+
+
+def test_search_is_ranked_and_owner_scoped(test_todo):
+    db = TestingSessionLocal()
+    weak = _add(db, "Errands", "pick up the groceries and the mail")
+    strong = _add(db, "Groceries", "groceries for the week")
+    _add(db, "Groceries", "someone else's list", owner_id=2)
+
+    response = client.get("/todos/search", params={"q": "groceries"})
+    assert response.status_code == status.HTTP_200_OK
+    assert [todo["id"] for todo in response.json()] == [strong, weak]
+
+    response = client.get("/todos/search", params={"q": "groc*", "limit": 1, "offset": 1})
+    assert [todo["id"] for todo in response.json()] == [weak]
+    assert client.get("/todos/search", params={"q": "learn everyday"}).json()[0]["id"] == test_todo.id
+    db.close()
+
+
+def test_index_follows_updates_and_deletes(test_todo):
+    response = client.put(f"/todos/todo/{test_todo.id}", json={
+        "title": "Water the plants", "description": "balcony", "priority": 5, "complete": False,
+    })
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert client.get("/todos/search", params={"q": "learn"}).json() == []
+    assert len(client.get("/todos/search", params={"q": "plants"}).json()) == 1
+
+    client.delete(f"/todos/todo/{test_todo.id}")
+    assert client.get("/todos/search", params={"q": "plants"}).json() == []
+    db = TestingSessionLocal()
+    assert db.execute(text("SELECT count(*) FROM todos_fts WHERE todos_fts MATCH 'plants'")).scalar() == 0
+    db.close()
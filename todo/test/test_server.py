@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from todo import database, server
+from todo.server import prepare_schema
+
+pytest.importorskip("alembic")
+
+
+def _version(url):
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        version = connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+        tables = inspect(connection).get_table_names()
+    engine.dispose()
+    return version, tables
+
+
+def test_prepare_schema_upgrade_fresh_database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'fresh.db'}"
+    prepare_schema("upgrade", url=url)
+
+    version, tables = _version(url)
+    assert version is not None
+    assert {"users", "todos"} <= set(tables)
+
+    # Running it again (e.g. a second deploy) is a no-op upgrade.
+    prepare_schema("upgrade", url=url)
+    assert _version(url)[0] == version
+
+
+def test_prepare_schema_upgrade_untracked_database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    prepare_schema("create", url=url)
+
+    prepare_schema("upgrade", url=url)
+    version, _ = _version(url)
+    assert version is not None
+
+
+def test_job_sweep_skips_a_database_without_jobs(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bare.db'}")
+    monkeypatch.setattr(database, "engine", engine)
+    assert server.fail_interrupted_jobs() == 0
+    engine.dispose()
+
+
+def test_crashing_workers_restart_with_backoff():
+    delay = 0.0
+    delays = []
+    for _ in range(10):
+        delay = server.restart_delay(delay, uptime=0.1)
+        delays.append(delay)
+    minimum = server.RESTART_DELAY_MIN
+    assert delays[:3] == [minimum, 2 * minimum, 4 * minimum]
+    assert delays[-1] == server.RESTART_DELAY_MAX
+    # A worker that ran for a while is restarted at once.
+    assert server.restart_delay(delay, uptime=server.MIN_UPTIME) == 0.0
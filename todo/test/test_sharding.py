@@ -0,0 +1,148 @@
+import pytest
+from sqlalchemy import event, func, select
+
+from todo import changes, sharding, stats
+from todo.models import TodoChanges, Todos, Users
+from todo.routers import admin, todos
+from todo.sharding import ID_RANGE, ShardSet, jump_hash, rebalance
+from .conftest import client, app, TestingSessionLocal
+
+
+def _shards(tmp_path, count, start=0):
+    shard_set = ShardSet([f"sqlite:///{tmp_path / f'shard{index}.db'}" for index in range(start, count)])
+    shard_set.create_all()
+    return shard_set
+
+
+def _add(shard_set, owner_id, title="todo"):
+    db = shard_set.session_for(owner_id)
+    try:
+        todo = Todos(title=title, description="sharded", priority=1, complete=False, owner_id=owner_id)
+        todo.id = sharding.allocate_todo_id(db)
+        db.add(todo)
+        db.commit()
+        return todo.id
+    finally:
+        db.close()
+
+
+def test_jump_hash_only_moves_keys_to_the_new_bucket():
+    for key in range(2000):
+        before, after = jump_hash(key, 4), jump_hash(key, 5)
+        assert after == before or after == 4
+
+
+def test_ids_come_from_the_shard_range(tmp_path):
+    shard_set = _shards(tmp_path, 3)
+    for owner_id in range(1, 20):
+        todo_id = _add(shard_set, owner_id)
+        assert todo_id // ID_RANGE == shard_set.index_for(owner_id)
+        assert shard_set.locate_todo(todo_id) == shard_set.index_for(owner_id)
+    assert sum(shard_set.fan_out(lambda db: db.scalar(select(func.count(Todos.id))))) == 19
+    shard_set.dispose()
+
+
+def test_rebalance_moves_todos_to_their_new_shard(tmp_path):
+    source = _shards(tmp_path, 2)
+    ids = {owner_id: _add(source, owner_id) for owner_id in range(1, 60)}
+    target = ShardSet(source.urls + [f"sqlite:///{tmp_path / 'shard2.db'}"])
+
+    moved = rebalance(source, target, batch_size=7, progress=None)
+    assert 0 < moved < len(ids)
+
+    for owner_id, todo_id in ids.items():
+        db = target.session_for(owner_id)
+        assert db.get(Todos, todo_id) is not None
+        assert stats.user_stats(db, owner_id)["total"] == 1
+        db.close()
+    assert sum(target.fan_out(lambda db: db.scalar(select(func.count(Todos.id))))) == len(ids)
+    # New ids on the added shard do not collide with the moved ones.
+    assert _add(target, next(o for o in range(100, 200) if target.index_for(o) == 2)) not in ids.values()
+    source.dispose()
+    target.dispose()
+
+
+def test_rebalance_never_reissues_deleted_ids(tmp_path):
+    shard_set = _shards(tmp_path, 1)
+    kept, newest = _add(shard_set, 1), _add(shard_set, 1)
+    db = shard_set.session(0)
+    db.delete(db.get(Todos, newest))
+    db.commit()
+    db.close()
+
+    rebalance(shard_set, shard_set, progress=None)
+    assert _add(shard_set, 1) > newest > kept
+    shard_set.dispose()
+
+
+@pytest.fixture
+def sharded_app(tmp_path, monkeypatch):
+    shard_set = _shards(tmp_path, 2)
+    monkeypatch.setattr(sharding, "shards", shard_set)
+    monkeypatch.setattr(sharding, "ENABLED", True)
+    saved = {dep: app.dependency_overrides.pop(dep, None) for dep in (todos.get_db, admin.get_db)}
+    yield shard_set
+    for dep, override in saved.items():
+        if override is not None:
+            app.dependency_overrides[dep] = override
+    shard_set.dispose()
+
+
+def test_routers_use_the_owner_shard(sharded_app):
+    response = client.post("/todos/todo", json={"title": "On a shard", "description": "Sharded todo",
+                                                "priority": 2, "complete": False})
+    assert response.status_code == 201
+
+    listed = client.get("/todos").json()
+    assert [todo["title"] for todo in listed] == ["On a shard"]
+    todo_id = listed[0]["id"]
+    assert todo_id // ID_RANGE == sharded_app.index_for(1)
+
+    assert [todo["id"] for todo in client.get("/admin/todo").json()] == [todo_id]
+    assert client.get("/admin/stats").json()["total"] == 1
+    assert client.delete(f"/admin/todo/{todo_id}").status_code == 204
+    assert client.get("/todos").json() == []
+
+    # The changes went to the owner's shard, in the same transactions.
+    shard_db = sharded_app.session(sharded_app.index_for(1))
+    try:
+        rows = shard_db.scalars(select(TodoChanges).order_by(TodoChanges.seq)).all()
+        assert [(row.op, row.todo_id) for row in rows] == [("created", todo_id), ("deleted", todo_id)]
+    finally:
+        shard_db.close()
+    assert [change["op"] for change in changes.bus.since(1, 0)[0]] == ["created", "deleted"]
+
+
+def test_users_overview_merges_shards(sharded_app, test_user):
+    # A second user whose todos live on the other shard.
+    other_id = next(o for o in range(2, 100) if sharded_app.index_for(o) != sharded_app.index_for(test_user.id))
+    db = TestingSessionLocal()
+    db.add(Users(id=other_id, username="other", email="other@email.com", hashed_password="x", role="user"))
+    db.commit()
+    db.close()
+    _add(sharded_app, test_user.id)
+    _add(sharded_app, other_id)
+    _add(sharded_app, other_id)
+
+    body = client.get("/admin/users/overview",
+                      params={"sort": "open_todos", "order": "desc", "limit": 1, "include_todos": True}).json()
+    assert [(user["id"], user["open_todos"], len(user["todos"])) for user in body["users"]] == [(other_id, 2, 2)]
+    body = client.get("/admin/users/overview", params={"sort": "open_todos", "order": "desc",
+                                                       "cursor": body["next_cursor"]}).json()
+    assert [(user["id"], user["open_todos"]) for user in body["users"]] == [(test_user.id, 1)]
+    assert body["next_cursor"] is None
+
+    # Sorted by id, a page asks the shards only for its own users.
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    for engine in sharded_app.engines:
+        event.listen(engine, "before_cursor_execute", listener)
+    try:
+        body = client.get("/admin/users/overview", params={"limit": 1}).json()
+        assert [(user["id"], user["open_todos"]) for user in body["users"]] == [(test_user.id, 1)]
+        body = client.get("/admin/users/overview", params={"limit": 1, "cursor": body["next_cursor"]}).json()
+        assert [(user["id"], user["open_todos"]) for user in body["users"]] == [(other_id, 2)]
+    finally:
+        for engine in sharded_app.engines:
+            event.remove(engine, "before_cursor_execute", listener)
+    assert statements and all(" IN (" in statement for statement in statements)
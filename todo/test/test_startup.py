@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+
+from todo import startup
+from .conftest import client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Generous enough for a loaded CI box; a regression to import-time DDL or
+# eager crypto shows up in the other assertions regardless.
+COLD_START_BUDGET_MS = float(os.getenv("TODO_COLD_START_BUDGET_MS", "3000"))
+
+
+def test_cold_start_within_budget(tmp_path):
+    db_path = tmp_path / "cold.db"
+    code = ("import sys, time; started = time.perf_counter(); import todo.main; "
+            "print((time.perf_counter() - started) * 1000, 'jose' in sys.modules)")
+    env = dict(os.environ, TODO_LAZY_INIT="1", DATABASE_URL=f"sqlite:///{db_path}")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    elapsed_ms, jose_loaded = result.stdout.split()
+
+    assert not db_path.exists()  # no DDL at import
+    assert jose_loaded == "False"
+    assert float(elapsed_ms) < COLD_START_BUDGET_MS
+
+
+def test_first_request_initializes():
+    client.get("/docs")
+    assert startup._initialized
+    assert "crypto" in startup.report
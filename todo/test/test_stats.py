@@ -0,0 +1,81 @@
+import pytest
+from fastapi import status
+from sqlalchemy import event, text
+
+from todo import stats
+from todo.models import Todos
+from .conftest import (
+    TEST_ENGINE,
+    TestingSessionLocal,
+    override_get_db,
+    override_get_current_user,
+    client,
+    app,
+)
+from todo.routers import admin, todos
+
+app.dependency_overrides[todos.get_db] = override_get_db
+app.dependency_overrides[admin.get_db] = override_get_db
+app.dependency_overrides[todos.get_current_user] = override_get_current_user
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    monkeypatch.setattr(stats, "COUNTERS_ENABLED", True)
+    stats.rebuild_counters(TestingSessionLocal())
+    yield
+    with TEST_ENGINE.connect() as connection:
+        connection.execute(text("DELETE FROM todo_counts;"))
+        connection.commit()
+
+
+def _other_users_todo():
+    db = TestingSessionLocal()
+    db.add(Todos(title="Not mine", description="Someone else's", priority=1,
+                 complete=True, owner_id=2))
+    db.commit()
+
+
+def test_user_stats(test_todo):
+    _other_users_todo()
+    response = client.get("/todos/stats")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"total": 1, "complete": 0, "open": 1, "by_priority": {"5": 1}}
+
+
+def test_admin_stats(test_todo):
+    _other_users_todo()
+    response = client.get("/admin/stats")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"total": 2, "complete": 1, "open": 1,
+                               "by_priority": {"1": 1, "5": 1}}
+
+
+def test_counters_follow_writes(test_todo, counters):
+    client.post("/todos/todo", json={"title": "Counted", "description": "Counted todo",
+                                     "priority": 2, "complete": False})
+    client.put(f"/todos/todo/{test_todo.id}", json={"title": "Learn to code!",
+                                                   "description": "Need to learn everyday!",
+                                                   "priority": 5, "complete": True})
+    assert client.get("/todos/stats").json() == {"total": 2, "complete": 1, "open": 1,
+                                                 "by_priority": {"2": 1, "5": 1}}
+
+    client.delete(f"/todos/todo/{test_todo.id}")
+    db = TestingSessionLocal()
+    assert stats.user_stats(db, 1) == {"total": 1, "complete": 0, "open": 1, "by_priority": {2: 1}}
+
+
+def test_record_upserts_in_one_statement(counters):
+    db = TestingSessionLocal()
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(TEST_ENGINE, "before_cursor_execute", listener)
+    try:
+        stats.record(db, 7, False, 3, 1)
+        stats.record(db, 7, False, 3, 1)
+    finally:
+        event.remove(TEST_ENGINE, "before_cursor_execute", listener)
+    db.commit()
+    assert len(statements) == 2 and all("ON CONFLICT" in statement for statement in statements)
+    assert stats.user_stats(db, 7) == {"total": 2, "complete": 0, "open": 2, "by_priority": {3: 2}}
+    db.close()
@@ -31,6 +31,7 @@ def test_read_all_authenticated(test_todo: Todos):
         "priority": 5,
         "complete": False,
         "owner_id": 1,
+        "completed_at": None,
     }
 
 
@@ -48,6 +49,7 @@ def test_read_one_authenticated(test_todo: Todos):
         "priority": 5,
         "complete": False,
         "owner_id": 1,
+        "completed_at": None,
     }
 
 
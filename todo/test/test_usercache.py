@@ -0,0 +1,105 @@
+import os
+
+from starlette import status
+
+from todo.models import Users
+from todo.routers import auth, users
+from todo.usercache import UserCache, cache
+from .conftest import client, app, override_get_db, override_get_current_user, TestingSessionLocal
+
+app.dependency_overrides[users.get_db] = override_get_db
+app.dependency_overrides[users.get_current_user] = override_get_current_user
+
+
+def test_repeated_reads_are_served_from_the_cache(test_user: Users):
+    user_cache = UserCache()
+    db = TestingSessionLocal()
+    assert user_cache.get_by_id(db, test_user.id)["username"] == "codingwithrobytest"
+    assert user_cache.get_by_username(db, "codingwithrobytest")["id"] == test_user.id
+    assert user_cache.get_by_id(db, test_user.id)["email"] == "codingwithrobytest@email.com"
+    assert user_cache.get_by_username(db, "nobody") is None
+    db.close()
+
+    stats = user_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 1)
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_write_paths_invalidate(test_user: Users):
+    assert client.get("/user").json()["phone_number"] == "(111)-111-1111"
+    assert client.put("/user/phonenumber/2222222222").status_code == status.HTTP_204_NO_CONTENT
+    assert client.get("/user").json()["phone_number"] == "2222222222"
+
+    db = TestingSessionLocal()
+    assert auth.authenticate_user("codingwithrobytest", "testpassword", db)
+    client.put("/user/password", json={"password": "testpassword", "new_password": "newpassword"})
+    assert not auth.authenticate_user("codingwithrobytest", "testpassword", db)
+    assert auth.authenticate_user("codingwithrobytest", "newpassword", db).id == test_user.id
+    db.close()
+
+
+def test_version_stamps_are_shared_with_forked_workers(test_user: Users):
+    user_cache = UserCache()
+    db = TestingSessionLocal()
+    user_cache.get_by_id(db, test_user.id)
+
+    pid = os.fork()
+    if pid == 0:  # a sibling worker handling the write
+        user_cache.invalidate(test_user.id)
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    user_cache.get_by_id(db, test_user.id)
+    db.close()
+    assert user_cache.stats()["stale"] == 1
+
+
+def test_concurrent_invalidations_are_not_lost(test_user: Users):
+    user_cache = UserCache()
+    db = TestingSessionLocal()
+    user_cache.get_by_id(db, test_user.id)
+
+    # Two workers invalidating at once: each only stores its own stamp, so
+    # the entry is stale whichever write lands last.
+    pids = []
+    for _ in range(2):
+        pid = os.fork()
+        if pid == 0:
+            user_cache.invalidate(test_user.id)
+            os._exit(0)
+        pids.append(pid)
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+    user_cache.get_by_id(db, test_user.id)
+    user_cache.get_by_id(db, test_user.id)
+    db.close()
+    assert user_cache.stats()["stale"] == 1
+
+
+def test_ttl_and_size_bound(test_user: Users):
+    now = [0.0]
+    user_cache = UserCache(max_entries=1, ttl=10, clock=lambda: now[0])
+    db = TestingSessionLocal()
+    user_cache.get_by_id(db, test_user.id)
+    now[0] = 11
+    user_cache.get_by_id(db, test_user.id)
+    assert user_cache.stats()["stale"] == 1
+
+    other = Users(username="other", email="other@email.com", hashed_password="x", role="user")
+    db.add(other)
+    db.commit()
+    user_cache.get_by_id(db, other.id)
+    assert list(user_cache._entries) == [other.id]
+    db.close()
+
+
+def test_stats_endpoint(test_user: Users):
+    from todo.routers import admin
+    app.dependency_overrides[admin.get_current_user] = override_get_current_user
+    client.get("/user")
+    client.get("/user")
+    response = client.get("/admin/user-cache")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["hits"] >= 1
+    assert response.json() == cache.stats()
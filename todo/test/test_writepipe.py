@@ -0,0 +1,91 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+from sqlalchemy import create_engine, event, func, select
+from starlette import status
+
+from todo import writepipe
+from todo.database import Base
+from todo.models import Todos
+from todo.writepipe import WritePipeline
+from .conftest import client, TestingSessionLocal
+
+
+def _engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pipe.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    return engine, commits
+
+
+def _insert(title):
+    def op(db):
+        todo = Todos(title=title, description="grouped", priority=1, complete=False, owner_id=1)
+        db.add(todo)
+        db.flush()
+        return todo.id
+    return op
+
+
+def _fail(db):
+    db.add(Todos(title="doomed", description="rolled back", priority=1, complete=False, owner_id=1))
+    db.flush()
+    raise ValueError("bad write")
+
+
+def test_batch_commits_once_and_isolates_failures(tmp_path):
+    engine, commits = _engine(tmp_path)
+    pipeline = WritePipeline(engine)
+    batch = [(op, Future()) for op in [_insert("a"), _fail, _insert("b")]]
+
+    pipeline.apply(batch)
+
+    assert batch[0][1].result() != batch[2][1].result()
+    with pytest.raises(ValueError):
+        batch[1][1].result()
+    assert len(commits) == 1
+    with engine.connect() as connection:
+        titles = connection.scalars(select(Todos.title).order_by(Todos.id)).all()
+    assert titles == ["a", "b"]
+    engine.dispose()
+
+
+def test_concurrent_submits_share_commits(tmp_path):
+    engine, commits = _engine(tmp_path)
+    pipeline = WritePipeline(engine, max_batch=16, max_delay=0.05)
+    start = threading.Barrier(16)
+    futures = []
+
+    def submit(index):
+        start.wait()
+        futures.append(pipeline.submit(_insert(f"todo {index}")))
+
+    threads = [threading.Thread(target=submit, args=(index,)) for index in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({future.result(timeout=5) for future in futures}) == 16
+    assert len(commits) < 16
+    with engine.connect() as connection:
+        assert connection.scalar(select(func.count(Todos.id))) == 16
+    engine.dispose()
+
+
+def test_handlers_write_through_the_pipeline(test_todo, monkeypatch):
+    monkeypatch.setattr(writepipe, "ENABLED", True)
+    monkeypatch.setattr(writepipe, "_pipelines", {})
+
+    response = client.post("/todos/todo", json={
+        "title": "Grouped", "description": "via the pipeline", "priority": 3, "complete": False,
+    })
+    assert response.status_code == status.HTTP_201_CREATED
+    assert client.delete("/todos/todo/999").status_code == status.HTTP_404_NOT_FOUND
+    assert client.delete(f"/todos/todo/{test_todo.id}").status_code == status.HTTP_204_NO_CONTENT
+
+    db = TestingSessionLocal()
+    assert db.scalars(select(Todos.title)).all() == ["Grouped"]
+    db.close()
@@ -0,0 +1,128 @@
+# todo/usercache.py
+"""Read-through cache of ``users`` rows, keyed by id and by username.
+
+Profile reads and logins look users up on every request although the rows
+rarely change. ``cache`` keeps up to ``TODO_USER_CACHE_SIZE`` rows (as
+plain dicts) for ``TODO_USER_CACHE_TTL`` seconds.
+
+The write paths call :meth:`UserCache.invalidate` after they commit. That
+writes a fresh version stamp into a shared memory page created before the
+server forks its workers, so every worker sees it: an entry whose stamp no
+longer matches is reloaded. The stamp is a ``CLOCK_MONOTONIC`` reading
+rather than a counter, so two workers invalidating at once cannot lose an
+update the way an unlocked increment could. Processes that do not share the page (separate
+deployments, CLI tools) fall back on the TTL.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+from .models import Users
+
+MAX_ENTRIES = int(os.getenv("TODO_USER_CACHE_SIZE", "10000"))
+TTL_SECONDS = float(os.getenv("TODO_USER_CACHE_TTL", "60"))
+SLOTS = 4096  # version stamps; users share a slot when their ids collide
+
+_stamp = struct.Struct("Q")
+
+
+class UserCache:
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, slots=SLOTS, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.slots = slots
+        self.clock = clock
+        # Anonymous mappings are MAP_SHARED, so forked workers share the stamps.
+        self._versions = mmap.mmap(-1, slots * _stamp.size)
+        self._entries = OrderedDict()  # id -> (record, version, expires)
+        self._ids_by_username = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def _version(self, user_id: int) -> int:
+        return _stamp.unpack_from(self._versions, (user_id % self.slots) * _stamp.size)[0]
+
+    def invalidate(self, user_id: int) -> None:
+        # A plain store, not a read-modify-write: whichever concurrent stamp
+        # lands last, it differs from the one any cached entry was loaded at.
+        _stamp.pack_into(self._versions, (user_id % self.slots) * _stamp.size, time.monotonic_ns())
+        with self._lock:
+            record = self._entries.pop(user_id, None)
+            if record is not None:
+                self._ids_by_username.pop(record[0]["username"], None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._ids_by_username.clear()
+
+    def _cached(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            record, version, expires = entry
+            if version != self._version(user_id) or expires <= self.clock():
+                del self._entries[user_id]
+                self._ids_by_username.pop(record["username"], None)
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return record
+
+    def _load(self, db, user_id):
+        # Read the stamp before the row: a write in between only costs a reload.
+        version = self._version(user_id)
+        row = db.execute(select(Users.__table__).where(Users.id == user_id)).mappings().first()
+        if row is None:
+            return None
+        record = dict(row)
+        with self._lock:
+            self._entries[user_id] = (record, version, self.clock() + self.ttl)
+            self._entries.move_to_end(user_id)
+            self._ids_by_username[record["username"]] = user_id
+            while len(self._entries) > self.max_entries:
+                _, (evicted, _, _) = self._entries.popitem(last=False)
+                self._ids_by_username.pop(evicted["username"], None)
+        return record
+
+    def get_by_id(self, db, user_id: int):
+        """The user row as a dict, or None."""
+        record = self._cached(user_id)
+        if record is None:
+            record = self._load(db, user_id)
+        return record
+
+    def get_by_username(self, db, username: str):
+        # Usernames never change, so the id they map to needs no stamp.
+        user_id = self._ids_by_username.get(username)
+        if user_id is None:
+            user_id = db.scalar(select(Users.id).where(Users.username == username))
+            if user_id is None:
+                with self._lock:
+                    self.misses += 1
+                return None
+        return self.get_by_id(db, user_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+cache = UserCache()
@@ -0,0 +1,142 @@
+# todo/writepipe.py
+"""Group commit for the write handlers.
+
+Handlers describe a mutation as ``op(session)`` and hand it to :func:`run`.
+Normally that just applies it to the request's session and commits. With
+``TODO_GROUP_COMMIT=1`` the op is queued instead: a writer thread per
+database collects ops for up to ``TODO_GROUP_COMMIT_DELAY_MS`` or
+``TODO_GROUP_COMMIT_MAX_BATCH`` ops and applies them in one transaction,
+each inside its own SAVEPOINT. One commit (one fsync on SQLite) then covers
+the whole batch, while every request still gets its own result or
+exception: a failing op is rolled back alone.
+
+Ops run on the writer's session, so they must do their own reads and
+return plain data rather than ORM instances.
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy.orm import Session
+
+from .database import current_user_id
+
+logger = logging.getLogger("todo.writepipe")
+
+ENABLED = os.getenv("TODO_GROUP_COMMIT") == "1"
+MAX_BATCH = int(os.getenv("TODO_GROUP_COMMIT_MAX_BATCH", "64"))
+MAX_DELAY = float(os.getenv("TODO_GROUP_COMMIT_DELAY_MS", "5")) / 1000
+
+
+class WritePipeline:
+    def __init__(self, bind, info=None, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+        self.bind = bind
+        self.info = dict(info or {})
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, op) -> Future:
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((op, future))
+        return future
+
+    def _ensure_thread(self):
+        # Threads do not survive a fork; start one per process.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name="writepipe", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.apply(batch)
+
+    def apply(self, batch) -> None:
+        """Apply ``[(op, future), ...]`` in one transaction and settle the futures."""
+        outcomes = []
+        session = Session(bind=self.bind, autoflush=False, info=dict(self.info))
+        try:
+            connection = session.connection()
+            if connection.dialect.name == "sqlite":
+                # pysqlite only opens a transaction at the first DML; take the
+                # write lock now so the SAVEPOINTs below nest inside it.
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+            for op, future in batch:
+                savepoint = session.begin_nested()
+                try:
+                    result = op(session)
+                    session.flush()
+                    savepoint.commit()
+                    outcomes.append((future, result, None))
+                except Exception as exc:
+                    savepoint.rollback()
+                    outcomes.append((future, None, exc))
+            session.commit()
+        except Exception as exc:
+            logger.exception("group commit of %d writes failed", len(batch))
+            session.rollback()
+            outcomes = [(future, None, exc) for _, future in batch]
+        finally:
+            session.close()
+
+        for future, result, exc in outcomes:
+            if exc is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc)
+
+
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+
+def pipeline_for(db) -> WritePipeline:
+    """The pipeline writing to the database (and shard) behind ``db``."""
+    bind = db.get_bind()
+    shard = db.info.get("shard")
+    key = (id(bind), shard)
+    pipeline = _pipelines.get(key)
+    if pipeline is None or pipeline.bind is not bind:
+        with _pipelines_lock:
+            pipeline = _pipelines.get(key)
+            if pipeline is None or pipeline.bind is not bind:
+                pipeline = _pipelines[key] = WritePipeline(
+                    bind, info={"shard": shard} if shard is not None else None)
+    return pipeline
+
+
+async def run(db, op):
+    """Apply ``op(session)`` and commit; returns what ``op`` returned."""
+    if not ENABLED:
+        result = op(db)
+        db.commit()
+        return result
+    result = await asyncio.wrap_future(pipeline_for(db).submit(op))
+    # The write went through the pipeline's session, not ``db``; keep the
+    # user's reads on the primary as if ``db`` had committed it.
+    router = getattr(db, "router", None)
+    if router is not None:
+        router.mark_write(current_user_id.get())
+    return result